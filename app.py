@@ -1,12 +1,20 @@
+from datetime import date, datetime
+
 import streamlit as st
 import pandas as pd
-from rapidfuzz import process, fuzz
-import unidecode
-import re
-import os
-import xml.etree.ElementTree as ET
-import requests
-import json
+from ncmbrasil.consultas import (buscar_sku, buscar_titulo, buscar_por_codigo, buscar_por_codigo_na_data,
+                                 buscar_por_descricao, autocompletar_descricao, calcular_preco_final,
+                                 calcular_precos_lote, historico_codigo, impacto_nova_tipi, auditar_catalogo)
+from ncmbrasil.datasets import iniciar_aquecimento, invalidar, obter, status
+from ncmbrasil.atualizacao import iniciar_vigia
+from ncmbrasil.chaves import carregar_chaves, salvar_chave
+from ncmbrasil.dados import preparar_tipi
+from ncmbrasil.ia import consultar_ncm_ia, listar_modelos, sugerir_ncm
+from ncmbrasil.ia_lote import classificar_produtos
+from ncmbrasil.memoria import memoria_processo
+from ncmbrasil.ncm import formatar_codigo, padronizar_codigo
+from ncmbrasil.vigencia import periodo
+from ncmbrasil.precos import ler_planilha_lote
 
 # ==========================
 # Configuração da página
@@ -58,18 +66,6 @@ for key in ["produto_sku", "resultados_sku", "produto_calc", "resultados_calc",
 # ==========================
 # Funções utilitárias
 # ==========================
-def padronizar_codigo(codigo):
-    codigo = str(codigo).replace(".", "").strip()
-    return codigo.zfill(8)
-
-def normalizar(texto):
-    texto = unidecode.unidecode(str(texto).lower())
-    texto = re.sub(r"[^a-z0-9\s]", " ", texto)
-    return re.sub(r"\s+", " ", texto)
-
-def clean_tag(tag):
-    return tag.split("}")[-1].lower() if "}" in tag else tag.lower()
-
 def format_moeda(valor):
     return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
@@ -86,155 +82,44 @@ def mostrar_card_produto(item):
     </div>
     """, unsafe_allow_html=True)
 
-# ==========================
-# Cache de arquivos
-# ==========================
-@st.cache_data
-def carregar_tipi(caminho="tipi.xlsx"):
-    if os.path.exists(caminho):
-        df = pd.read_excel(caminho, dtype=str)
-        df.columns = [unidecode.unidecode(c.strip().lower()) for c in df.columns]
-        if "ncm" in df.columns and "aliquota (%)" in df.columns:
-            df = df[["ncm","aliquota (%)"]].copy()
-            df.rename(columns={"ncm":"codigo","aliquota (%)":"IPI"}, inplace=True)
-            df["codigo"] = df["codigo"].apply(padronizar_codigo)
-            df["IPI"] = pd.to_numeric(df["IPI"], errors="coerce").fillna(0.0)
-            return df
-    return pd.DataFrame(columns=["codigo","IPI"])
-
-@st.cache_data
-def carregar_ipi_itens(caminho="IPI Itens.xlsx"):
-    if os.path.exists(caminho):
-        df = pd.read_excel(caminho, engine="openpyxl", dtype=str)
-        df["SKU"] = df["SKU"].astype(str)
-        for col in ["Valor à Prazo","Valor à Vista","IPI %"]:
-            df[col] = df[col].astype(str).str.replace(",",".",regex=False).astype(float)
-        return df
-    return pd.DataFrame(columns=["SKU","Descrição Item","Valor à Prazo","Valor à Vista","IPI %"])
-
-@st.cache_data
-def carregar_ncm(caminho="ncm_todos.csv"):
-    if os.path.exists(caminho):
-        df = pd.read_csv(caminho, dtype=str)
-        df.rename(columns={df.columns[0]:"codigo", df.columns[1]:"descricao"}, inplace=True)
-        df["codigo"] = df["codigo"].apply(padronizar_codigo)
-        df["descricao"] = df["descricao"].astype(str)
-        return df
-    return pd.DataFrame(columns=["codigo","descricao"])
-
-@st.cache_data
-def carregar_xml(caminho="GoogleShopping_full.xml"):
-    if os.path.exists(caminho):
-        try:
-            tree = ET.parse(caminho)
-            return tree.getroot()
-        except ET.ParseError:
-            return None
-    return None
-
-df_tipi = carregar_tipi()
-df_ipi = carregar_ipi_itens()
-df_ncm = carregar_ncm()
-xml_root = carregar_xml()
-
 # ==========================
 # Funções de busca
 # ==========================
-def buscar_sku(sku):
-    if not xml_root:
-        return None, "XML não encontrado."
-    for item in xml_root.iter():
-        if clean_tag(item.tag)!="item": continue
-        dados = {clean_tag(c.tag):c.text.strip() if c.text else "" for c in item}
-        if dados.get("id")==str(sku):
-            preco_prazo = float(re.sub(r"[^\d.]","",dados.get("price",""))) if dados.get("price") else 0.0
-            preco_vista = float(re.sub(r"[^\d.]","",dados.get("sale_price",""))) if dados.get("sale_price") else preco_prazo
-            return {
-                "SKU":sku,
-                "Título":dados.get("title",""),
-                "Link":dados.get("link",""),
-                "Valor à Prazo":preco_prazo,
-                "Valor à Vista":preco_vista,
-                "Descrição":dados.get("description",""),
-                "NCM":dados.get("ncm",dados.get("g:ncm",""))
-            }, None
-    return None, "SKU não encontrado."
-
-def buscar_titulo(termo, limite=10):
-    if not xml_root:
-        return [], "XML não encontrado."
-    resultados=[]
-    for item in xml_root.iter():
-        if clean_tag(item.tag)!="item": continue
-        dados = {clean_tag(c.tag):c.text.strip() if c.text else "" for c in item}
-        if "title" in dados:
-            preco_prazo = float(re.sub(r"[^\d.]","",dados.get("price",""))) if dados.get("price") else 0.0
-            preco_vista = float(re.sub(r"[^\d.]","",dados.get("sale_price",""))) if dados.get("sale_price") else preco_prazo
-            resultados.append({
-                "SKU":dados.get("id",""),
-                "Título":dados.get("title",""),
-                "Link":dados.get("link",""),
-                "Valor à Prazo":preco_prazo,
-                "Valor à Vista":preco_vista,
-                "Descrição":dados.get("description",""),
-                "NCM":dados.get("ncm",dados.get("g:ncm",""))
-            })
-    titulos_norm=[normalizar(r["Título"]) for r in resultados]
-    termo_norm=normalizar(termo)
-    escolhas=process.extract(termo_norm,titulos_norm,scorer=fuzz.WRatio,limit=limite)
-    final=[resultados[idx] for _,_,idx in escolhas]
-    return final, None
-
-def calcular_preco_final(sku, valor_final, frete=0):
-    item = df_ipi[df_ipi["SKU"]==str(sku)]
-    if item.empty: return None, "SKU não encontrado na planilha IPI Itens."
-    descricao=item["Descrição Item"].values[0]
-    ipi_pct=item["IPI %"].values[0]/100
-    base=(valor_final-frete)/(1+ipi_pct)
-    ipi_val=base*ipi_pct
-    valor_total=base+ipi_val+frete
-    return descricao, {"valor_base":round(base,2),"frete":round(frete,2),"ipi":round(ipi_val,2),"valor_final":round(valor_total,2)}, None
-
-def buscar_por_codigo(df, codigo):
-    codigo=padronizar_codigo(codigo)
-    r=df[df["codigo"]==codigo]
-    if not r.empty:
-        ipi_val=df_tipi[df_tipi["codigo"]==codigo]["IPI"].values
-        ipi_val=ipi_val[0] if len(ipi_val)>0 else "NT"
-        return {"codigo":codigo,"descricao":r["descricao"].values[0],"IPI":ipi_val}
-    return {"erro":f"NCM {codigo} não encontrado"}
-
-def buscar_por_descricao(df, termo, limite=10):
-    termo_norm=normalizar(termo)
-    descr_norm=df["descricao"].apply(normalizar)
-    escolhas=process.extract(termo_norm, descr_norm, scorer=fuzz.WRatio, limit=limite)
-    resultados=[]
-    for desc,score,idx in escolhas:
-        codigo=df.loc[idx,"codigo"]
-        ipi_val=df_tipi[df_tipi["codigo"]==codigo]["IPI"].values
-        ipi_val=ipi_val[0] if len(ipi_val)>0 else "NT"
-        resultados.append({"codigo":codigo,"descricao":df.loc[idx,"descricao"],"IPI":ipi_val,"similaridade":round(score,2)})
-    return resultados
-
-def buscar_modelos_groqk(api_key):
-    if not api_key:
-        return []
-    try:
-        headers = {"Authorization": f"Bearer {api_key}"}
-        resp = requests.get("https://api.groq.com/openai/v1/models", headers=headers, timeout=10)
-        if resp.status_code == 200:
-            data = resp.json()
-            modelos = [m["id"] for m in data.get("data", [])]
-            return modelos
-        else:
-            return []
-    except:
-        return []
+@st.fragment
+def busca_ncm_ao_digitar(limite=10):
+    # Fragmento: cada pausa na digitação reexecuta só este trecho, não o app inteiro
+    termo=st.text_input("Digite parte da descrição:", key="ncm_desc_live", type="search", live="300ms",
+                        placeholder="ex.: chave de fenda")
+    if not termo or len(termo.strip())<3:
+        st.caption("Digite ao menos 3 letras.")
+        return
+    res=autocompletar_descricao(termo, limite)
+    if not res:
+        st.warning("Nenhum resultado encontrado.")
+        return
+    # Uma linha por elemento, sempre na mesma posição: o navegador só redesenha
+    # as linhas cujo conteúdo mudou desde a última pausa
+    for r in res:
+        st.markdown(f"`{formatar_codigo(r['codigo'])}` {r['descricao']} · **IPI:** {r['IPI']} · "
+                    f"{r['similaridade']:.0f}%")
 
 # ==========================
 # Menu Streamlit
 # ==========================
-aba = st.sidebar.radio("📌 Menu", ["Consulta de SKU 🔍","Cálculo do IPI 💰","Consulta NCM/IPI 📦","Análise Inteligente de NCM 🤖"])
+aba = st.sidebar.radio("📌 Menu", ["Consulta de SKU 🔍","Cálculo do IPI 💰","Consulta NCM/IPI 📦","Análise Inteligente de NCM 🤖",
+                                  "Status dos dados ⚙️"])
+
+# Uma vez por processo: os datasets da partida carregam em segundo plano desde a
+# primeira sessão; uma consulta que chega antes espera só pelo dataset que usa
+aquecimento=iniciar_aquecimento()
+
+# Um vigia por processo relê o feed quando o XML muda, sem reiniciar o app
+vigia=iniciar_vigia()
+if vigia.ultima:
+    quando, mudancas=vigia.ultima
+    st.sidebar.caption(f"Feed atualizado às {datetime.fromtimestamp(quando):%H:%M}: "
+                       f"+{mudancas['adicionados']} / -{mudancas['removidos']} itens, "
+                       f"{mudancas['precos']} preços alterados")
 
 # ==========================
 # Aba 1: Consulta de SKU 🔍
@@ -272,8 +157,51 @@ if aba=="Consulta de SKU 🔍":
 # ==========================
 elif aba=="Cálculo do IPI 💰":
     st.subheader("Cálculo do IPI")
-    metodo=st.radio("Buscar por:", ["Código SKU","Título do Produto"], horizontal=True)
-    if metodo=="Código SKU":
+    metodo=st.radio("Buscar por:", ["Código SKU","Título do Produto","Lote (CSV/XLSX)","Impacto de nova TIPI"],
+                    horizontal=True)
+    if metodo=="Impacto de nova TIPI":
+        st.caption("Compara a TIPI enviada com a atual e lista os SKUs do feed cuja alíquota muda, "
+                   "com o preço recalculado mantendo o valor base.")
+        arquivo=st.file_uploader("Nova TIPI (mesmo layout de tipi.xlsx):", type=["xlsx"], key="calc_tipi_nova")
+        if arquivo is not None:
+            # Calculado uma vez por arquivo enviado; os reruns (downloads, outros widgets) reaproveitam
+            impacto=st.session_state.get("impacto_tipi")
+            if impacto is None or impacto[0]!=arquivo.file_id:
+                codigos,skus,resumo=impacto_nova_tipi(preparar_tipi(arquivo))
+                impacto=st.session_state.impacto_tipi=(arquivo.file_id,codigos,skus,resumo,
+                                                       skus.to_csv(index=False).encode("utf-8"),
+                                                       codigos.to_csv(index=False).encode("utf-8"))
+            _,codigos,skus,resumo,csv_skus,csv_codigos=impacto
+            c1,c2,c3,c4=st.columns(4)
+            c1.metric("Códigos alterados", resumo["codigos_alterados"])
+            c2.metric("Incluídos / excluídos", f"{resumo.get('codigos_incluidos',0)} / {resumo.get('codigos_excluidos',0)}")
+            c3.metric("SKUs afetados", resumo.get("skus_afetados",0))
+            c4.metric("Variação total (a prazo)", format_moeda(resumo.get("delta_prazo_total",0)))
+            st.markdown("**Códigos com alíquota alterada**")
+            st.dataframe(codigos, use_container_width=True)
+            st.markdown("**SKUs afetados**")
+            st.dataframe(skus.head(1000).astype({"IPI_antigo":str,"IPI_novo":str}), use_container_width=True)
+            st.download_button("Baixar SKUs afetados (CSV)", csv_skus,
+                               file_name="impacto_tipi_skus.csv", mime="text/csv")
+            st.download_button("Baixar códigos alterados (CSV)", csv_codigos,
+                               file_name="impacto_tipi_codigos.csv", mime="text/csv")
+    elif metodo=="Lote (CSV/XLSX)":
+        st.caption("Colunas: SKU, valor_final e, opcionalmente, frete.")
+        arquivo=st.file_uploader("Planilha de SKUs:", type=["csv","xlsx"], key="calc_lote")
+        if arquivo is not None:
+            try:
+                entrada=ler_planilha_lote(arquivo)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                resultado=calcular_precos_lote(entrada)
+                falhas=int((resultado["erro"]!="").sum())
+                st.success(f"{len(resultado)-falhas} SKUs calculados.")
+                if falhas: st.warning(f"{falhas} linhas sem cálculo (SKU não encontrado, IPI ou valor ilegível; veja a coluna erro).")
+                st.dataframe(resultado.head(1000), use_container_width=True)
+                st.download_button("Baixar resultado (CSV)", resultado.to_csv(index=False).encode("utf-8"),
+                                   file_name="calculo_ipi_lote.csv", mime="text/csv")
+    elif metodo=="Código SKU":
         sku_calc=st.text_input("Digite o SKU:", key="calc_sku")
         if st.button("Buscar SKU", key="btn_calc_sku"):
             if sku_calc:
@@ -294,17 +222,22 @@ elif aba=="Cálculo do IPI 💰":
             if st.button("Selecionar Produto"):
                 idx=opcoes.index(escolha)
                 st.session_state.produto_calc=st.session_state.resultados_calc[idx]
-    if st.session_state.produto_calc:
+    if metodo in ("Código SKU","Título do Produto") and st.session_state.produto_calc:
         item=st.session_state.produto_calc
         opcao_val=st.radio("Escolha o valor:", ["À Prazo","À Vista"])
         valor_produto=item.get("Valor à Prazo") if opcao_val=="À Prazo" else item.get("Valor à Vista")
         valor_final_input=st.text_input("Valor final desejado:", value=str(valor_produto))
         frete_chk=st.checkbox("O item possui frete?")
         frete_val=st.number_input("Valor do frete:", min_value=0.0,value=0.0,step=0.1) if frete_chk else 0.0
+        vigencia_chk=st.checkbox("Usar a alíquota da TIPI vigente em uma data", key="calc_vigencia_chk",
+                                 help="Em vez do IPI % da planilha IPI Itens, usa a alíquota da TIPI em vigor "
+                                      "na data para o NCM do produto no feed.")
+        data_calc=st.date_input("Vigência em:", value=date.today(), format="DD/MM/YYYY",
+                                key="calc_vigencia") if vigencia_chk else None
         if st.button("Calcular IPI"):
             try:
                 valor_final=float(str(valor_final_input).replace(",","."))
-                descricao,res,erro_calc=calcular_preco_final(item.get("SKU"),valor_final,frete_val)
+                descricao,res,erro_calc=calcular_preco_final(item.get("SKU"),valor_final,frete_val,data_calc)
                 if erro_calc: st.error(erro_calc)
                 else:
                     st.session_state.historico_calc.append(item)
@@ -314,7 +247,7 @@ elif aba=="Cálculo do IPI 💰":
                     <p><b>SKU:</b> {item.get("SKU")}</p>
                     <p><b>Valor Base:</b> {format_moeda(res['valor_base'])}</p>
                     <p><b>Frete:</b> {format_moeda(res['frete'])}</p>
-                    <p><b>IPI:</b> {format_moeda(res['ipi'])}</p>
+                    <p><b>IPI:</b> {format_moeda(res['ipi'])} ({res['ipi_pct']:g}%{f", TIPI em {data_calc:%d/%m/%Y}" if data_calc else ""})</p>
                     <p><b>Valor Final:</b> {format_moeda(res['valor_final'])}</p>
                     <p><b>Descrição:</b> {descricao}</p>
                     <p><b>Link:</b> <a href='{item.get('Link','#')}' target='_blank'>Abrir</a></p>
@@ -328,21 +261,63 @@ elif aba=="Cálculo do IPI 💰":
 # ==========================
 elif aba=="Consulta NCM/IPI 📦":
     st.subheader("Consulta NCM/IPI")
-    tipo_busca=st.radio("Tipo de busca:", ["Por código","Por descrição"], horizontal=True)
+    tipo_busca=st.radio("Tipo de busca:", ["Por código","Por descrição","Navegar","Auditoria do catálogo"],
+                        horizontal=True)
     if tipo_busca=="Por código":
         cod_input=st.text_input("Digite o código NCM:", key="ncm_cod")
+        data_ncm=st.date_input("Vigência em:", value=date.today(), format="DD/MM/YYYY", key="ncm_vigencia")
         if cod_input:
-            res=buscar_por_codigo(df_ncm,cod_input)
+            res=buscar_por_codigo(cod_input) if data_ncm==date.today() else buscar_por_codigo_na_data(cod_input,data_ncm)
             if "erro" in res: st.warning(res["erro"])
-            else: st.table(pd.DataFrame([res]))
-    else:
+            else: st.table(pd.DataFrame([res]).astype({"IPI":str}))
+            historico=historico_codigo(res.get("codigo") or padronizar_codigo(cod_input))
+            if len(historico)>1 or "erro" in res and len(historico):
+                st.markdown("**Vigências do código**")
+                st.table(pd.DataFrame({"Período":[periodo(i,f) for i,f in zip(historico["inicio"],historico["fim"])],
+                                       "Descrição":historico["descricao"].to_numpy(),"Ato":historico["ato"].to_numpy()}))
+    elif tipo_busca=="Por descrição" and st.toggle("Resultados enquanto digita", value=True, key="ncm_desc_ao_digitar"):
+        busca_ncm_ao_digitar()
+    elif tipo_busca=="Por descrição":
         desc_input=st.text_input("Digite parte da descrição:", key="ncm_desc")
         if desc_input:
-            res=buscar_por_descricao(df_ncm,desc_input)
+            res=buscar_por_descricao(desc_input)
             if res:
-                st.table(pd.DataFrame(res).sort_values("similaridade",ascending=False))
+                st.table(pd.DataFrame(res).sort_values("similaridade",ascending=False).astype({"IPI":str}))
             else:
                 st.warning("Nenhum resultado encontrado.")
+    elif tipo_busca=="Auditoria do catálogo":
+        st.caption("Confere o NCM de cada SKU do feed com a tabela NCM, o IPI % de IPI Itens com a TIPI "
+                   "e os SKUs que faltam em uma das fontes.")
+        data_auditoria=st.date_input("Vigência em:", value=date.today(), format="DD/MM/YYYY", key="auditoria_data")
+        if st.button("Executar auditoria", key="btn_auditoria"):
+            st.session_state.auditoria=auditar_catalogo(data_auditoria)
+        if st.session_state.get("auditoria"):
+            excecoes,resumo=st.session_state.auditoria
+            c1,c2,c3=st.columns(3)
+            c1.metric("SKUs conferidos", resumo["skus"])
+            c2.metric("SKUs com problema", resumo["skus_com_problema"])
+            c3.metric("Tempo", f"{resumo['tempo_s']:.2f} s")
+            st.table(pd.DataFrame({"Problema":list(resumo["por_problema"]),
+                                   "SKUs":list(resumo["por_problema"].values())}))
+            st.dataframe(excecoes.head(1000).astype({"IPI_tipi":str}), use_container_width=True)
+            st.download_button("Baixar exceções (CSV)", excecoes.to_csv(index=False).encode("utf-8"),
+                               file_name=f"auditoria_{resumo['data']}.csv", mime="text/csv")
+    else:
+        arvore=obter("arvore_ncm")
+        rotulo=lambda c: "—" if not c else f"{formatar_codigo(c)} - {arvore.descricoes[c]}"
+        codigo=""
+        while arvore.filhos(codigo):
+            escolha=st.selectbox("Capítulo:" if not codigo else f"Dentro de {formatar_codigo(codigo)}:",
+                                 [""]+arvore.filhos(codigo), format_func=rotulo, key=f"ncm_nav_{codigo}")
+            if not escolha: break
+            codigo=escolha
+        if codigo:
+            st.markdown("**Caminho**")
+            st.table(pd.DataFrame([arvore.linha(c) for c in arvore.caminho(codigo)]).astype({"IPI":str}))
+            filhos=arvore.filhos(codigo)
+            if filhos:
+                st.markdown(f"**Subdivisões** ({len(arvore.descendentes(codigo))} códigos abaixo)")
+                st.table(pd.DataFrame([arvore.linha(c) for c in filhos]).astype({"IPI":str}))
 
 # ==========================
 # Aba 4: Análise Inteligente de NCM 🤖
@@ -351,19 +326,7 @@ elif aba=="Análise Inteligente de NCM 🤖":
     st.subheader("Análise Inteligente de NCM com IA Groqk")
 
     # ==== Gerenciamento de API Keys por usuário ====
-    KEYS_FILE = "keys.json"
-
-    def carregar_keys():
-        if os.path.exists(KEYS_FILE):
-            with open(KEYS_FILE, "r") as f:
-                return json.load(f)
-        return {}
-
-    def salvar_keys(keys):
-        with open(KEYS_FILE, "w") as f:
-            json.dump(keys, f, indent=4)
-
-    keys_db = carregar_keys()
+    keys_db = carregar_chaves()
     usuarios_existentes = list(keys_db.keys())
     usuario = st.selectbox("Selecione o usuário:", ["Novo usuário"] + usuarios_existentes)
     if usuario == "Novo usuário":
@@ -379,18 +342,18 @@ elif aba=="Análise Inteligente de NCM 🤖":
         )
         if st.button("Salvar Key"):
             if api_key_input:
+                salvar_chave(usuario, api_key_input)
                 keys_db[usuario] = api_key_input
-                salvar_keys(keys_db)
                 st.success(f"✅ Key salva para {usuario}")
                 st.session_state.groq_api_key = api_key_input
-                st.session_state.modelos_groqk = buscar_modelos_groqk(api_key_input)
+                st.session_state.modelos_groqk = listar_modelos(api_key_input)
             else:
                 st.warning("⚠️ Digite uma chave válida.")
 
         # Se já houver key, carrega automaticamente
         if usuario in keys_db and keys_db[usuario]:
             st.session_state.groq_api_key = keys_db[usuario]
-            st.session_state.modelos_groqk = buscar_modelos_groqk(keys_db[usuario])
+            st.session_state.modelos_groqk = listar_modelos(keys_db[usuario])
 
         modelo = st.selectbox(
             "Selecione o modelo Groqk:",
@@ -399,41 +362,110 @@ elif aba=="Análise Inteligente de NCM 🤖":
         )
         produto_ia = st.text_input("Título do produto:", key="produto_ia_input")
 
+        usar_candidatos = st.checkbox("Pré-selecionar candidatos da tabela NCM", value=True, key="ia_candidatos",
+                                      help="A IA escolhe entre os códigos mais parecidos da base local, "
+                                           "o que evita códigos inexistentes e traz o IPI junto.")
+
         if st.button("Analisar NCM com IA"):
             if st.session_state.groq_api_key and produto_ia and modelo:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {st.session_state.groq_api_key}"
-                }
-                payload = {
-                    "model": modelo,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": f"Informe o NCM ideal para o produto: '{produto_ia}', considerando menor imposto possível e correta classificação fiscal."
-                        }
-                    ]
-                }
-                try:
-                    resp = requests.post(
-                        "https://api.groq.com/openai/v1/chat/completions",
-                        headers=headers,
-                        json=payload,
-                        timeout=15
-                    )
-                    if resp.status_code == 200:
-                        data = resp.json()
-                        resposta = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+                if usar_candidatos:
+                    sugestao, candidatos, erro = sugerir_ncm(st.session_state.groq_api_key, modelo, produto_ia)
+                    if erro:
+                        st.error(erro)
+                    elif sugestao is None:
+                        st.warning("Nenhum dos candidatos serve para este produto.")
+                    else:
+                        origem = {"classificador": f"Previsto pelo classificador local "
+                                                   f"(confiança {sugestao.get('confianca', 0):.0%}), sem consultar a IA.",
+                                  "busca local": "Escolhido direto pela busca local (sem consultar a IA).",
+                                  "IA": "Escolhido pela IA entre os candidatos."}
+                        resposta = f"{formatar_codigo(sugestao['codigo'])} - {sugestao['descricao']}"
+                        st.session_state.groq_resultado = resposta
+                        st.session_state.historico_ncm.append({"Produto": produto_ia, "NCM": resposta})
+                        st.markdown(
+                            f"<div class='card'><h4>Resultado IA</h4><p><b>NCM:</b> {formatar_codigo(sugestao['codigo'])}<br>"
+                            f"<b>Descrição:</b> {sugestao['descricao']}<br><b>IPI:</b> {sugestao['IPI']}</p></div>",
+                            unsafe_allow_html=True
+                        )
+                        st.caption(origem[sugestao["origem"]])
+                    if candidatos:
+                        with st.expander("Candidatos considerados"):
+                            st.dataframe(pd.DataFrame(
+                                [{"NCM": formatar_codigo(c["codigo"]), "Descrição": c["rotulo"], "IPI": str(c["IPI"]),
+                                  "Similaridade": c["similaridade"], "Confiança": c.get("confianca")}
+                                 for c in candidatos]), use_container_width=True)
+                else:
+                    resposta, erro, do_cache = consultar_ncm_ia(st.session_state.groq_api_key, modelo, produto_ia)
+                    if erro:
+                        st.error(erro)
+                    else:
                         st.session_state.groq_resultado = resposta
                         st.session_state.historico_ncm.append({"Produto": produto_ia, "NCM": resposta})
                         st.markdown(
                             f"<div class='card'><h4>Resultado IA</h4><p>{resposta}</p></div>",
                             unsafe_allow_html=True
                         )
+                        if do_cache:
+                            st.caption("Resposta reaproveitada de uma análise anterior.")
+
+        with st.expander("Classificar uma lista de produtos (lote)"):
+            arquivo_ia = st.file_uploader("Planilha com os títulos:", type=["csv","xlsx"], key="ia_lote")
+            if arquivo_ia is not None:
+                if arquivo_ia.name.lower().endswith(".xlsx"):
+                    lista_ia = pd.read_excel(arquivo_ia, dtype=str)
+                else:
+                    lista_ia = pd.read_csv(arquivo_ia, dtype=str, sep=None, engine="python")
+                coluna_ia = st.selectbox("Coluna com o título:", list(lista_ia.columns), key="ia_lote_coluna")
+                concorrencia = st.slider("Consultas simultâneas:", 1, 32, 8, key="ia_lote_conc")
+                if st.button("Classificar lista"):
+                    if st.session_state.groq_api_key and modelo:
+                        barra = st.progress(0.0, text="Classificando...")
+                        resultado_ia = classificar_produtos(
+                            lista_ia[coluna_ia].fillna(""), st.session_state.groq_api_key, modelo,
+                            concorrencia=concorrencia,
+                            progresso=lambda feitas, total: barra.progress(feitas/total, text=f"{feitas}/{total}")
+                        )
+                        barra.empty()
+                        falhas = int((resultado_ia["erro"]!="").sum())
+                        st.success(f"{len(resultado_ia)-falhas} títulos classificados.")
+                        if falhas: st.warning(f"{falhas} títulos com erro; classifique de novo para tentar só esses.")
+                        st.dataframe(resultado_ia, use_container_width=True)
+                        st.download_button("Baixar resultado (CSV)", resultado_ia.to_csv(index=False).encode("utf-8"),
+                                           file_name="classificacao_ia.csv", mime="text/csv")
                     else:
-                        st.error(f"Erro ao consultar IA: {resp.status_code}")
-                except Exception as e:
-                    st.error(f"Erro ao consultar IA: {str(e)}")
+                        st.warning("⚠️ Salve uma API Key e escolha um modelo.")
+
+# ==========================
+# Aba 5: Status dos dados ⚙️
+# ==========================
+elif aba=="Status dos dados ⚙️":
+    st.subheader("Status dos dados")
+    if aquecimento.is_alive():
+        st.info("Carregando os datasets da partida em segundo plano...")
+    recarregar=st.multiselect("Recarregar (junto com os datasets montados a partir deles):",
+                              [linha["nome"] for linha in status()], key="status_recarregar")
+    if st.button("Recarregar", key="btn_recarregar") and recarregar:
+        descartados=sorted({nome for escolhido in recarregar for nome in invalidar(escolhido)})
+        with st.spinner("Recarregando..."):
+            for nome in descartados: obter(nome)
+        st.success(f"Recarregados: {', '.join(descartados)}")
+    medir=st.checkbox("Medir a memória de cada dataset", key="status_memoria")
+    linhas=status(medir_memoria=medir)
+    estado=pd.DataFrame(linhas)
+    rss=memoria_processo()
+    c1,c2,c3=st.columns(3)
+    c1.metric("Datasets carregados", len(estado))
+    c2.metric("Memória do processo", f"{rss/2**20:.0f} MB" if rss else "—")
+    if medir and len(estado):
+        c3.metric("Mapeada de arquivos", f"{estado['mapeada_mb'].sum():.0f} MB")
+    if len(estado):
+        estado["carregado_em"]=[f"{datetime.fromtimestamp(t):%d/%m %H:%M:%S}" for t in estado["carregado_em"]]
+        estado["carga_s"]=estado["carga_s"].astype(float).round(2)
+        st.dataframe(estado, use_container_width=True, hide_index=True)
+    feed=obter("feed") if any(linha["nome"]=="feed" for linha in linhas) else None
+    if feed is not None and feed.relatorio:
+        st.caption(f"Feed: {feed.relatorio['itens']:,} itens lidos, "
+                   f"{feed.relatorio['precos_invalidos']:,} preços ilegíveis.")
 
 # ==========================
 # Histórico lateral
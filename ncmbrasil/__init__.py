@@ -0,0 +1 @@
+"""Núcleo de dados e buscas do Dashboard NCM & IPI."""
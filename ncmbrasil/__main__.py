@@ -0,0 +1,3 @@
+from ncmbrasil.cli import main
+
+main()
@@ -0,0 +1,98 @@
+"""Atualização do feed em segundo plano, sem reiniciar o processo.
+
+O XML do feed é regerado de hora em hora. `atualizar_feed` só relê o arquivo
+quando o mtime ou o tamanho mudaram, monta o Feed novo ao lado do atual
+(reaproveitando os títulos já normalizados), calcula as diferenças por SKU e
+troca o dataset "feed" de uma vez. Consultas em andamento terminam com o Feed
+antigo; nenhuma vê um índice pela metade.
+
+    vigia = iniciar_vigia(intervalo=60)
+"""
+import logging
+import os
+import threading
+import time
+
+from ncmbrasil import datasets
+from ncmbrasil.compartilhado import abrir_feed
+from ncmbrasil.feed import diferencas
+
+INTERVALO = 60
+
+log = logging.getLogger(__name__)
+# Uma atualização por vez, mesmo chamando atualizar_feed de fora do vigia
+_trava = threading.Lock()
+_vigia = None
+_trava_vigia = threading.Lock()
+
+
+def assinatura(caminho):
+    estado = os.stat(caminho)
+    return estado.st_mtime_ns, estado.st_size
+
+
+def atualizar_feed(caminho=None):
+    """Recarrega o feed se o XML mudou e devolve as diferenças (None se nada mudou).
+
+    Um XML inválido ou que mudou durante a leitura (ainda sendo gravado) é
+    ignorado: o feed atual continua valendo e a próxima chamada tenta de novo.
+    """
+    caminho = caminho or datasets.caminho("feed")
+    with _trava:
+        if not os.path.exists(caminho):
+            return None
+        atual = datasets.obter("feed")
+        if atual is not None and atual.assinatura == assinatura(caminho):
+            return None
+        inicio = time.perf_counter()
+        novo = abrir_feed(caminho, anterior=atual)
+        if novo is None or novo.assinatura != assinatura(caminho):
+            log.warning("Feed %s incompleto ou em gravação; nova tentativa na próxima verificação.", caminho)
+            return None
+        if novo.titulos.usa_prefiltro():
+            # Pronto antes da troca, para a primeira busca não pagar a montagem
+            novo.titulos.trigramas()
+        carga = time.perf_counter() - inicio
+        mudancas = diferencas(atual, novo)
+        datasets.substituir("feed", novo, carga)
+        log.info("Feed atualizado: %s", {chave: len(skus) for chave, skus in mudancas.items()})
+        return mudancas
+
+
+class VigiaFeed:
+    """Thread que chama `atualizar_feed` a cada `intervalo` segundos."""
+
+    def __init__(self, intervalo=INTERVALO, caminho=None):
+        self.intervalo = intervalo
+        self.caminho = caminho
+        # (quando, contagem por tipo de mudança) da última troca de feed
+        self.ultima = None
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._rodar, name="vigia-feed", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+
+    def _rodar(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                mudancas = atualizar_feed(self.caminho)
+            except Exception:
+                log.exception("Falha ao atualizar o feed")
+                continue
+            if mudancas is not None:
+                self.ultima = (time.time(), {chave: len(skus) for chave, skus in mudancas.items()})
+
+
+def iniciar_vigia(intervalo=INTERVALO):
+    """O vigia do processo, criado e iniciado na primeira chamada."""
+    global _vigia
+    with _trava_vigia:
+        if _vigia is None:
+            _vigia = VigiaFeed(intervalo).iniciar()
+        return _vigia
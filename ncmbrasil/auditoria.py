@@ -0,0 +1,116 @@
+"""Auditoria do catálogo: feed, IPI Itens e TIPI/NCM conferidos entre si numa passada só.
+
+O catálogo é o outer join por SKU do feed com IPI Itens; os NCMs distintos
+passam uma vez por `vigencia.consultar_na_data` (existência, vigência na data
+e alíquota da TIPI, própria ou herdada) e o resultado volta para os SKUs por
+posição. Cada problema encontrado vira uma linha da lista de exceções.
+
+    excecoes, resumo = auditar_catalogo(obter("feed"), obter("ipi_por_sku"),
+                                        obter("vigencias_ncm"), obter("vigencias_tipi"))
+"""
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from ncmbrasil.ncm import padronizar_codigos
+from ncmbrasil.vigencia import consultar_na_data
+
+# Diferença (em pontos percentuais) a partir da qual o IPI % diverge da TIPI
+TOLERANCIA_IPI = 0.01
+PROBLEMAS = {
+    "fora_do_feed": "SKU de IPI Itens sem item no feed",
+    "fora_do_ipi_itens": "SKU do feed sem cadastro em IPI Itens",
+    "sem_ncm": "Item do feed sem NCM",
+    "ncm_invalido": "NCM inexistente na tabela NCM ou que não é subitem (8 dígitos)",
+    "ncm_expirado": "NCM da tabela, mas fora de vigência na data",
+    "ipi_ilegivel": "IPI % vazio ou ilegível em IPI Itens",
+    "ipi_divergente": "IPI % de IPI Itens diferente da alíquota da TIPI",
+}
+COLUNAS_EXCECOES = ["SKU", "titulo", "NCM", "IPI_itens", "IPI_tipi", "origem_IPI", "problema", "detalhe"]
+
+
+def _catalogo(feed, itens):
+    """Outer join por SKU: SKU, titulo, ncm, IPI_itens, no_feed, no_ipi_itens."""
+    if feed is not None:
+        do_feed = feed.tabela.select(["sku", "titulo", "ncm"]).to_pandas() \
+            .rename(columns={"sku": "SKU"}).drop_duplicates("SKU")
+        do_feed["ncm"] = do_feed["ncm"].astype(object)
+    else:
+        do_feed = pd.DataFrame(columns=["SKU", "titulo", "ncm"])
+    dos_itens = pd.DataFrame({"SKU": itens.index.astype(str), "IPI_itens": itens["IPI %"].to_numpy(),
+                              "descricao_itens": itens["Descrição Item"].to_numpy()})
+    catalogo = do_feed.merge(dos_itens, on="SKU", how="outer", indicator=True)
+    # Sem item no feed, o nome vem de IPI Itens
+    catalogo["titulo"] = catalogo["titulo"].fillna(catalogo["descricao_itens"])
+    catalogo["no_feed"] = catalogo["_merge"] != "right_only"
+    catalogo["no_ipi_itens"] = catalogo["_merge"] != "left_only"
+    return catalogo.drop(columns=["_merge", "descricao_itens"]).reset_index(drop=True)
+
+
+def auditar_catalogo(feed, itens, ncm, tipi, data=None, tolerancia=TOLERANCIA_IPI):
+    """(exceções, resumo) do catálogo na `data` (padrão: hoje).
+
+    `itens` é IPI Itens indexado por SKU; `ncm` e `tipi` são as Vigencias da
+    tabela NCM e da TIPI. Um SKU pode ter mais de uma exceção. `data` em
+    texto é aaaa-mm-dd; outro formato levanta ValueError, em vez de marcar
+    todo o catálogo como fora de vigência.
+    """
+    inicio = time.perf_counter()
+    if isinstance(data, str):
+        try:
+            data = date.fromisoformat(data)
+        except ValueError:
+            raise ValueError(f"Data inválida: {data!r} (use aaaa-mm-dd).") from None
+    data = data or date.today()
+    catalogo = _catalogo(feed, itens)
+
+    posicoes, distintos = pd.factorize(catalogo["ncm"].fillna(""))
+    distintos = padronizar_codigos(distintos)
+    consulta = consultar_na_data(distintos, [data] * len(distintos), ncm, tipi)
+    codigos = consulta["codigo"].to_numpy()[posicoes]
+    existe = ncm.contem(consulta["codigo"])[posicoes] & (consulta["codigo"].str.len() == 8).to_numpy()[posicoes]
+    em_vigor = (consulta["erro"] == "").to_numpy()[posicoes]
+    ipi_tipi = consulta["IPI"].to_numpy()[posicoes]
+    origem = consulta["origem_IPI"].to_numpy()[posicoes]
+
+    no_feed = catalogo["no_feed"].to_numpy()
+    no_ipi_itens = catalogo["no_ipi_itens"].to_numpy()
+    ipi_itens = pd.to_numeric(catalogo["IPI_itens"], errors="coerce").to_numpy(dtype=float)
+    tem_ncm = no_feed & (codigos != "")
+    # "NT" (sem alíquota na TIPI) equivale a 0%
+    tipi_pct = pd.to_numeric(pd.Series(ipi_tipi).replace("NT", 0.0), errors="coerce").to_numpy(dtype=float)
+    comparavel = tem_ncm & existe & em_vigor & no_ipi_itens
+
+    mascaras = {
+        "fora_do_feed": ~no_feed,
+        "fora_do_ipi_itens": ~no_ipi_itens,
+        "sem_ncm": no_feed & ~tem_ncm,
+        "ncm_invalido": tem_ncm & ~existe,
+        "ncm_expirado": tem_ncm & existe & ~em_vigor,
+        "ipi_ilegivel": comparavel & np.isnan(ipi_itens),
+        "ipi_divergente": comparavel & (np.abs(ipi_itens - tipi_pct) > tolerancia),
+    }
+    base = pd.DataFrame({
+        "SKU": catalogo["SKU"].to_numpy(),
+        "titulo": catalogo["titulo"].fillna("").to_numpy(),
+        "NCM": np.where(no_feed, codigos, ""),
+        "IPI_itens": ipi_itens,
+        "IPI_tipi": np.where(tem_ncm, ipi_tipi, ""),
+        "origem_IPI": np.where(tem_ncm, origem, ""),
+    })
+    partes = [base[mascara].assign(problema=problema, detalhe=PROBLEMAS[problema])
+              for problema, mascara in mascaras.items() if mascara.any()]
+    excecoes = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUNAS_EXCECOES)
+
+    resumo = {
+        "data": str(data),
+        "skus": len(catalogo),
+        "skus_no_feed": int(no_feed.sum()),
+        "skus_em_ipi_itens": int(no_ipi_itens.sum()),
+        "skus_com_problema": int(excecoes["SKU"].nunique()),
+        "por_problema": {problema: int(mascara.sum()) for problema, mascara in mascaras.items()},
+        "tempo_s": round(time.perf_counter() - inicio, 2),
+    }
+    return excecoes.sort_values(["SKU", "problema"], kind="stable").reset_index(drop=True), resumo
@@ -0,0 +1,330 @@
+"""Corpus de textos normalizados para busca aproximada com rapidfuzz."""
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import unidecode
+from rapidfuzz import fuzz, process
+
+# Limite de células (consultas x textos) da matriz de scores de cada bloco do cdist
+CELULAS_POR_BLOCO = 10_000_000
+# A partir deste tamanho a busca pré-seleciona candidatos pelo índice de trigramas
+MIN_TEXTOS_PREFILTRO = 5_000
+# Quantos candidatos do índice de trigramas vão para o WRatio
+CANDIDATOS_PREFILTRO = 500
+# Trigramas presentes em mais que esta fração dos textos não ajudam a separar
+# candidatos e custam caro (listas enormes); ficam de fora da consulta
+FRACAO_MAX_TRIGRAMA = 0.2
+# Candidatos guardados por consulta, de onde sai o piso da consulta seguinte
+CANDIDATOS_REFINAMENTO = 300
+# O cdist converte o score_cutoff para distância com arredondamento e pode
+# descartar um texto com score igual ao piso; o piso desce esta folga
+FOLGA_PISO = 0.01
+
+
+# Palavras que não distinguem uma classificação de outra
+PALAVRAS_VAZIAS = frozenset(
+    "a o e as os um uma de da do das dos em na no nas nos com sem para por pelo pela ou que se sua seu "
+    "suas seus mesmo mesma mesmos mesmas outro outra outros outras exceto inclusive".split())
+
+
+def normalizar(texto):
+    texto = unidecode.unidecode(str(texto).lower())
+    texto = re.sub(r"[^a-z0-9\s]", " ", texto)
+    return re.sub(r"\s+", " ", texto)
+
+
+def normalizar_termos(texto):
+    """`normalizar` sem palavras vazias, números soltos e siglas de até 2 letras.
+
+    Na comparação parcial do WRatio esses pedaços curtos casam com quase
+    qualquer texto longo e empatam resultados que nada têm a ver.
+    """
+    return " ".join(p for p in normalizar(texto).split()
+                    if p not in PALAVRAS_VAZIAS and len(p) > 2 and not p.isdigit())
+
+
+def _melhores(scores, limite):
+    """Posições dos `limite` maiores scores; empates ficam na ordem do corpus."""
+    limite = min(limite, len(scores))
+    if limite <= 0:
+        return np.empty(0, dtype=np.int64)
+    corte = np.partition(scores, len(scores) - limite)[len(scores) - limite]
+    candidatos = np.flatnonzero(scores >= corte)
+    return candidatos[np.lexsort((candidatos, -scores[candidatos]))][:limite]
+
+
+# Símbolos do texto normalizado: a-z, 0-9 e espaço; o resto vira separador
+_SIMBOLOS = np.full(256, 37, dtype=np.int64)
+_SIMBOLOS[np.frombuffer(b"abcdefghijklmnopqrstuvwxyz0123456789 ", dtype=np.uint8)] = np.arange(37)
+_BASE = 38
+
+
+def _trigramas(texto):
+    """(códigos, posição inicial) dos trigramas do texto que não cruzam um separador."""
+    simbolos = _SIMBOLOS[np.frombuffer(texto.encode("ascii", "replace"), dtype=np.uint8)]
+    codigos = simbolos[:-2] * _BASE * _BASE + simbolos[1:-1] * _BASE + simbolos[2:]
+    validos = np.flatnonzero((simbolos[:-2] != 37) & (simbolos[1:-1] != 37) & (simbolos[2:] != 37))
+    return codigos[validos], validos
+
+
+class IndiceTrigramas:
+    """Índice invertido trigrama -> posições dos textos que o contêm.
+
+    Os trigramas incluem os espaços ao redor de cada palavra, então palavras
+    inteiras (e as de uma ou duas letras) também pesam. A consulta soma o IDF
+    dos trigramas em comum com cada texto e devolve os mais bem pontuados.
+    """
+
+    __slots__ = ("inicios", "posicoes", "total")
+
+    def __init__(self, textos):
+        self.total = len(textos)
+        # Tudo num único buffer, separado por "\n": trigramas e texto dono de
+        # cada um saem em numpy, sem laço em Python por texto
+        unido = "\n".join(f" {t} " for t in textos)
+        codigos, inicios = _trigramas(unido)
+        quebras = np.flatnonzero(np.frombuffer(unido.encode("ascii", "replace"), dtype=np.uint8) == ord("\n"))
+        pares = codigos * self.total + np.searchsorted(quebras, inicios)
+        # sort + comparação com o vizinho: o np.unique do numpy 2 leva 15x mais
+        pares.sort()
+        pares = pares[np.concatenate(([True], pares[1:] != pares[:-1]))]
+        codigos, self.posicoes = np.divmod(pares, self.total)
+        self.posicoes = self.posicoes.astype(np.int32)
+        self.inicios = np.searchsorted(codigos, np.arange(_BASE ** 3 + 1))
+
+    @classmethod
+    def de_arrays(cls, inicios, posicoes, total):
+        """Índice já montado (por exemplo, arrays mapeados de disco), sem recalcular nada."""
+        indice = cls.__new__(cls)
+        indice.inicios, indice.posicoes, indice.total = inicios, posicoes, total
+        return indice
+
+    def candidatos(self, texto, limite):
+        """Posições dos até `limite` textos com mais trigramas (ponderados) em comum.
+
+        Vazio quando a consulta não tem trigrama útil: quem chama cai na busca
+        completa.
+        """
+        codigos = np.unique(_trigramas(f" {texto} ")[0])
+        frequencias = self.inicios[codigos + 1] - self.inicios[codigos]
+        uteis = (frequencias > 0) & (frequencias <= max(1, FRACAO_MAX_TRIGRAMA * self.total))
+        codigos, frequencias = codigos[uteis], frequencias[uteis]
+        if not len(codigos):
+            return np.empty(0, dtype=np.int64)
+        listas = [self.posicoes[self.inicios[c]:self.inicios[c + 1]] for c in codigos]
+        pesos = np.repeat(np.log(self.total / frequencias), frequencias)
+        pontos = np.bincount(np.concatenate(listas), weights=pesos, minlength=self.total)
+        # Corte no `limite`-ésimo maior (empates entram todos); já sai na ordem
+        # do corpus, para os empates do WRatio ficarem como na busca completa
+        corte = np.partition(pontos, self.total - limite)[self.total - limite] if limite < self.total else 0
+        return np.flatnonzero(pontos >= corte) if corte > 0 else np.flatnonzero(pontos > 0)
+
+
+class IndiceFuzzy:
+    """Textos já normalizados e, na mesma ordem, o id de linha de cada um.
+
+    A normalização acontece uma única vez, na construção; cada consulta só
+    normaliza o termo buscado. Corpora grandes ganham, na primeira busca, um
+    índice de trigramas que reduz cada consulta a `CANDIDATOS_PREFILTRO`
+    textos antes do WRatio; termos sem trigrama útil, ou com menos candidatos
+    que o pedido, caem na comparação com o corpus inteiro. Com
+    `prefiltro=False` toda busca compara com o corpus inteiro: nas descrições
+    NCM, curtas e com vocabulário repetido, o pré-filtro perde ~12% do top-10.
+    """
+
+    __slots__ = ("textos", "ids", "normalizador", "prefiltro", "_trigramas", "_trava")
+
+    def __init__(self, textos, ids=None, normalizador=normalizar, prefiltro=True):
+        self.normalizador = normalizador
+        self.textos = [normalizador(t) for t in textos]
+        self.ids = list(range(len(self.textos))) if ids is None else list(ids)
+        self.prefiltro = prefiltro
+        self._trigramas = None
+        self._trava = threading.Lock()
+
+    @classmethod
+    def de_normalizados(cls, textos, ids, normalizador=normalizar, trigramas=None, prefiltro=True):
+        """Índice sobre textos que já passaram por `normalizador` (sem normalizar de novo).
+
+        `trigramas`, se dado, é o IndiceTrigramas desses mesmos textos.
+        """
+        indice = cls.__new__(cls)
+        indice.__setstate__((list(textos), list(ids), normalizador, prefiltro))
+        indice._trigramas = trigramas
+        return indice
+
+    def __getstate__(self):
+        # O índice de trigramas é refeito sob demanda; a trava não é serializável
+        return self.textos, self.ids, self.normalizador, self.prefiltro
+
+    def __setstate__(self, estado):
+        self.textos, self.ids, self.normalizador, self.prefiltro = estado
+        self._trigramas = None
+        self._trava = threading.Lock()
+
+    def usa_prefiltro(self):
+        """Se as buscas passam pelo índice de trigramas (corpus grande e pré-filtro ligado)."""
+        return self.prefiltro and len(self.textos) >= MIN_TEXTOS_PREFILTRO
+
+    def trigramas(self):
+        """O índice de trigramas, montado uma vez só na primeira chamada."""
+        if self._trigramas is None:
+            with self._trava:
+                if self._trigramas is None:
+                    self._trigramas = IndiceTrigramas(self.textos)
+        return self._trigramas
+
+    def __len__(self):
+        return len(self.textos)
+
+    def buscar(self, termo, limite=10):
+        """Retorna [(id, score), ...] dos textos mais parecidos com o termo."""
+        return self.buscar_lote([termo], limite)[0]
+
+    def buscar_lote(self, termos, limite=10):
+        """Uma lista de resultados de `buscar` por termo.
+
+        O cdist libera o GIL e usa todos os núcleos (workers=-1), então sessões
+        concorrentes não se enfileiram atrás de uma única busca.
+        """
+        termos = [self.normalizador(t) for t in termos]
+        if not self.textos or limite <= 0:
+            return [[] for _ in termos]
+        limite = min(limite, len(self.textos))
+        resultados = [None] * len(termos)
+        completos = list(range(len(termos)))
+        if self.usa_prefiltro():
+            completos = []
+            trigramas = self.trigramas()
+            for i, termo in enumerate(termos):
+                candidatos = trigramas.candidatos(termo, max(CANDIDATOS_PREFILTRO, limite))
+                if len(candidatos) < limite:
+                    completos.append(i)
+                    continue
+                scores = process.cdist([termo], [self.textos[c] for c in candidatos], scorer=fuzz.WRatio,
+                                       dtype=np.float64)[0]
+                resultados[i] = [(self.ids[candidatos[j]], float(scores[j])) for j in _melhores(scores, limite)]
+
+        bloco = max(1, CELULAS_POR_BLOCO // len(self.textos))
+        for ini in range(0, len(completos), bloco):
+            indices = completos[ini:ini + bloco]
+            scores = process.cdist([termos[i] for i in indices], self.textos, scorer=fuzz.WRatio,
+                                   dtype=np.float64, workers=-1)
+            for i, linha in zip(indices, scores):
+                resultados[i] = [(self.ids[j], float(linha[j])) for j in _melhores(linha, limite)]
+        return resultados
+
+    def buscar_completo(self, termo, limite=10):
+        """`buscar` comparando com o corpus inteiro, sem o índice de trigramas."""
+        termo = self.normalizador(termo)
+        if not self.textos:
+            return []
+        linha = process.cdist([termo], self.textos, scorer=fuzz.WRatio, dtype=np.float64, workers=-1)[0]
+        return [(self.ids[j], float(linha[j])) for j in _melhores(linha, min(limite, len(self.textos)))]
+
+
+class BuscaIncremental:
+    """Busca enquanto o usuário digita sobre um IndiceFuzzy, com o mesmo resultado de `IndiceFuzzy.buscar`.
+
+    Cada consulta guarda, num LRU limitado e compartilhado por todas as
+    sessões, seus melhores candidatos (posições no corpus) e scores. Quando a
+    consulta estende outra já vista ("chave de f" -> "chave de fe"), o
+    `limite`-ésimo score do termo novo nos candidatos dela é um piso para o
+    top-`limite`: a comparação com o índice inteiro roda com esse
+    `score_cutoff`, e o rapidfuzz descarta cedo os textos que não chegam lá.
+    """
+
+    __slots__ = ("indice", "max_consultas", "min_caracteres", "_memo", "_trava")
+
+    def __init__(self, indice, max_consultas=2048, min_caracteres=3):
+        self.indice = indice
+        self.max_consultas = max_consultas
+        self.min_caracteres = min_caracteres
+        self._memo = OrderedDict()
+        self._trava = threading.Lock()
+
+    def _lembrado(self, termo):
+        with self._trava:
+            valor = self._memo.get(termo)
+            if valor is not None:
+                self._memo.move_to_end(termo)
+            return valor
+
+    def _lembrar(self, termo, valor):
+        with self._trava:
+            self._memo[termo] = valor
+            self._memo.move_to_end(termo)
+            while len(self._memo) > self.max_consultas:
+                self._memo.popitem(last=False)
+
+    def _pontuar(self, termo, posicoes=None, piso=0):
+        """Scores do termo nas `posicoes` (None: corpus inteiro); abaixo de `piso` saem 0."""
+        textos = self.indice.textos if posicoes is None else [self.indice.textos[p] for p in posicoes]
+        return process.cdist([termo], textos, scorer=fuzz.WRatio, dtype=np.float64, workers=-1,
+                             score_cutoff=piso)[0]
+
+    def _universo(self, termo, limite):
+        """Posições que `IndiceFuzzy.buscar` compara: os candidatos do pré-filtro, ou None (corpus inteiro)."""
+        if self.indice.usa_prefiltro():
+            candidatos = self.indice.trigramas().candidatos(termo, max(CANDIDATOS_PREFILTRO, limite))
+            if len(candidatos) >= limite:
+                return candidatos
+        return None
+
+    def _consultar(self, termo, limite, anteriores=None):
+        """(posições, scores, maior score deixado de fora) de uma consulta.
+
+        `anteriores` são os candidatos de um prefixo do termo: os scores do
+        termo neles são scores de verdade, então o `limite`-ésimo deles é um
+        piso que o top-`limite` do índice inteiro não fica abaixo.
+        """
+        universo = self._universo(termo, limite)
+        piso = 0
+        if anteriores is not None:
+            if universo is not None:
+                anteriores = np.intersect1d(anteriores, universo)
+            previa = self._pontuar(termo, anteriores)
+            if len(previa) >= limite:
+                piso = max(previa[_melhores(previa, limite)[-1]] - FOLGA_PISO, 0)
+        scores = self._pontuar(termo, universo, piso)
+        manter = np.sort(_melhores(scores, min(CANDIDATOS_REFINAMENTO, len(scores))))
+        fora = np.delete(scores, manter).max(initial=-1)
+        if piso > 0:
+            # Os cortados pelo score_cutoff saem 0, mas podem ter até quase o piso
+            fora = max(fora, np.nextafter(piso, -np.inf))
+        posicoes = manter if universo is None else universo[manter]
+        return posicoes, scores[manter], fora
+
+    @staticmethod
+    def _completo(valor, limite):
+        """Se o top-`limite` dos candidatos guardados é o do índice inteiro."""
+        _, scores, fora = valor
+        if len(scores) < limite:
+            return fora < 0
+        return scores[_melhores(scores, limite)[-1]] > fora
+
+    def buscar(self, termo, limite=10):
+        """[(id, score), ...] como `IndiceFuzzy.buscar`; vazio abaixo de `min_caracteres`."""
+        termo = self.indice.normalizador(termo).strip()
+        if len(termo) < self.min_caracteres or not self.indice.textos or limite <= 0:
+            return []
+        valor = self._lembrado(termo)
+        if valor is None or not self._completo(valor, limite):
+            anteriores = None
+            for fim in range(len(termo) - 1, self.min_caracteres - 1, -1):
+                anterior = self._lembrado(termo[:fim])
+                if anterior is not None:
+                    anteriores = anterior[0]
+                    break
+            valor = self._consultar(termo, limite, anteriores)
+            self._lembrar(termo, valor)
+        posicoes, scores, _ = valor
+        if not len(scores):
+            return []
+        ids = self.indice.ids
+        return [(ids[posicoes[j]], float(scores[j])) for j in _melhores(scores, min(limite, len(scores)))]
+
+    def __len__(self):
+        return len(self._memo)
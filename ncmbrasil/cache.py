@@ -0,0 +1,110 @@
+"""Cache em disco (Arrow/Feather) dos DataFrames já tratados das planilhas de origem.
+
+Cada arquivo de origem gera um .arrow em PASTA_CACHE com o resultado de
+`preparar` e, nos metadados do schema, a assinatura da origem (caminho, mtime,
+tamanho, sha256 e versão do tratamento). Como dados e assinatura estão no mesmo
+arquivo, substituído atomicamente, processos concorrentes nunca leem um par
+inconsistente.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.ipc as ipc
+
+PASTA_CACHE = os.environ.get(
+    "NCMBRASIL_CACHE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"),
+)
+CHAVE_META = b"ncmbrasil"
+
+
+def nome_origem(caminho):
+    """Nome de arquivo para o que é derivado de `caminho`: o nome da origem e o sha1 do caminho absoluto."""
+    caminho = os.path.abspath(caminho)
+    chave = hashlib.sha1(caminho.encode("utf-8")).hexdigest()[:12]
+    nome = re.sub(r"[^\w.-]", "_", os.path.basename(caminho))
+    return f"{nome}.{chave}"
+
+
+def _arquivo_cache(caminho, pasta):
+    return os.path.join(pasta, f"{nome_origem(caminho)}.arrow")
+
+
+def _sha256(caminho):
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _ler_assinatura(arquivo):
+    with pa.memory_map(arquivo) as fonte:
+        meta = ipc.open_file(fonte).schema.metadata or {}
+    return json.loads(meta.get(CHAVE_META, b"{}"))
+
+
+def _ler(arquivo):
+    return feather.read_table(arquivo, memory_map=True).to_pandas()
+
+
+def _gravar(df, arquivo, assinatura):
+    tabela = pa.Table.from_pandas(df)
+    meta = dict(tabela.schema.metadata or {})
+    meta[CHAVE_META] = json.dumps(assinatura).encode("utf-8")
+    tabela = tabela.replace_schema_metadata(meta)
+    os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=os.path.dirname(arquivo), suffix=".tmp")
+    os.close(fd)
+    try:
+        # Sem compressão, para a leitura poder mapear o arquivo direto na memória
+        feather.write_feather(tabela, temporario, compression="uncompressed")
+        # mkstemp cria só para o dono; processos de outro usuário também leem
+        os.chmod(temporario, 0o644)
+        os.replace(temporario, arquivo)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def carregar_com_cache(caminho, preparar, versao=1, pasta=None):
+    """Retorna `preparar(caminho)`, lendo do cache quando a origem não mudou.
+
+    O mtime e o tamanho evitam reler a origem na partida; se só o mtime mudou
+    (cópia, checkout), o sha256 decide se o cache ainda vale. Aumente `versao`
+    sempre que o tratamento feito por `preparar` mudar.
+    """
+    caminho = os.path.abspath(caminho)
+    arquivo = _arquivo_cache(caminho, pasta or PASTA_CACHE)
+    info = os.stat(caminho)
+    assinatura = {"caminho": caminho, "mtime_ns": info.st_mtime_ns,
+                  "tamanho": info.st_size, "versao": versao}
+    try:
+        anterior = _ler_assinatura(arquivo)
+    except (OSError, pa.ArrowException, ValueError):
+        anterior = {}
+
+    if anterior and all(anterior.get(k) == v for k, v in assinatura.items()):
+        try:
+            return _ler(arquivo)
+        except (OSError, pa.ArrowException):
+            pass
+    assinatura["sha256"] = _sha256(caminho)
+    if anterior.get("sha256") == assinatura["sha256"] and anterior.get("versao") == versao:
+        try:
+            df = _ler(arquivo)
+        except (OSError, pa.ArrowException):
+            df = preparar(caminho)
+    else:
+        df = preparar(caminho)
+    try:
+        _gravar(df, arquivo, assinatura)
+    except OSError:
+        # Sem permissão de escrita o cache é só dispensado
+        pass
+    return df
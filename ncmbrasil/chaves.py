@@ -0,0 +1,51 @@
+"""API keys por usuário (keys.json), mantidas em memória entre os reruns do Streamlit.
+
+O arquivo só é relido quando seu mtime muda (ex.: outro processo salvou uma
+chave); `salvar_chave` grava e descarta a cópia em memória.
+"""
+import json
+import os
+import threading
+
+ARQUIVO_CHAVES = "keys.json"
+
+_chaves = None
+_mtime = None
+_trava = threading.Lock()
+
+
+def _mtime_atual(caminho):
+    try:
+        return os.stat(caminho).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def carregar_chaves(caminho=ARQUIVO_CHAVES):
+    """Cópia do dicionário usuário -> chave."""
+    global _chaves, _mtime
+    mtime = _mtime_atual(caminho)
+    with _trava:
+        if _chaves is None or mtime != _mtime:
+            if mtime is None:
+                _chaves = {}
+            else:
+                with open(caminho, "r") as f:
+                    _chaves = json.load(f)
+            _mtime = mtime
+        return dict(_chaves)
+
+
+def salvar_chave(usuario, chave, caminho=ARQUIVO_CHAVES):
+    global _chaves
+    with _trava:
+        chaves = {}
+        if os.path.exists(caminho):
+            with open(caminho, "r") as f:
+                chaves = json.load(f)
+        chaves[usuario] = chave
+        temporario = f"{caminho}.tmp"
+        with open(temporario, "w") as f:
+            json.dump(chaves, f, indent=4)
+        os.replace(temporario, caminho)
+        _chaves = None
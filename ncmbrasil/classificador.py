@@ -0,0 +1,180 @@
+"""Classificador NCM local (TF-IDF de palavras e n-gramas de caracteres + regressão logística).
+
+Aprende com o histórico de classificações: o NCM que cada SKU já tem no feed,
+com o título do feed e a descrição do item em IPI Itens como texto. Roda só em
+CPU, sem rede, e responde em milissegundos; serve de atalho antes do LLM.
+
+    python -m ncmbrasil treinar-classificador
+"""
+import platform
+import time
+import warnings
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import FeatureUnion
+
+from ncmbrasil.busca import normalizar
+from ncmbrasil.ncm import padronizar_codigo
+
+VERSAO = 1
+# Faixas de confiança mostradas no relatório (cobertura x acerto)
+FAIXAS_CONFIANCA = (0.5, 0.7, 0.9)
+
+
+def exemplos_treino(feed, itens):
+    """DataFrame texto/ncm: um exemplo por SKU do feed com NCM de 8 dígitos.
+
+    `itens` é o IPI Itens indexado por SKU (dataset "ipi_por_sku"); quando o SKU
+    está lá, a descrição do item entra no texto junto com o título do feed.
+    """
+    if feed is None:
+        return pd.DataFrame(columns=["texto", "ncm"])
+    registros = feed.tabela.select(["sku", "titulo", "ncm"]).to_pandas().rename(columns={"sku": "SKU"})
+    registros["titulo"] = registros["titulo"].fillna("")
+    registros["ncm"] = registros["ncm"].astype(object).map(padronizar_codigo)
+    registros = registros[registros["ncm"].str.len() == 8].drop_duplicates("SKU")
+    descricao = registros["SKU"].map(itens["Descrição Item"]).fillna("") if len(itens) else ""
+    registros["texto"] = (registros["titulo"] + " " + descricao).str.strip()
+    registros = registros[registros["texto"] != ""]
+    return registros[["texto", "ncm"]].drop_duplicates().reset_index(drop=True)
+
+
+def criar_vetorizador():
+    return FeatureUnion([
+        ("palavras", TfidfVectorizer(preprocessor=normalizar, ngram_range=(1, 2), sublinear_tf=True,
+                                     max_features=200_000, dtype=np.float32)),
+        ("caracteres", TfidfVectorizer(preprocessor=normalizar, analyzer="char_wb", ngram_range=(3, 5),
+                                       sublinear_tf=True, min_df=2, max_features=300_000, dtype=np.float32)),
+    ])
+
+
+class ClassificadorNCM:
+    """Vetorizador e pesos do modelo linear, com o relatório de quando foi treinado.
+
+    A pontuação é feita aqui (`X @ pesos`) em vez de `predict_proba`, que
+    multiplica pela transposta não contígua de `coef_` a cada chamada e gasta
+    dezenas de milissegundos por texto; com os pesos já transpostos o custo
+    passa a ser praticamente só o de vetorizar o texto.
+    """
+
+    __slots__ = ("vetorizador", "pesos", "intercepto", "classes", "relatorio")
+
+    def __init__(self, vetorizador, pesos, intercepto, classes, relatorio=None):
+        self.vetorizador = vetorizador
+        self.pesos = np.ascontiguousarray(pesos, dtype=np.float32)
+        self.intercepto = np.asarray(intercepto, dtype=np.float32)
+        self.classes = np.asarray(classes)
+        self.relatorio = relatorio or {}
+
+    @classmethod
+    def treinado(cls, textos, ncms, relatorio=None):
+        vetorizador = criar_vetorizador()
+        # saga guarda um gradiente por exemplo em vez do histórico do lbfgs, que
+        # com centenas de NCMs passa de gigabytes; 30 passadas já estabilizam o
+        # acerto, então o aviso de convergência não interessa aqui
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", ConvergenceWarning)
+            modelo = LogisticRegression(C=10, solver="saga", max_iter=30, tol=1e-3).fit(
+                vetorizador.fit_transform(textos), ncms)
+        coef, intercepto = modelo.coef_, modelo.intercept_
+        if len(modelo.classes_) == 2:
+            # Binário: uma linha só; softmax de [0, z] é o sigmoide de z
+            coef = np.vstack([np.zeros_like(coef), coef])
+            intercepto = np.concatenate([[0.0], intercepto])
+        return cls(vetorizador, coef.T, intercepto, modelo.classes_, relatorio)
+
+    def prever_lote(self, textos, k=3):
+        """Para cada texto, os `k` NCMs mais prováveis: [(codigo, confianca), ...]."""
+        pontos = self.vetorizador.transform(list(textos)) @ self.pesos + self.intercepto
+        pontos = np.exp(pontos - pontos.max(axis=1, keepdims=True))
+        probabilidades = pontos / pontos.sum(axis=1, keepdims=True)
+        k = min(k, len(self.classes))
+        melhores = np.argsort(-probabilidades, axis=1, kind="stable")[:, :k]
+        return [[(self.classes[j], float(linha[j])) for j in indices]
+                for linha, indices in zip(probabilidades, melhores)]
+
+    def prever(self, texto, k=3):
+        return self.prever_lote([texto], k)[0]
+
+    def salvar(self, caminho):
+        joblib.dump({"versao": VERSAO, "vetorizador": self.vetorizador, "pesos": self.pesos,
+                     "intercepto": self.intercepto, "classes": self.classes, "relatorio": self.relatorio}, caminho)
+
+    @classmethod
+    def carregar(cls, caminho):
+        # Pesos mapeados do arquivo, somente leitura: vários processos dividem as mesmas páginas
+        artefato = joblib.load(caminho, mmap_mode="r")
+        if artefato.get("versao") != VERSAO:
+            raise ValueError(f"{caminho}: artefato da versão {artefato.get('versao')}, esperada {VERSAO}.")
+        return cls(artefato["vetorizador"], artefato["pesos"], artefato["intercepto"], artefato["classes"],
+                   artefato["relatorio"])
+
+
+def avaliar(classificador, textos, esperados):
+    """Acerto top-1/top-3, cobertura x acerto por faixa de confiança e latência."""
+    esperados = np.asarray(esperados)
+    inicio = time.perf_counter()
+    previsoes = classificador.prever_lote(textos)
+    lote_s = time.perf_counter() - inicio
+    primeiro = np.array([p[0][0] for p in previsoes])
+    confianca = np.array([p[0][1] for p in previsoes])
+    top3 = np.array([e in {c for c, _ in p} for e, p in zip(esperados, previsoes)])
+
+    faixas = {}
+    for limiar in FAIXAS_CONFIANCA:
+        aceitos = confianca >= limiar
+        faixas[f"{limiar:.2f}"] = {
+            "cobertura": round(float(aceitos.mean()), 4),
+            "acerto": round(float((primeiro[aceitos] == esperados[aceitos]).mean()), 4) if aceitos.any() else None,
+        }
+
+    # Latência de uma previsão isolada, que é o uso do app
+    amostra = list(textos[:200])
+    tempos = []
+    for texto in amostra:
+        inicio = time.perf_counter()
+        classificador.prever(texto)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "exemplos": len(esperados),
+        "acerto_top1": round(float((primeiro == esperados).mean()), 4),
+        "acerto_top3": round(float(top3.mean()), 4),
+        "por_confianca": faixas,
+        "latencia_ms_p50": round(float(np.percentile(tempos, 50)), 3) if tempos else None,
+        "latencia_ms_p95": round(float(np.percentile(tempos, 95)), 3) if tempos else None,
+        "lote_itens_por_s": round(len(esperados) / lote_s) if lote_s else None,
+    }
+
+
+def treinar(exemplos, teste=0.2, semente=0):
+    """Avalia num conjunto separado e devolve o modelo retreinado com tudo.
+
+    Com `teste=0` não há avaliação: o relatório só descreve os dados.
+    """
+    if exemplos["ncm"].nunique() < 2:
+        raise ValueError("São necessários exemplos de pelo menos dois NCMs diferentes.")
+    relatorio = {
+        "treinado_em": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "exemplos": len(exemplos),
+        "ncms": int(exemplos["ncm"].nunique()),
+        "sklearn": sklearn.__version__,
+        "python": platform.python_version(),
+    }
+    if teste:
+        treino, avaliacao = train_test_split(exemplos, test_size=teste, random_state=semente)
+        inicio = time.perf_counter()
+        modelo = ClassificadorNCM.treinado(treino["texto"], treino["ncm"])
+        relatorio["treino_s"] = round(time.perf_counter() - inicio, 2)
+        relatorio["avaliacao"] = avaliar(modelo, avaliacao["texto"].tolist(), avaliacao["ncm"].to_numpy())
+        # NCMs que só aparecem na avaliação nunca poderiam ser acertados
+        relatorio["avaliacao"]["ncm_ausente_no_treino"] = round(
+            float((~avaliacao["ncm"].isin(set(treino["ncm"]))).mean()), 4)
+    return ClassificadorNCM.treinado(exemplos["texto"], exemplos["ncm"], relatorio)
@@ -0,0 +1,185 @@
+"""Linha de comando: python -m ncmbrasil <comando> ..."""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+
+import pandas as pd
+
+from ncmbrasil import compartilhado, consultas, datasets, ia_lote, lote
+
+
+def _lote(args):
+    total = lote.processar_arquivo(
+        args.entrada, args.saida, coluna_sku=args.coluna_sku, coluna_texto=args.coluna_descricao,
+        coluna_valor=args.coluna_valor, coluna_frete=args.coluna_frete,
+        tamanho_bloco=args.bloco, processos=args.processos, sep=args.sep,
+    )
+    print(f"{total:,} linhas gravadas em {args.saida}", file=sys.stderr)
+
+
+def _classificar_ia(args):
+    if not args.api_key:
+        sys.exit("Informe a chave com --api-key ou na variável GROQ_API_KEY.")
+    entrada = pd.read_csv(args.entrada, dtype=str, keep_default_na=False)
+    checkpoint = args.checkpoint or f"{args.saida}.checkpoint.jsonl"
+
+    def progresso(feitas, total):
+        print(f"{feitas:,}/{total:,} consultas", file=sys.stderr, flush=True)
+
+    resultado = ia_lote.classificar_produtos(entrada[args.coluna], args.api_key, args.modelo,
+                                             concorrencia=args.concorrencia, checkpoint=checkpoint,
+                                             progresso=progresso)
+    entrada["ncm_ia"] = resultado["resposta"].to_numpy()
+    entrada["erro_ia"] = resultado["erro"].to_numpy()
+    entrada.to_csv(args.saida, index=False)
+    falhas = int((resultado["erro"] != "").sum())
+    print(f"{len(entrada) - falhas:,} classificados, {falhas:,} com erro -> {args.saida}", file=sys.stderr)
+
+
+def _vigencia(args):
+    entrada = pd.read_csv(args.entrada, dtype=str, keep_default_na=False, sep=args.sep)
+    resultado = consultas.consultar_na_data_lote(entrada[args.coluna_ncm], entrada[args.coluna_data])
+    for coluna in ("descricao", "inicio", "fim", "ato", "IPI", "origem_IPI", "erro"):
+        entrada[f"{coluna}_vigente" if coluna != "erro" else "erro_vigencia"] = resultado[coluna].to_numpy()
+    entrada.to_csv(args.saida, index=False)
+    falhas = int((resultado["erro"] != "").sum())
+    print(f"{len(entrada) - falhas:,} com NCM vigente na data, {falhas:,} sem -> {args.saida}", file=sys.stderr)
+
+
+def _impacto_tipi(args):
+    from ncmbrasil import dados
+    from ncmbrasil.impacto import impacto_tipi
+
+    inicio = time.perf_counter()
+    antiga, nova = dados.carregar_tipi(args.antiga or datasets.caminho("tipi")), dados.carregar_tipi(args.nova)
+    feed, itens = datasets.obter("feed"), datasets.obter("ipi_por_sku")
+    carga = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    codigos, skus, resumo = impacto_tipi(antiga, nova, feed, itens)
+    resumo["carga_s"] = round(carga, 2)
+    resumo["analise_s"] = round(time.perf_counter() - inicio, 2)
+    skus.to_csv(args.saida, index=False)
+    if args.codigos:
+        codigos.to_csv(args.codigos, index=False)
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
+    print(f"{len(skus):,} SKUs afetados -> {args.saida}", file=sys.stderr)
+
+
+def _auditar(args):
+    excecoes, resumo = consultas.auditar_catalogo(args.data)
+    excecoes.to_csv(args.saida, index=False)
+    relatorio = json.dumps(resumo, ensure_ascii=False, indent=2)
+    if args.resumo:
+        with open(args.resumo, "w", encoding="utf-8") as arquivo:
+            arquivo.write(relatorio + "\n")
+    print(relatorio)
+    print(f"{len(excecoes):,} exceções -> {args.saida}", file=sys.stderr)
+
+
+def _preparar(args):
+    if args.pasta:
+        compartilhado.PASTA = args.pasta
+    if not compartilhado.ativo():
+        sys.exit("Informe a pasta compartilhada com --pasta ou na variável NCMBRASIL_COMPARTILHADO.")
+    # Planilhas vão para o cache em disco; o feed, para a pasta compartilhada
+    for nome in ("tipi", "vigencias_tipi", "ipi_itens", "ncm_historico", "feed"):
+        inicio = time.perf_counter()
+        valor = datasets.obter(nome)
+        tamanho = "ausente" if valor is None else f"{len(valor):,} linhas"
+        print(f"{nome}: {tamanho} em {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+
+
+def _treinar_classificador(args):
+    from ncmbrasil import classificador
+
+    exemplos = classificador.exemplos_treino(datasets.obter("feed"), datasets.obter("ipi_por_sku"))
+    print(f"{len(exemplos):,} exemplos de {exemplos['ncm'].nunique():,} NCMs", file=sys.stderr)
+    modelo = classificador.treinar(exemplos, teste=args.teste)
+    saida = args.saida or datasets.caminho("classificador_ncm")
+    modelo.salvar(saida)
+    inicio = time.perf_counter()
+    classificador.ClassificadorNCM.carregar(saida)
+    modelo.relatorio["carga_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+    modelo.relatorio["artefato_mb"] = round(os.path.getsize(saida) / 2**20, 2)
+    modelo.salvar(saida)
+
+    relatorio = json.dumps(modelo.relatorio, ensure_ascii=False, indent=2)
+    if args.relatorio:
+        with open(args.relatorio, "w", encoding="utf-8") as arquivo:
+            arquivo.write(relatorio + "\n")
+    print(relatorio)
+    print(f"Modelo salvo em {saida}", file=sys.stderr)
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog="python -m ncmbrasil", description="Ferramentas NCM & IPI")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    p = comandos.add_parser("lote", help="Enriquece SKUs pelo feed, sugere NCM e calcula o IPI de um CSV")
+    p.add_argument("entrada", help="CSV de produtos")
+    p.add_argument("saida", help="Arquivo de saída (.csv ou .parquet)")
+    p.add_argument("--coluna-sku", default="SKU")
+    p.add_argument("--coluna-descricao", help="Texto para classificar o NCM (padrão: título do feed)")
+    p.add_argument("--coluna-valor", help="Valor final desejado; sem ela o IPI não é calculado")
+    p.add_argument("--coluna-frete")
+    p.add_argument("--bloco", type=int, default=50_000, help="Linhas por bloco (padrão: 50000)")
+    p.add_argument("--processos", type=int, help="Processos do pool (padrão: núcleos; 1 = sem pool)")
+    p.add_argument("--sep", default=",", help="Separador do CSV de entrada")
+    p.set_defaults(executar=_lote)
+
+    p = comandos.add_parser("classificar-ia", help="Classifica o NCM de uma lista de títulos pelo LLM")
+    p.add_argument("entrada", help="CSV com os títulos")
+    p.add_argument("saida", help="CSV de saída (entrada + ncm_ia e erro_ia)")
+    p.add_argument("--coluna", default="produto", help="Coluna com o título (padrão: produto)")
+    p.add_argument("--modelo", required=True)
+    p.add_argument("--api-key", default=os.environ.get("GROQ_API_KEY"))
+    p.add_argument("--concorrencia", type=int, default=8, help="Pedidos simultâneos (padrão: 8)")
+    p.add_argument("--checkpoint", help="JSON Lines para retomar (padrão: <saida>.checkpoint.jsonl)")
+    p.set_defaults(executar=_classificar_ia)
+
+    p = comandos.add_parser("vigencia", help="NCM e alíquota de IPI em vigor na data de cada linha (ex.: notas fiscais)")
+    p.add_argument("entrada", help="CSV com o NCM e a data de cada linha")
+    p.add_argument("saida", help="CSV de saída (entrada + colunas *_vigente e erro_vigencia)")
+    p.add_argument("--coluna-ncm", default="ncm")
+    p.add_argument("--coluna-data", default="data", help="Data (dd/mm/aaaa ou aaaa-mm-dd)")
+    p.add_argument("--sep", default=",", help="Separador do CSV de entrada")
+    p.set_defaults(executar=_vigencia)
+
+    p = comandos.add_parser("impacto-tipi", help="SKUs do feed afetados por uma nova TIPI e a variação de preço")
+    p.add_argument("nova", help="Planilha da nova TIPI (mesmo layout de tipi.xlsx)")
+    p.add_argument("saida", help="CSV com os SKUs afetados")
+    p.add_argument("--antiga", help="TIPI atual (padrão: tipi.xlsx na pasta de dados)")
+    p.add_argument("--codigos", help="Grava também os códigos com alíquota alterada neste CSV")
+    p.set_defaults(executar=_impacto_tipi)
+
+    p = comandos.add_parser("auditar", help="Confere feed, IPI Itens e NCM/TIPI e lista as exceções por SKU")
+    p.add_argument("saida", help="CSV com as exceções (uma linha por problema)")
+    p.add_argument("--data", type=date.fromisoformat,
+                   help="Data da vigência conferida, aaaa-mm-dd (padrão: hoje)")
+    p.add_argument("--resumo", help="Grava também o resumo neste JSON")
+    p.set_defaults(executar=_auditar)
+
+    p = comandos.add_parser("preparar", help="Prepara os datasets uma vez, antes de subir vários processos do app")
+    p.add_argument("--pasta", help="Pasta compartilhada do feed (padrão: $NCMBRASIL_COMPARTILHADO)")
+    p.set_defaults(executar=_preparar)
+
+    p = comandos.add_parser("treinar-classificador",
+                            help="Treina o classificador NCM local com os NCMs já atribuídos no feed")
+    p.add_argument("--saida", help="Arquivo do modelo (padrão: classificador_ncm.joblib na pasta de dados)")
+    p.add_argument("--teste", type=float, default=0.2,
+                   help="Fração separada para avaliação antes do treino final (padrão: 0.2; 0 = sem avaliação)")
+    p.add_argument("--relatorio", help="Grava também o relatório de avaliação neste JSON")
+    p.set_defaults(executar=_treinar_classificador)
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    args.executar(args)
+
+
+if __name__ == "__main__":
+    main()
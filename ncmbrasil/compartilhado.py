@@ -0,0 +1,172 @@
+"""Feed preparado uma vez e mapeado na memória por todos os processos da máquina.
+
+Com $NCMBRASIL_COMPARTILHADO apontando para uma pasta, o primeiro processo
+que precisa de uma versão do feed lê o XML e publica ali o resultado: a tabela
+em Arrow IPC sem compressão, o índice de SKU, os títulos já normalizados e o
+índice de trigramas. Os demais (e o próprio, nas partidas seguintes) só mapeiam
+esses arquivos (`pa.memory_map`, `np.load(mmap_mode="r")`): as páginas vêm do
+cache de páginas do sistema, somente leitura, e são as mesmas em todos os
+workers. Fica privada em cada processo só a lista de títulos normalizados que
+o rapidfuzz exige em objetos Python.
+
+Cada versão é uma subpasta com a assinatura do XML (mtime e tamanho), montada
+numa pasta temporária e renomeada no fim. Uma trava de arquivo faz quem chega
+durante a montagem esperar por ela e mapear o resultado, em vez de ler o XML
+de novo. Sem a variável, `abrir_feed` é o próprio `carregar_feed`.
+"""
+import contextlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from ncmbrasil.busca import IndiceFuzzy, IndiceTrigramas
+from ncmbrasil.cache import nome_origem
+from ncmbrasil.feed import Feed, carregar_feed
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: sem trava entre processos; dois workers podem montar a mesma
+    # versão ao mesmo tempo, e a renomeação atômica fica com a primeira
+    fcntl = None
+
+PASTA = os.environ.get("NCMBRASIL_COMPARTILHADO", "")
+# Aumente sempre que o formato dos arquivos publicados mudar
+VERSAO = 1
+# Versões de cada XML mantidas na pasta: a atual e a anterior, que workers
+# que ainda não trocaram de feed podem estar usando
+VERSOES_MANTIDAS = 2
+CHAVE_META = b"ncmbrasil"
+
+log = logging.getLogger(__name__)
+
+
+def ativo():
+    return bool(PASTA)
+
+
+def _prefixo(caminho):
+    return f"{nome_origem(caminho)}."
+
+
+def _pasta_versao(caminho, assinatura):
+    mtime_ns, tamanho = assinatura
+    return os.path.join(PASTA, f"{_prefixo(caminho)}{mtime_ns}-{tamanho}.v{VERSAO}")
+
+
+@contextlib.contextmanager
+def _travado():
+    """Exclusão entre processos (flock num arquivo da pasta) durante a montagem de uma versão."""
+    os.makedirs(PASTA, exist_ok=True)
+    with open(os.path.join(PASTA, ".trava"), "a") as arquivo:
+        if fcntl is not None:
+            fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def _gravar_tabela(tabela, arquivo, meta=None):
+    if meta is not None:
+        tabela = tabela.replace_schema_metadata({CHAVE_META: json.dumps(meta).encode("utf-8")})
+    # Sem compressão, para a leitura usar os buffers do arquivo mapeado sem copiar
+    with pa.OSFile(arquivo, "wb") as destino, ipc.new_file(destino, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+
+
+def _ler_tabela(arquivo):
+    # Os buffers da tabela mantêm o mapeamento vivo enquanto forem usados
+    return ipc.open_file(pa.memory_map(arquivo)).read_all()
+
+
+def _publicar(feed, destino):
+    temporaria = tempfile.mkdtemp(dir=PASTA, prefix=".montando-")
+    try:
+        _gravar_tabela(feed.tabela, os.path.join(temporaria, "tabela.arrow"),
+                       {"assinatura": list(feed.assinatura), "relatorio": feed.relatorio})
+        np.save(os.path.join(temporaria, "skus.npy"), feed._skus)
+        np.save(os.path.join(temporaria, "linhas.npy"), feed._linhas)
+        _gravar_tabela(pa.table({"texto": pa.array(feed.titulos.textos, pa.large_string()),
+                                 "id": pa.array(feed.titulos.ids, pa.int64())}),
+                       os.path.join(temporaria, "titulos.arrow"))
+        if feed.titulos.usa_prefiltro():
+            trigramas = feed.titulos.trigramas()
+            np.save(os.path.join(temporaria, "trigramas_inicios.npy"), trigramas.inicios)
+            np.save(os.path.join(temporaria, "trigramas_posicoes.npy"), trigramas.posicoes)
+        # mkdtemp cria só para o dono; workers de outro usuário também leem
+        os.chmod(temporaria, 0o755)
+        os.rename(temporaria, destino)
+    finally:
+        shutil.rmtree(temporaria, ignore_errors=True)
+
+
+def _mapear(pasta):
+    """Feed publicado em `pasta`, com tudo mapeado na memória; None se essa versão não existe."""
+    if not os.path.isdir(pasta):
+        return None
+    tabela = _ler_tabela(os.path.join(pasta, "tabela.arrow"))
+    meta = json.loads(tabela.schema.metadata[CHAVE_META])
+    titulos = _ler_tabela(os.path.join(pasta, "titulos.arrow"))
+    trigramas = None
+    if os.path.exists(os.path.join(pasta, "trigramas_inicios.npy")):
+        trigramas = IndiceTrigramas.de_arrays(np.load(os.path.join(pasta, "trigramas_inicios.npy"), mmap_mode="r"),
+                                              np.load(os.path.join(pasta, "trigramas_posicoes.npy"), mmap_mode="r"),
+                                              titulos.num_rows)
+    indice = IndiceFuzzy.de_normalizados(titulos.column("texto").to_pylist(), titulos.column("id").to_pylist(),
+                                         trigramas=trigramas)
+    return Feed.de_partes(tabela.replace_schema_metadata(None),
+                          np.load(os.path.join(pasta, "skus.npy"), mmap_mode="r"),
+                          np.load(os.path.join(pasta, "linhas.npy"), mmap_mode="r"),
+                          indice, tuple(meta["assinatura"]), meta["relatorio"])
+
+
+def _limpar(caminho):
+    """Apaga as versões mais antigas do XML (quem ainda as mapeia segue com elas até soltar)."""
+    prefixo = _prefixo(caminho)
+    versoes = [os.path.join(PASTA, nome) for nome in os.listdir(PASTA) if nome.startswith(prefixo)]
+    versoes.sort(key=os.path.getmtime, reverse=True)
+    for pasta in versoes[VERSOES_MANTIDAS:]:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def abrir_feed(caminho, anterior=None):
+    """`carregar_feed`, passando pela pasta compartilhada quando ela está configurada.
+
+    A versão do XML já publicada é só mapeada. Senão, um processo lê o XML e a
+    publica enquanto os outros esperam na trava; um XML inválido ou ainda em
+    gravação não é publicado e volta como `carregar_feed` o devolveu.
+    """
+    if not ativo():
+        return carregar_feed(caminho, anterior)
+    estado = os.stat(caminho)
+    assinatura = (estado.st_mtime_ns, estado.st_size)
+    pasta = _pasta_versao(caminho, assinatura)
+    feed = _mapear(pasta)
+    if feed is not None:
+        return feed
+    with _travado():
+        feed = _mapear(pasta)
+        if feed is not None:
+            return feed
+        feed = carregar_feed(caminho, anterior)
+        if feed is None or feed.assinatura != assinatura:
+            return feed
+        inicio = time.perf_counter()
+        try:
+            _publicar(feed, pasta)
+        except OSError:
+            log.exception("Não foi possível publicar o feed em %s; este processo segue com a cópia própria", PASTA)
+            return feed
+        log.info("Feed publicado em %s (%.1f s)", pasta, time.perf_counter() - inicio)
+    _limpar(caminho)
+    # A cópia lida do XML é descartada: este processo também usa a mapeada
+    return _mapear(pasta)
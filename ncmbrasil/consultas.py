@@ -0,0 +1,104 @@
+"""Consultas do dashboard sobre os datasets compartilhados, sem dependência do Streamlit."""
+from ncmbrasil import auditoria, impacto, ncm, precos, vigencia
+from ncmbrasil.datasets import obter
+
+
+def buscar_sku(sku):
+    feed = obter("feed")
+    if feed is None:
+        return None, "XML não encontrado."
+    item = feed.buscar(sku)
+    if item is None:
+        return None, "SKU não encontrado."
+    item["SKU"] = sku
+    return item, None
+
+
+def buscar_skus(skus):
+    """`buscar_sku` de cada SKU da lista, com uma única busca no índice do feed."""
+    feed = obter("feed")
+    if feed is None:
+        return [(None, "XML não encontrado.")] * len(skus)
+    posicoes = feed.posicoes(skus)
+    achados = iter(feed.produtos(posicoes[posicoes >= 0]))
+    resultados = []
+    for sku, pos in zip(skus, posicoes):
+        if pos < 0:
+            resultados.append((None, "SKU não encontrado."))
+            continue
+        item = next(achados)
+        item["SKU"] = sku
+        resultados.append((item, None))
+    return resultados
+
+
+def buscar_titulo(termo, limite=10):
+    feed = obter("feed")
+    if feed is None:
+        return [], "XML não encontrado."
+    return [feed.produto(pos) for pos, _ in feed.titulos.buscar(termo, limite)], None
+
+
+def buscar_por_codigo(codigo):
+    return ncm.buscar_por_codigo(codigo, obter("descricoes_ncm"), obter("aliquotas"))
+
+
+def buscar_por_codigo_na_data(codigo, data):
+    return vigencia.buscar_na_data(codigo, data, obter("vigencias_ncm"), obter("vigencias_tipi"))
+
+
+def historico_codigo(codigo):
+    """Períodos de vigência do código na tabela NCM (código já padronizado)."""
+    return obter("vigencias_ncm").historico(codigo)
+
+
+def consultar_na_data_lote(codigos, datas):
+    return vigencia.consultar_na_data(codigos, datas, obter("vigencias_ncm"), obter("vigencias_tipi"))
+
+
+def buscar_por_descricao(termo, limite=10):
+    return ncm.buscar_por_descricao(termo, obter("indice_ncm"), obter("descricoes_ncm"),
+                                    obter("aliquotas"), limite)
+
+
+def autocompletar_descricao(termo, limite=10):
+    """`buscar_por_descricao` para a busca enquanto se digita (memorizada e incremental)."""
+    return ncm.buscar_por_descricao(termo, obter("autocompletar_ncm"), obter("descricoes_ncm"),
+                                    obter("aliquotas"), limite)
+
+
+def buscar_por_descricao_lote(termos, limite=10):
+    return ncm.buscar_por_descricao_lote(termos, obter("indice_ncm"), obter("descricoes_ncm"),
+                                         obter("aliquotas"), limite)
+
+
+def calcular_preco_final(sku, valor_final, frete=0, data=None):
+    """Com `data`, a alíquota é a da TIPI em vigor na data para o NCM do SKU no feed."""
+    if data is None:
+        return precos.calcular_preco_final(sku, valor_final, frete, obter("ipi_por_sku"))
+    item, erro = buscar_sku(sku)
+    if erro:
+        return None, None, erro
+    if not item["NCM"]:
+        return None, None, "SKU sem NCM no feed."
+    linha = consultar_na_data_lote([item["NCM"]], [data]).iloc[0]
+    if linha["erro"]:
+        return None, None, f"NCM {linha['codigo']}: {linha['erro']}"
+    # "NT" (sem alíquota na TIPI) não tem IPI
+    ipi_pct = 0.0 if linha["IPI"] == "NT" else float(linha["IPI"])
+    return precos.calcular_preco_final(sku, valor_final, frete, obter("ipi_por_sku"), ipi_pct)
+
+
+def calcular_precos_lote(entrada):
+    return precos.calcular_precos_lote(entrada, obter("ipi_por_sku"))
+
+
+def impacto_nova_tipi(nova):
+    """SKUs do feed afetados pela troca da TIPI atual por `nova` (ver impacto.impacto_tipi)."""
+    return impacto.impacto_tipi(obter("tipi"), nova, obter("feed"), obter("ipi_por_sku"))
+
+
+def auditar_catalogo(data=None):
+    """Exceções e resumo da conferência feed x IPI Itens x NCM/TIPI (ver auditoria.auditar_catalogo)."""
+    return auditoria.auditar_catalogo(obter("feed"), obter("ipi_por_sku"), obter("vigencias_ncm"),
+                                      obter("vigencias_tipi"), data)
@@ -0,0 +1,120 @@
+"""Leitura e tratamento dos arquivos de origem (TIPI, IPI Itens, NCM e feed XML)."""
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import unidecode
+
+from ncmbrasil.cache import carregar_com_cache
+from ncmbrasil.compartilhado import abrir_feed
+from ncmbrasil.ncm import padronizar_codigo
+from ncmbrasil.precos import converter_valores
+from ncmbrasil.vigencia import FIM_SEMPRE, INICIO_SEMPRE
+
+log = logging.getLogger(__name__)
+# Versões dos tratamentos (invalidam o cache quando mudam)
+VERSAO_IPI_ITENS = 2
+VERSAO_NCM = 2
+# Uma TIPI por versão, com a data de início de vigência no nome
+PADRAO_TIPI_VERSAO = re.compile(r"tipi_(\d{4}-\d{2}-\d{2})\.xlsx", re.IGNORECASE)
+
+
+def preparar_tipi(caminho):
+    df = pd.read_excel(caminho, dtype=str)
+    df.columns = [unidecode.unidecode(c.strip().lower()) for c in df.columns]
+    if "ncm" not in df.columns or "aliquota (%)" not in df.columns:
+        return pd.DataFrame(columns=["codigo", "IPI"])
+    df = df[["ncm", "aliquota (%)"]].copy()
+    df.rename(columns={"ncm": "codigo", "aliquota (%)": "IPI"}, inplace=True)
+    # Linhas sem código (EX avulsas) ou sem alíquota (agrupamentos) não têm IPI próprio
+    df = df.dropna(subset=["codigo", "IPI"])
+    df["codigo"] = df["codigo"].apply(padronizar_codigo)
+    df["IPI"] = pd.to_numeric(df["IPI"], errors="coerce").fillna(0.0)
+    return df.reset_index(drop=True)
+
+
+def preparar_ipi_itens(caminho):
+    """IPI Itens com valores numéricos; células ilegíveis viram NaN e vão para df.attrs["relatorio"]."""
+    df = pd.read_excel(caminho, engine="openpyxl", dtype=str)
+    df["SKU"] = df["SKU"].astype(str)
+    relatorio = {"itens": len(df), "valores_invalidos": 0, "exemplos": []}
+    for col in ["Valor à Prazo", "Valor à Vista", "IPI %"]:
+        textos = df[col]
+        df[col], invalidos = converter_valores(textos)
+        linhas = np.flatnonzero(invalidos)
+        relatorio["valores_invalidos"] += len(linhas)
+        # Linha como no Excel: cabeçalho na 1, dados a partir da 2
+        relatorio["exemplos"].extend((int(i) + 2, df["SKU"].iat[i], col, textos.iat[i]) for i in linhas[:20])
+    if relatorio["valores_invalidos"]:
+        log.warning("%s: %d valor(es) ilegível(is), por exemplo %s", caminho, relatorio["valores_invalidos"],
+                    relatorio["exemplos"][:3])
+    df.attrs["relatorio"] = relatorio
+    return df
+
+
+def _datas(df, coluna, padrao):
+    if coluna not in df:
+        return pd.Series(padrao, index=df.index)
+    return pd.to_datetime(df[coluna], format="%d/%m/%Y", errors="coerce").fillna(padrao)
+
+
+def preparar_ncm(caminho):
+    """Tabela NCM com todos os períodos de vigência (inicio, fim) e o ato de início de cada código."""
+    df = pd.read_csv(caminho, dtype=str)
+    df.rename(columns={df.columns[0]: "codigo", df.columns[1]: "descricao"}, inplace=True)
+    df["codigo"] = df["codigo"].apply(padronizar_codigo)
+    df["descricao"] = df["descricao"].astype(str)
+    df["inicio"] = _datas(df, "Data_Inicio", INICIO_SEMPRE)
+    df["fim"] = _datas(df, "Data_Fim", FIM_SEMPRE)
+    if {"Tipo_Ato_Ini", "Numero_Ato_Ini", "Ano_Ato_Ini"} <= set(df.columns):
+        df["ato"] = (df["Tipo_Ato_Ini"] + " " + df["Numero_Ato_Ini"] + "/" + df["Ano_Ato_Ini"]).fillna("")
+    else:
+        df["ato"] = ""
+    return df[["codigo", "descricao", "inicio", "fim", "ato"]]
+
+
+def carregar_tipi(caminho="tipi.xlsx"):
+    if os.path.exists(caminho):
+        return carregar_com_cache(caminho, preparar_tipi)
+    return pd.DataFrame(columns=["codigo", "IPI"])
+
+
+def carregar_ipi_itens(caminho="IPI Itens.xlsx"):
+    if os.path.exists(caminho):
+        return carregar_com_cache(caminho, preparar_ipi_itens, versao=VERSAO_IPI_ITENS)
+    return pd.DataFrame(columns=["SKU", "Descrição Item", "Valor à Prazo", "Valor à Vista", "IPI %"])
+
+
+def carregar_ncm(caminho="ncm_todos.csv"):
+    if os.path.exists(caminho):
+        return carregar_com_cache(caminho, preparar_ncm, versao=VERSAO_NCM)
+    return pd.DataFrame(columns=["codigo", "descricao", "inicio", "fim", "ato"])
+
+
+def carregar_tipi_vigencias(caminho="tipi.xlsx", pasta="tipi_vigencias", tipi=None):
+    """Todas as versões da TIPI com o período de cada uma: codigo, IPI, inicio, fim.
+
+    As versões são as planilhas tipi_AAAA-MM-DD.xlsx de `pasta`, cada uma em
+    vigor da data do nome até a véspera da seguinte. Sem elas, a TIPI de
+    `caminho` (ou `tipi`, se já carregada) vale para qualquer data.
+    """
+    arquivos = sorted(os.listdir(pasta)) if os.path.isdir(pasta) else []
+    versoes = [(pd.Timestamp(m.group(1)), os.path.join(pasta, nome))
+               for nome in arquivos if (m := PADRAO_TIPI_VERSAO.fullmatch(nome))]
+    if not versoes:
+        versoes = [(INICIO_SEMPRE, caminho)]
+    partes = []
+    for i, (inicio, arquivo) in enumerate(versoes):
+        fim = versoes[i + 1][0] - pd.Timedelta(days=1) if i + 1 < len(versoes) else FIM_SEMPRE
+        # EX da TIPI repetem o código: vale a primeira linha, como em indexar_aliquotas
+        df = (tipi if tipi is not None and arquivo == caminho else carregar_tipi(arquivo)).drop_duplicates("codigo")
+        partes.append(df.assign(inicio=inicio, fim=fim)[["codigo", "IPI", "inicio", "fim"]])
+    return pd.concat(partes, ignore_index=True)
+
+
+def carregar_xml(caminho="GoogleShopping_full.xml"):
+    if os.path.exists(caminho):
+        return abrir_feed(caminho)
+    return None
@@ -0,0 +1,285 @@
+"""Datasets compartilhados pelo processo inteiro, carregados no primeiro acesso.
+
+`obter("aliquotas")` carrega a TIPI (e só ela) na primeira chamada e devolve o
+mesmo objeto para todas as chamadas seguintes, de qualquer thread. Os objetos
+são somente leitura: quem precisar alterar um deve copiá-lo.
+
+O registro anota de quais datasets cada um foi montado (as chamadas a `obter`
+feitas durante a carga): `invalidar("tipi")` descarta a TIPI e também as
+alíquotas e a árvore NCM montadas a partir dela, que são recarregadas na
+próxima consulta. `aquecer` carrega os datasets da partida antes da primeira
+consulta e `status` informa, de cada um, quando e em quanto tempo foi
+carregado e a memória que ocupa.
+
+Os arquivos são procurados em $NCMBRASIL_DADOS (padrão: diretório atual).
+"""
+import logging
+import os
+import threading
+import time
+
+from ncmbrasil import dados
+from ncmbrasil.busca import BuscaIncremental, IndiceFuzzy, normalizar_termos
+from ncmbrasil.memoria import estimar
+from ncmbrasil.ncm import ArvoreNCM, indexar_aliquotas, indexar_descricoes, texto_hierarquico
+from ncmbrasil.precos import indexar_ipi_itens
+from ncmbrasil.vigencia import Vigencias, vigentes
+
+PASTA_DADOS = os.environ.get("NCMBRASIL_DADOS", ".")
+ARQUIVOS = {
+    "tipi": "tipi.xlsx",
+    "tipi_vigencias": "tipi_vigencias",
+    "ipi_itens": "IPI Itens.xlsx",
+    "ncm": "ncm_todos.csv",
+    "feed": "GoogleShopping_full.xml",
+    "classificador_ncm": "classificador_ncm.joblib",
+}
+
+# Carregados na partida do app e do serviço HTTP
+PARTIDA = ("aliquotas", "descricoes_ncm", "indice_ncm", "ipi_por_sku", "vigencias_ncm", "vigencias_tipi", "feed")
+
+log = logging.getLogger(__name__)
+_CARREGADORES = {}
+_valores = {}
+_status = {}
+_dependentes = {}
+_travas = {}
+_trava_travas = threading.Lock()
+# Datasets em carga na thread atual, do mais externo ao mais interno
+_carregando = threading.local()
+_aquecimento = None
+_trava_aquecimento = threading.Lock()
+
+
+def caminho(nome):
+    return os.path.join(PASTA_DADOS, ARQUIVOS[nome])
+
+
+def registrar(nome):
+    def decorador(funcao):
+        _CARREGADORES[nome] = funcao
+        return funcao
+    return decorador
+
+
+def carregados():
+    """Nomes dos datasets já em memória."""
+    return sorted(_valores)
+
+
+def _trava(nome):
+    with _trava_travas:
+        return _travas.setdefault(nome, threading.Lock())
+
+
+def _pilha():
+    if not hasattr(_carregando, "pilha"):
+        _carregando.pilha = []
+    return _carregando.pilha
+
+
+def obter(nome):
+    pilha = _pilha()
+    if pilha:
+        # Chamado durante a carga de outro dataset: aquele é montado a partir deste
+        _dependentes.setdefault(nome, set()).add(pilha[-1])
+    try:
+        return _valores[nome]
+    except KeyError:
+        pass
+    # Uma trava por dataset: quem chega durante a carga espera por ela em vez de
+    # carregar de novo, sem bloquear quem usa outros datasets
+    with _trava(nome):
+        if nome not in _valores:
+            inicio = time.perf_counter()
+            pilha.append(nome)
+            try:
+                valor = _CARREGADORES[nome]()
+            finally:
+                pilha.pop()
+            _valores[nome] = valor
+            _status[nome] = {"carregado_em": time.time(), "carga_s": time.perf_counter() - inicio}
+        return _valores[nome]
+
+
+def _derivados(nome):
+    """Datasets montados a partir de `nome`, direta ou indiretamente."""
+    derivados, pendentes = [], list(_dependentes.get(nome, ()))
+    while pendentes:
+        atual = pendentes.pop()
+        if atual not in derivados:
+            derivados.append(atual)
+            pendentes.extend(_dependentes.get(atual, ()))
+    return derivados
+
+
+def _descartar(nomes):
+    descartados = []
+    for nome in nomes:
+        with _trava(nome):
+            if nome in _valores:
+                descartados.append(nome)
+            _valores.pop(nome, None)
+            _status.pop(nome, None)
+    return descartados
+
+
+def substituir(nome, valor, carga_s=None):
+    """Troca o valor de um dataset de uma vez só e descarta os derivados dele.
+
+    Quem já obteve o valor antigo segue com ele até terminar; as chamadas
+    seguintes de `obter` recebem o novo, nunca um objeto pela metade, e os
+    derivados são remontados a partir dele.
+    """
+    with _trava(nome):
+        _valores[nome] = valor
+        _status[nome] = {"carregado_em": time.time(), "carga_s": carga_s}
+    _descartar(_derivados(nome))
+
+
+def invalidar(nome):
+    """Descarta `nome` e os seus derivados; a próxima `obter` de cada um recarrega.
+
+    As planilhas passam de novo pelo cache em disco, que só as relê se mudaram.
+    Devolve os nomes dos datasets que estavam carregados.
+    """
+    return _descartar([nome] + _derivados(nome))
+
+
+def aquecer(nomes=PARTIDA):
+    """Carrega `nomes` agora, para a primeira consulta não pagar a carga."""
+    for nome in nomes:
+        obter(nome)
+
+
+def _aquecer_em_segundo_plano(nomes):
+    for nome in nomes:
+        try:
+            obter(nome)
+        except Exception:
+            log.exception("Falha ao carregar o dataset %s no aquecimento", nome)
+
+
+def iniciar_aquecimento(nomes=PARTIDA):
+    """Thread do processo que carrega `nomes` em segundo plano, iniciada na primeira chamada.
+
+    Quem consultar um dataset ainda em carga espera por ela (a trava do
+    dataset), sem carregar de novo.
+    """
+    global _aquecimento
+    with _trava_aquecimento:
+        if _aquecimento is None:
+            _aquecimento = threading.Thread(target=_aquecer_em_segundo_plano, args=(tuple(nomes),),
+                                            name="aquecer-datasets", daemon=True)
+            _aquecimento.start()
+        return _aquecimento
+
+
+def status(medir_memoria=False):
+    """Um dict por dataset carregado, na ordem de carga: nome, carregado_em, carga_s, itens.
+
+    carga_s inclui a carga dos datasets de que ele depende que ainda não
+    estavam em memória. Com `medir_memoria`, também memoria_mb (objetos do
+    processo) e mapeada_mb (arquivos mapeados, compartilhados entre processos);
+    a memória de cada dataset não repete o que ele compartilha com os
+    carregados antes.
+    """
+    estados = dict(_status)
+    vistos = set()
+    linhas = []
+    for nome in sorted(estados, key=lambda n: estados[n]["carregado_em"]):
+        valor = _valores.get(nome)
+        linha = {"nome": nome, **estados[nome], "itens": len(valor) if hasattr(valor, "__len__") else None}
+        if medir_memoria:
+            propria, mapeada = estimar(valor, vistos)
+            linha["memoria_mb"] = round(propria / 2**20, 1)
+            linha["mapeada_mb"] = round(mapeada / 2**20, 1)
+        linhas.append(linha)
+    return linhas
+
+
+@registrar("tipi")
+def _tipi():
+    return dados.carregar_tipi(caminho("tipi"))
+
+
+@registrar("aliquotas")
+def _aliquotas():
+    return indexar_aliquotas(obter("tipi"))
+
+
+@registrar("ipi_itens")
+def _ipi_itens():
+    return dados.carregar_ipi_itens(caminho("ipi_itens"))
+
+
+@registrar("ipi_por_sku")
+def _ipi_por_sku():
+    return indexar_ipi_itens(obter("ipi_itens"))
+
+
+@registrar("ncm_historico")
+def _ncm_historico():
+    return dados.carregar_ncm(caminho("ncm"))
+
+
+@registrar("ncm")
+def _ncm():
+    # Só os códigos em vigor hoje; os demais períodos ficam em "vigencias_ncm"
+    return vigentes(obter("ncm_historico"))
+
+
+@registrar("vigencias_ncm")
+def _vigencias_ncm():
+    return Vigencias(obter("ncm_historico"))
+
+
+@registrar("vigencias_tipi")
+def _vigencias_tipi():
+    # Pela TIPI registrada: invalidar("tipi") ou substituir("tipi", ...) descartam também as vigências
+    return Vigencias(dados.carregar_tipi_vigencias(caminho("tipi"), caminho("tipi_vigencias"), obter("tipi")))
+
+
+@registrar("descricoes_ncm")
+def _descricoes_ncm():
+    return indexar_descricoes(obter("ncm"))
+
+
+@registrar("indice_ncm")
+def _indice_ncm():
+    df = obter("ncm")
+    # Descrições NCM: sempre o corpus inteiro, o pré-filtro de trigramas perde recall aqui
+    return IndiceFuzzy(df["descricao"], df["codigo"], prefiltro=False)
+
+
+@registrar("autocompletar_ncm")
+def _autocompletar_ncm():
+    return BuscaIncremental(obter("indice_ncm"))
+
+
+@registrar("indice_ncm_subitens")
+def _indice_ncm_subitens():
+    # Só subitens (8 dígitos), cada um com o texto de toda a sua hierarquia
+    arvore = obter("arvore_ncm")
+    subitens = [c for c in arvore.codigos if len(c) == 8]
+    return IndiceFuzzy((texto_hierarquico(arvore, c) for c in subitens), subitens, normalizar_termos,
+                       prefiltro=False)
+
+
+@registrar("arvore_ncm")
+def _arvore_ncm():
+    return ArvoreNCM(obter("descricoes_ncm"), obter("aliquotas"))
+
+
+@registrar("feed")
+def _feed():
+    return dados.carregar_xml(caminho("feed"))
+
+
+@registrar("classificador_ncm")
+def _classificador_ncm():
+    # Opcional: sem o artefato treinado (ou sem scikit-learn) o app segue sem ele
+    if not os.path.exists(caminho("classificador_ncm")):
+        return None
+    from ncmbrasil.classificador import ClassificadorNCM
+    return ClassificadorNCM.carregar(caminho("classificador_ncm"))
@@ -0,0 +1,240 @@
+"""Leitura do feed Google Shopping num armazenamento colunar (Arrow) indexado por SKU."""
+import logging
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from ncmbrasil.busca import IndiceFuzzy, normalizar
+from ncmbrasil.precos import converter_valores
+
+# Colunas do feed, na ordem dos campos de `_registro`
+COLUNAS = ("sku", "titulo", "link", "preco_prazo", "preco_vista", "descricao", "ncm")
+_TIPOS = (pa.large_string(), pa.large_string(), pa.large_string(), pa.float64(), pa.float64(),
+          pa.large_string(), pa.large_string())
+# Itens lidos do XML que ficam em tuplas antes de virar um bloco de colunas
+ITENS_POR_BLOCO = 50_000
+# Exemplos de preços ilegíveis guardados no relatório de carga
+EXEMPLOS_RELATORIO = 20
+
+log = logging.getLogger(__name__)
+
+
+def clean_tag(tag):
+    return tag.split("}")[-1].lower() if "}" in tag else tag.lower()
+
+
+def _registro(item):
+    """Tupla na ordem de COLUNAS, com os preços ainda em texto (convertidos por bloco)."""
+    dados = {clean_tag(c.tag): c.text.strip() if c.text else "" for c in item}
+    return (
+        dados.get("id", ""),
+        dados.get("title"),
+        dados.get("link", ""),
+        dados.get("price"),
+        dados.get("sale_price"),
+        dados.get("description", ""),
+        dados.get("ncm", dados.get("g:ncm", "")),
+    )
+
+
+def _bloco(registros, relatorio):
+    """Tabela Arrow de um bloco de registros; preços ilegíveis vão para `relatorio`."""
+    colunas = list(zip(*registros)) if registros else [()] * len(COLUNAS)
+    prazo, prazo_invalido = converter_valores(colunas[3])
+    vista, vista_invalido = converter_valores(colunas[4])
+    # Sem preço (ou ilegível) fica 0; sem preço à vista, vale o preço a prazo
+    prazo = np.nan_to_num(prazo, nan=0.0)
+    vista = np.where(np.isnan(vista), prazo, vista)
+    for campo, textos, invalidos in (("price", colunas[3], prazo_invalido), ("sale_price", colunas[4], vista_invalido)):
+        linhas = np.flatnonzero(invalidos)
+        relatorio["precos_invalidos"] += len(linhas)
+        vagas = EXEMPLOS_RELATORIO - len(relatorio["exemplos"])
+        relatorio["exemplos"].extend((colunas[0][i], campo, textos[i]) for i in linhas[:max(vagas, 0)])
+    relatorio["itens"] += len(registros)
+    colunas[3], colunas[4] = prazo, vista
+    return pa.table([pa.array(valores, tipo) for valores, tipo in zip(colunas, _TIPOS)], names=list(COLUNAS))
+
+
+class Feed:
+    """Produtos do feed em colunas Arrow, com índice SKU -> linha e corpus de títulos.
+
+    Os textos ficam em buffers contíguos (o NCM, muito repetido, como
+    dicionário) e os preços em float64; dicts só são montados em `produto`,
+    para os poucos itens exibidos. O índice de SKU é o array ordenado dos SKUs
+    (bytes de largura fixa) e a linha de cada um, consultado por busca binária.
+
+    Com `anterior` (o Feed que este substitui), títulos que não mudaram
+    reaproveitam o texto já normalizado em vez de normalizar de novo.
+    `assinatura` é o (mtime_ns, tamanho) do XML de onde o feed foi lido e
+    `relatorio` o relatório de carga (itens, preços ilegíveis e exemplos deles).
+    """
+
+    __slots__ = ("tabela", "titulos", "assinatura", "relatorio", "_skus", "_linhas")
+
+    def __init__(self, tabela, anterior=None, assinatura=None, relatorio=None):
+        self.tabela = tabela.combine_chunks()
+        self.assinatura = assinatura
+        self.relatorio = relatorio or {}
+        skus = np.array(self.tabela.column("sku").cast(pa.large_binary()).to_pylist(), dtype=bytes)
+        # argsort estável: entre SKUs repetidos a primeira linha vem antes e é a que vale
+        ordem = np.argsort(skus, kind="stable")
+        self._skus = skus[ordem]
+        self._linhas = ordem.astype(np.int32)
+
+        coluna = self.tabela.column("titulo")
+        linhas = np.flatnonzero(coluna.is_valid().to_numpy(zero_copy_only=False)).tolist()
+        titulos = coluna.drop_null().to_pylist()
+        if anterior is None:
+            self.titulos = IndiceFuzzy(titulos, linhas)
+            return
+        ja_normalizados = dict(zip(anterior.tabela.column("titulo").take(anterior.titulos.ids).to_pylist(),
+                                   anterior.titulos.textos))
+        textos = []
+        for titulo in titulos:
+            texto = ja_normalizados.get(titulo)
+            textos.append(normalizar(titulo) if texto is None else texto)
+        self.titulos = IndiceFuzzy.de_normalizados(textos, linhas)
+
+    @classmethod
+    def de_partes(cls, tabela, skus, linhas, titulos, assinatura=None, relatorio=None):
+        """Feed com índice de SKU e corpus de títulos já montados (ver `compartilhado`).
+
+        Nada é copiado: `tabela`, `skus` e `linhas` podem estar mapeados de disco.
+        """
+        feed = cls.__new__(cls)
+        feed.tabela, feed._skus, feed._linhas, feed.titulos = tabela, skus, linhas, titulos
+        feed.assinatura, feed.relatorio = assinatura, relatorio or {}
+        return feed
+
+    def __len__(self):
+        return self.tabela.num_rows
+
+    def posicoes(self, skus):
+        """Linha de cada SKU no feed (array numpy), -1 para os que não estão nele."""
+        chaves = np.array([str(s).encode("utf-8") for s in skus], dtype=bytes)
+        if not len(self._skus) or not len(chaves):
+            return np.full(len(chaves), -1, dtype=np.int64)
+        # Chaves mais longas que o maior SKU não existem; as demais vão para a
+        # largura do índice, para a busca binária não copiar o array inteiro
+        cabem = np.char.str_len(chaves) <= self._skus.dtype.itemsize
+        chaves = chaves.astype(self._skus.dtype)
+        achados = np.minimum(np.searchsorted(self._skus, chaves), len(self._skus) - 1)
+        existe = cabem & (self._skus[achados] == chaves)
+        return np.where(existe, self._linhas[achados], -1).astype(np.int64)
+
+    def valores(self, coluna, posicoes, vazio=None):
+        """Valores de `coluna` nas `posicoes` (numpy); posição -1 ou valor nulo viram `vazio`."""
+        posicoes = np.asarray(posicoes, dtype=np.int64)
+        achados = posicoes >= 0
+        if not len(self):
+            return np.full(len(posicoes), vazio, dtype=object)
+        valores = self.tabela.column(coluna).take(pa.array(np.where(achados, posicoes, 0)))
+        validos = achados & valores.is_valid().to_numpy(zero_copy_only=False)
+        return np.where(validos, valores.to_numpy(zero_copy_only=False), vazio)
+
+    def produto(self, pos):
+        return _produto({coluna: self.tabela.column(coluna)[pos].as_py() for coluna in COLUNAS})
+
+    def produtos(self, posicoes):
+        """`produto` de cada posição, lidos da tabela com um único take."""
+        return [_produto(linha) for linha in self.tabela.take(pa.array(posicoes, pa.int64())).to_pylist()]
+
+    def buscar(self, sku):
+        pos = self.posicoes([sku])[0]
+        return None if pos < 0 else self.produto(pos)
+
+    def _unicos(self):
+        """(SKUs distintos ordenados, linha da primeira ocorrência de cada)."""
+        primeiro = np.ones(len(self._skus), dtype=bool)
+        primeiro[1:] = self._skus[1:] != self._skus[:-1]
+        return self._skus[primeiro], self._linhas[primeiro]
+
+
+def _produto(linha):
+    return {
+        "SKU": linha["sku"],
+        "Título": linha["titulo"] or "",
+        "Link": linha["link"],
+        "Valor à Prazo": linha["preco_prazo"],
+        "Valor à Vista": linha["preco_vista"],
+        "Descrição": linha["descricao"],
+        "NCM": linha["ncm"],
+    }
+
+
+def _iguais(antes, depois):
+    """Comparação elemento a elemento em que dois nulos contam como iguais."""
+    iguais = pc.equal(antes, depois)
+    return pc.fill_null(iguais, pc.and_(pc.is_null(antes), pc.is_null(depois))).to_numpy(zero_copy_only=False)
+
+
+def diferencas(antigo, novo):
+    """SKUs adicionados, removidos, com preço alterado e com algum outro campo alterado.
+
+    `antigo` pode ser None (tudo conta como adicionado).
+    """
+    skus_novo, linhas_novo = novo._unicos()
+    if antigo is None:
+        return {"adicionados": [s.decode() for s in skus_novo], "removidos": [], "precos": [], "alterados": []}
+    skus_antigo, linhas_antigo = antigo._unicos()
+    _, em_antigo, em_novo = np.intersect1d(skus_antigo, skus_novo, assume_unique=True, return_indices=True)
+    de, para = pa.array(linhas_antigo[em_antigo]), pa.array(linhas_novo[em_novo])
+
+    mesmo_preco = np.ones(len(em_novo), dtype=bool)
+    mesmo_resto = np.ones(len(em_novo), dtype=bool)
+    for coluna in COLUNAS[1:]:
+        iguais = _iguais(antigo.tabela.column(coluna).take(de), novo.tabela.column(coluna).take(para))
+        if coluna.startswith("preco"):
+            mesmo_preco &= iguais
+        else:
+            mesmo_resto &= iguais
+    comuns = skus_novo[em_novo]
+    return {
+        "adicionados": [s.decode() for s in np.delete(skus_novo, em_novo)],
+        "removidos": [s.decode() for s in np.delete(skus_antigo, em_antigo)],
+        "precos": [s.decode() for s in comuns[~mesmo_preco]],
+        "alterados": [s.decode() for s in comuns[mesmo_preco & ~mesmo_resto]],
+    }
+
+
+def carregar_feed(caminho, anterior=None):
+    """Lê o XML em streaming: cada <item> vira uma tupla e é descartado da árvore.
+
+    As tuplas viram colunas a cada `ITENS_POR_BLOCO` itens, então a memória
+    de objetos Python fica limitada a um bloco durante a leitura. Preços que
+    não formam um número valem 0 (ou o preço a prazo, no à vista) e são
+    contados no relatório de carga em vez de interromper a leitura.
+    """
+    estado = os.stat(caminho)
+    relatorio = {"itens": 0, "precos_invalidos": 0, "exemplos": []}
+    blocos = []
+    registros = []
+    pilha = []
+    try:
+        for evento, elem in ET.iterparse(caminho, events=("start", "end")):
+            if evento == "start":
+                pilha.append(elem)
+                continue
+            pilha.pop()
+            if clean_tag(elem.tag) != "item":
+                continue
+            registros.append(_registro(elem))
+            elem.clear()
+            if pilha:
+                pilha[-1].remove(elem)
+            if len(registros) == ITENS_POR_BLOCO:
+                blocos.append(_bloco(registros, relatorio))
+                registros = []
+    except ET.ParseError:
+        return None
+    blocos.append(_bloco(registros, relatorio))
+    tabela = pa.concat_tables(blocos).combine_chunks()
+    # NCM se repete muito: guardado como dicionário (categórico)
+    tabela = tabela.set_column(COLUNAS.index("ncm"), "ncm", pc.dictionary_encode(tabela.column("ncm")))
+    if relatorio["precos_invalidos"]:
+        log.warning("%s: %d preço(s) ilegível(is), por exemplo %s", caminho, relatorio["precos_invalidos"],
+                    relatorio["exemplos"][:3])
+    return Feed(tabela, anterior, (estado.st_mtime_ns, estado.st_size), relatorio)
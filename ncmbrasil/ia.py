@@ -0,0 +1,294 @@
+"""Análise de NCM por LLM (API compatível com OpenAI, Groq por padrão) com cache compartilhado.
+
+As respostas ficam num SQLite em disco, chaveadas pelo título normalizado, pelo
+modelo e pela versão do prompt, com validade (TTL) e limite de itens (os menos
+acessados saem primeiro). Pedidos idênticos simultâneos no mesmo processo viram
+uma única chamada: quem chega depois espera a resposta de quem chegou antes.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+
+from ncmbrasil.busca import normalizar
+from ncmbrasil.cache import PASTA_CACHE
+from ncmbrasil.datasets import obter
+from ncmbrasil.ncm import aliquota, formatar_codigo, resolver_codigo
+
+URL_API = os.environ.get("NCMBRASIL_LLM_URL", "https://api.groq.com/openai/v1")
+VERSAO_PROMPT = 1
+TIMEOUT = 15
+# Validade da lista de modelos; uma falha (lista vazia) é lembrada por menos tempo
+TTL_MODELOS = 600
+TTL_MODELOS_FALHA = 30
+ERRO_SEM_CONTEUDO = "Erro ao consultar IA: resposta sem conteúdo."
+
+
+def prompt_ncm(produto):
+    return (f"Informe o NCM ideal para o produto: '{produto}', considerando menor imposto possível "
+            f"e correta classificação fiscal.")
+
+
+def chave_resposta(produto, modelo, versao=VERSAO_PROMPT):
+    return hashlib.sha256(f"{versao}\x1f{modelo}\x1f{normalizar(produto).strip()}".encode("utf-8")).hexdigest()
+
+
+class CacheRespostas:
+    """Respostas do LLM em SQLite, com TTL e limite de tamanho."""
+
+    def __init__(self, caminho=None, ttl=7 * 24 * 3600, max_itens=20_000):
+        self.caminho = caminho or os.path.join(PASTA_CACHE, "respostas_ia.sqlite")
+        self.ttl = ttl
+        self.max_itens = max_itens
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        with self._conectar() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("CREATE TABLE IF NOT EXISTS respostas (chave TEXT PRIMARY KEY, resposta TEXT NOT NULL, "
+                        "criado REAL NOT NULL, acessado REAL NOT NULL)")
+            con.execute("CREATE INDEX IF NOT EXISTS respostas_acessado ON respostas (acessado)")
+
+    def _conectar(self):
+        # Uma conexão por operação: funciona entre threads e entre processos
+        return sqlite3.connect(self.caminho, timeout=10)
+
+    def obter(self, chave):
+        agora = time.time()
+        with self._conectar() as con:
+            linha = con.execute("SELECT resposta, criado FROM respostas WHERE chave = ?", (chave,)).fetchone()
+            if linha is None:
+                return None
+            if linha[1] < agora - self.ttl:
+                con.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+                return None
+            con.execute("UPDATE respostas SET acessado = ? WHERE chave = ?", (agora, chave))
+            return linha[0]
+
+    def gravar(self, chave, resposta):
+        agora = time.time()
+        with self._conectar() as con:
+            con.execute("INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?)", (chave, resposta, agora, agora))
+            con.execute("DELETE FROM respostas WHERE criado < ?", (agora - self.ttl,))
+            excesso = con.execute("SELECT COUNT(*) FROM respostas").fetchone()[0] - self.max_itens
+            if excesso > 0:
+                con.execute("DELETE FROM respostas WHERE chave IN "
+                            "(SELECT chave FROM respostas ORDER BY acessado LIMIT ?)", (excesso,))
+
+
+_modelos = {}
+_trava_modelos = threading.Lock()
+
+
+def _buscar_modelos(api_key):
+    try:
+        headers = {"Authorization": f"Bearer {api_key}"}
+        resp = requests.get(f"{URL_API}/models", headers=headers, timeout=10)
+        if resp.status_code == 200:
+            return [m["id"] for m in resp.json().get("data", [])]
+    except (requests.RequestException, ValueError, KeyError):
+        pass
+    return []
+
+
+def listar_modelos(api_key):
+    """Modelos disponíveis para a chave, guardados por TTL_MODELOS em memória.
+
+    A entrada é indexada pelo hash da chave, não pela chave em si.
+    """
+    if not api_key:
+        return []
+    chave = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    agora = time.monotonic()
+    with _trava_modelos:
+        item = _modelos.get(chave)
+    if item is not None and item[0] > agora:
+        return item[1]
+    modelos = _buscar_modelos(api_key)
+    with _trava_modelos:
+        _modelos[chave] = (agora + (TTL_MODELOS if modelos else TTL_MODELOS_FALHA), modelos)
+    return modelos
+
+
+_cache = None
+_trava_cache = threading.Lock()
+_em_voo = {}
+_trava_em_voo = threading.Lock()
+
+
+def cache_padrao():
+    global _cache
+    with _trava_cache:
+        if _cache is None:
+            _cache = CacheRespostas()
+        return _cache
+
+
+def conteudo_resposta(data):
+    """Texto da resposta de um chat/completions; None se ela veio sem texto."""
+    try:
+        conteudo = data["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return conteudo if isinstance(conteudo, str) and conteudo.strip() else None
+
+
+def _chamar_llm(api_key, modelo, conteudo):
+    """(resposta, erro) de uma chamada ao chat/completions."""
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+    payload = {"model": modelo, "messages": [{"role": "user", "content": conteudo}]}
+    try:
+        resp = requests.post(f"{URL_API}/chat/completions", headers=headers, json=payload, timeout=TIMEOUT)
+        if resp.status_code != 200:
+            return None, f"Erro ao consultar IA: {resp.status_code}"
+        resposta = conteudo_resposta(resp.json())
+        if resposta is None:
+            return None, ERRO_SEM_CONTEUDO
+        return resposta, None
+    except (requests.RequestException, ValueError) as e:
+        return None, f"Erro ao consultar IA: {str(e)}"
+
+
+def _consultar(api_key, modelo, conteudo, chave, cache):
+    """(resposta, erro, do_cache) com cache e colapso de chamadas idênticas em voo.
+
+    Só respostas bem-sucedidas vão para o cache; erros são devolvidos a todos os
+    que esperavam a mesma chamada, mas a próxima tentativa chama a API de novo.
+    """
+    cache = cache or cache_padrao()
+    resposta = cache.obter(chave)
+    if resposta is not None:
+        return resposta, None, True
+
+    with _trava_em_voo:
+        futuro = _em_voo.get(chave)
+        dono = futuro is None
+        if dono:
+            futuro = _em_voo[chave] = Future()
+    if not dono:
+        resposta, erro = futuro.result()
+        return resposta, erro, erro is None
+
+    try:
+        resposta, erro = _chamar_llm(api_key, modelo, conteudo)
+        if erro is None:
+            cache.gravar(chave, resposta)
+        futuro.set_result((resposta, erro))
+    except BaseException as e:
+        futuro.set_result((None, f"Erro ao consultar IA: {str(e)}"))
+        raise
+    finally:
+        with _trava_em_voo:
+            _em_voo.pop(chave, None)
+    return resposta, erro, False
+
+
+def consultar_ncm_ia(api_key, modelo, produto, cache=None):
+    """(resposta, erro, do_cache) da análise livre de NCM de `produto`."""
+    return _consultar(api_key, modelo, prompt_ncm(produto), chave_resposta(produto, modelo), cache)
+
+
+# ==========================
+# Sugestão com candidatos locais
+# ==========================
+VERSAO_PROMPT_OPCOES = 1
+CANDIDATOS = 8
+# Acima deste score, e com folga sobre o segundo colocado, a busca local decide sozinha
+LIMIAR_SEM_LLM = 95
+FOLGA_SEM_LLM = 5
+# Confiança mínima do classificador local treinado para dispensar busca e LLM
+LIMIAR_CLASSIFICADOR = 0.9
+
+
+def _rotulo_candidato(codigo, arvore):
+    """Descrição do subitem com a da posição (4 dígitos), já que muitos são só "-- Outros"."""
+    descricao = arvore.descricoes[codigo].lstrip("- ").strip()
+    posicao = arvore.descricoes.get(codigo[:4], "").strip()
+    if posicao and posicao != descricao:
+        descricao = f"{posicao[:90]} > {descricao}"
+    return descricao
+
+
+def candidatos_ncm(produto, k=CANDIDATOS):
+    """Os `k` subitens mais parecidos com `produto` no índice local, com IPI.
+
+    Usa o índice de subitens (texto da hierarquia inteira de cada código de 8
+    dígitos), que é o que o modelo pode efetivamente escolher.
+    """
+    arvore = obter("arvore_ncm")
+    return [{"codigo": codigo, "descricao": arvore.descricoes[codigo], "IPI": aliquota(arvore.aliquotas, codigo),
+             "similaridade": round(score, 2), "rotulo": _rotulo_candidato(codigo, arvore)}
+            for codigo, score in obter("indice_ncm_subitens").buscar(produto, k)]
+
+
+def prompt_opcoes(produto, candidatos):
+    linhas = [f"{i}) {formatar_codigo(c['codigo'])} - {c['rotulo']}" for i, c in enumerate(candidatos, 1)]
+    return (f"Classifique o produto '{produto}' na NCM. Responda apenas com o número da opção correta "
+            f"(0 se nenhuma servir).\n" + "\n".join(linhas))
+
+
+def _interpretar(resposta, candidatos, descricoes):
+    """Candidato escolhido pelo modelo: pelo número da opção ou por um código citado."""
+    numero = re.search(r"\b(\d{1,2})\b", resposta)
+    codigo = re.search(r"\b\d{4}\.?\d{2}\.?\d{2}\b", resposta)
+    if codigo:
+        encontrado = resolver_codigo(codigo.group(), descricoes)
+        for c in candidatos:
+            if c["codigo"] == encontrado:
+                return c
+        if encontrado is not None:
+            return {"codigo": encontrado, "descricao": descricoes[encontrado],
+                    "IPI": aliquota(obter("aliquotas"), encontrado), "similaridade": None}
+    if numero and 1 <= int(numero.group(1)) <= len(candidatos):
+        return candidatos[int(numero.group(1)) - 1]
+    return None
+
+
+def sugerir_ncm(api_key, modelo, produto, k=CANDIDATOS, cache=None):
+    """(sugestão, candidatos, erro) para `produto`.
+
+    Se houver classificador local treinado e ele estiver confiante, a sugestão
+    é dele. Senão busca os candidatos no índice local; se o melhor for
+    inequívoco, devolve-o sem chamar o LLM. Senão envia ao modelo um prompt
+    curto de múltipla escolha (com os palpites do classificador à frente) e só
+    aceita respostas que correspondam a um código existente na tabela NCM.
+    A sugestão traz "origem": "classificador", "busca local" ou "IA"; é None
+    (sem erro) quando o modelo responde que nenhuma opção serve.
+    """
+    classificador = obter("classificador_ncm")
+    palpites = []
+    if classificador is not None:
+        arvore = obter("arvore_ncm")
+        palpites = [{"codigo": codigo, "descricao": arvore.descricoes[codigo],
+                     "IPI": aliquota(arvore.aliquotas, codigo), "similaridade": None,
+                     "confianca": round(confianca, 3), "rotulo": _rotulo_candidato(codigo, arvore)}
+                    for codigo, confianca in classificador.prever(produto) if codigo in arvore.descricoes]
+        if palpites and palpites[0]["confianca"] >= LIMIAR_CLASSIFICADOR:
+            return {**palpites[0], "origem": "classificador"}, palpites, None
+
+    candidatos = candidatos_ncm(produto, k)
+    if not candidatos and not palpites:
+        return None, [], "Nenhum NCM parecido encontrado na tabela."
+    if candidatos:
+        primeiro = candidatos[0]["similaridade"]
+        segundo = candidatos[1]["similaridade"] if len(candidatos) > 1 else 0
+        if primeiro >= LIMIAR_SEM_LLM and primeiro - segundo >= FOLGA_SEM_LLM:
+            return {**candidatos[0], "origem": "busca local"}, candidatos, None
+    vistos = {c["codigo"] for c in palpites}
+    candidatos = (palpites + [c for c in candidatos if c["codigo"] not in vistos])[:k]
+
+    # A resposta é o número de uma opção: a chave inclui a lista de opções
+    opcoes = ",".join(c["codigo"] for c in candidatos)
+    chave = chave_resposta(produto, modelo, versao=f"opcoes-{VERSAO_PROMPT_OPCOES}-{opcoes}")
+    resposta, erro, _ = _consultar(api_key, modelo, prompt_opcoes(produto, candidatos), chave, cache)
+    if erro:
+        return None, candidatos, erro
+    if resposta.strip().rstrip(".") == "0":
+        return None, candidatos, None
+    escolhido = _interpretar(resposta, candidatos, obter("descricoes_ncm"))
+    if escolhido is None:
+        return None, candidatos, f"A IA não indicou um NCM válido: {resposta[:200]}"
+    return {**escolhido, "origem": "IA"}, candidatos, None
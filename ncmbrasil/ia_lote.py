@@ -0,0 +1,125 @@
+"""Classificação de NCM por LLM em lote, com chamadas assíncronas de concorrência limitada.
+
+Um único ClientSession (pool de conexões compartilhado) atende todos os
+pedidos; um semáforo limita quantos estão em voo. Respostas 429 e 5xx são
+repetidas respeitando o Retry-After ou, sem ele, com espera exponencial. Cada
+resposta obtida é anexada ao arquivo de checkpoint (JSON Lines), então uma
+execução interrompida retoma só o que faltou.
+"""
+import asyncio
+import json
+import os
+import random
+
+import aiohttp
+import pandas as pd
+
+from ncmbrasil import ia
+
+STATUS_REPETIR = {429, 500, 502, 503, 504}
+
+
+def _ler_checkpoint(caminho):
+    feitos = {}
+    if caminho and os.path.exists(caminho):
+        with open(caminho, encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except json.JSONDecodeError:
+                    # Última linha cortada por uma interrupção no meio da gravação
+                    continue
+                feitos[registro["chave"]] = registro["resposta"]
+    return feitos
+
+
+def _espera(tentativa, retry_after=None):
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return min(60.0, 2 ** tentativa) * (0.5 + random.random() / 2)
+
+
+async def _chamar(sessao, semaforo, api_key, modelo, conteudo, tentativas):
+    headers = {"Authorization": f"Bearer {api_key}"}
+    payload = {"model": modelo, "messages": [{"role": "user", "content": conteudo}]}
+    erro = None
+    for tentativa in range(tentativas):
+        async with semaforo:
+            try:
+                async with sessao.post(f"{ia.URL_API}/chat/completions", headers=headers, json=payload) as resp:
+                    if resp.status == 200:
+                        resposta = ia.conteudo_resposta(await resp.json())
+                        # Sem texto é erro: nada vai para o cache nem para o checkpoint
+                        return (None, ia.ERRO_SEM_CONTEUDO) if resposta is None else (resposta, None)
+                    erro = f"Erro ao consultar IA: {resp.status}"
+                    if resp.status not in STATUS_REPETIR:
+                        return None, erro
+                    espera = _espera(tentativa, resp.headers.get("Retry-After"))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                erro = f"Erro ao consultar IA: {e!r}"
+                espera = _espera(tentativa)
+        # A espera acontece fora do semáforo, liberando a vaga para outros pedidos
+        await asyncio.sleep(espera)
+    return None, erro
+
+
+async def classificar_lote(produtos, api_key, modelo, concorrencia=8, checkpoint=None, tentativas=5,
+                           cache=None, progresso=None):
+    """Lista de (resposta, erro) na ordem de `produtos`.
+
+    Títulos que normalizam igual são consultados uma vez. Antes da API são
+    consultados o checkpoint e o cache de respostas (ncmbrasil.ia); o que vem da
+    API é gravado nos dois. `tentativas` (pelo menos 1) conta a primeira chamada.
+    """
+    if tentativas < 1:
+        raise ValueError(f"tentativas deve ser pelo menos 1 (recebido {tentativas}).")
+    cache = cache or ia.cache_padrao()
+    chaves = [ia.chave_resposta(p, modelo) for p in produtos]
+    resultados = {c: (r, None) for c, r in _ler_checkpoint(checkpoint).items()}
+    pendentes = {}
+    for produto, chave in zip(produtos, chaves):
+        if chave in resultados or chave in pendentes:
+            continue
+        resposta = cache.obter(chave)
+        if resposta is not None:
+            resultados[chave] = (resposta, None)
+        else:
+            pendentes[chave] = produto
+
+    semaforo = asyncio.Semaphore(concorrencia)
+    conector = aiohttp.TCPConnector(limit=concorrencia)
+    timeout = aiohttp.ClientTimeout(total=ia.TIMEOUT)
+    arquivo = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+    try:
+        async with aiohttp.ClientSession(connector=conector, timeout=timeout) as sessao:
+            async def tarefa(chave, produto):
+                resposta, erro = await _chamar(sessao, semaforo, api_key, modelo, ia.prompt_ncm(produto), tentativas)
+                return chave, resposta, erro
+
+            tarefas = [asyncio.ensure_future(tarefa(c, p)) for c, p in pendentes.items()]
+            for feitas, concluida in enumerate(asyncio.as_completed(tarefas), 1):
+                chave, resposta, erro = await concluida
+                resultados[chave] = (resposta, erro)
+                if erro is None:
+                    cache.gravar(chave, resposta)
+                    if arquivo:
+                        arquivo.write(json.dumps({"chave": chave, "produto": pendentes[chave],
+                                                  "resposta": resposta}, ensure_ascii=False) + "\n")
+                        arquivo.flush()
+                if progresso:
+                    progresso(feitas, len(tarefas))
+    finally:
+        if arquivo:
+            arquivo.close()
+    return [resultados[c] for c in chaves]
+
+
+def classificar_produtos(produtos, api_key, modelo, **opcoes):
+    """Versão síncrona de `classificar_lote`, devolvendo um DataFrame produto/resposta/erro."""
+    produtos = [str(p) for p in produtos]
+    resultados = asyncio.run(classificar_lote(produtos, api_key, modelo, **opcoes))
+    return pd.DataFrame({"produto": produtos, "resposta": [r for r, _ in resultados],
+                         "erro": [e or "" for _, e in resultados]})
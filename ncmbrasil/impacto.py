@@ -0,0 +1,89 @@
+"""Impacto de uma nova TIPI no catálogo: alíquotas alteradas e o efeito no preço de cada SKU.
+
+Tudo em joins de coluna: a diferença entre as TIPIs é um merge por código, a
+alíquota de cada SKU (própria ou herdada) um hash join por nível e o novo
+preço a mesma decomposição de `precos.calcular_preco_final`, mantido o valor
+base sem IPI.
+
+    codigos, skus, resumo = impacto_tipi(carregar_tipi("tipi.xlsx"), carregar_tipi("tipi_nova.xlsx"),
+                                         obter("feed"), obter("ipi_por_sku"))
+"""
+import numpy as np
+import pandas as pd
+
+from ncmbrasil.ncm import aliquotas_herdadas, indexar_aliquotas, padronizar_codigos
+from ncmbrasil.precos import reajustar_preco
+
+COLUNAS_SKUS = ["SKU", "titulo", "NCM", "origem_antiga", "IPI_antigo", "origem_nova", "IPI_novo",
+                "IPI_itens", "preco_prazo", "preco_prazo_novo", "delta_prazo",
+                "preco_vista", "preco_vista_novo", "delta_vista"]
+
+
+def diferencas_tipi(antiga, nova):
+    """Códigos cuja alíquota mudou, entrou ou saiu: codigo, IPI_antigo, IPI_novo, mudanca."""
+    # EX repetem o código: vale a primeira linha, como em indexar_aliquotas
+    juntas = antiga.drop_duplicates("codigo")[["codigo", "IPI"]].merge(
+        nova.drop_duplicates("codigo")[["codigo", "IPI"]], on="codigo", how="outer",
+        suffixes=("_antigo", "_novo"), indicator=True)
+    juntas["mudanca"] = np.select([juntas["_merge"] == "left_only", juntas["_merge"] == "right_only"],
+                                  ["excluído", "incluído"], "alterado")
+    mudou = (juntas["_merge"] != "both") | (juntas["IPI_antigo"] != juntas["IPI_novo"])
+    return juntas[mudou].drop(columns="_merge").sort_values("codigo").reset_index(drop=True)
+
+
+def _percentual(aliquotas):
+    # "NT" (sem alíquota) não tem IPI
+    return pd.to_numeric(pd.Series(aliquotas, dtype=object).replace("NT", 0.0)).to_numpy(dtype=float)
+
+
+def impacto_tipi(antiga, nova, feed, itens):
+    """(códigos alterados, SKUs afetados, resumo) da troca da TIPI `antiga` pela `nova`.
+
+    O catálogo são os SKUs do feed, com o NCM do feed; `itens` (IPI Itens
+    indexado por SKU) entra com o IPI % cadastrado, para comparação. Os preços
+    novos mantêm o valor base de cada preço do feed e trocam só a alíquota.
+    """
+    codigos = diferencas_tipi(antiga, nova)
+    if feed is None:
+        return codigos, pd.DataFrame(columns=COLUNAS_SKUS), {"codigos_alterados": len(codigos)}
+    catalogo = feed.tabela.select(["sku", "titulo", "ncm", "preco_prazo", "preco_vista"]).to_pandas() \
+        .drop_duplicates("sku").reset_index(drop=True)
+    # Centenas de NCMs distintos para o catálogo inteiro: alíquotas por NCM, depois por SKU
+    posicoes, distintos = pd.factorize(catalogo["ncm"].astype(object).fillna(""))
+    distintos = padronizar_codigos(distintos)
+    origem_antiga, ipi_antigo = (a[posicoes] for a in aliquotas_herdadas(indexar_aliquotas(antiga), distintos))
+    origem_nova, ipi_novo = (a[posicoes] for a in aliquotas_herdadas(indexar_aliquotas(nova), distintos))
+    ncms = distintos.to_numpy()[posicoes]
+    com_ncm = ncms != ""
+    afetados = com_ncm & (pd.Series(ipi_antigo).astype(str) != pd.Series(ipi_novo).astype(str)).to_numpy()
+
+    antes, depois = _percentual(ipi_antigo[afetados]), _percentual(ipi_novo[afetados])
+    skus = pd.DataFrame({
+        "SKU": catalogo["sku"].to_numpy()[afetados],
+        "titulo": catalogo["titulo"].to_numpy()[afetados],
+        "NCM": ncms[afetados],
+        "origem_antiga": origem_antiga[afetados],
+        "IPI_antigo": ipi_antigo[afetados],
+        "origem_nova": origem_nova[afetados],
+        "IPI_novo": ipi_novo[afetados],
+    })
+    skus["IPI_itens"] = itens["IPI %"].reindex(skus["SKU"]).to_numpy() if len(itens) else np.nan
+    for prazo in ("prazo", "vista"):
+        precos = catalogo[f"preco_{prazo}"].to_numpy()[afetados]
+        novos = np.round(reajustar_preco(precos, antes, depois), 2)
+        skus[f"preco_{prazo}"] = precos
+        skus[f"preco_{prazo}_novo"] = novos
+        skus[f"delta_{prazo}"] = np.round(novos - precos, 2)
+
+    resumo = {
+        "codigos_alterados": int((codigos["mudanca"] == "alterado").sum()),
+        "codigos_incluidos": int((codigos["mudanca"] == "incluído").sum()),
+        "codigos_excluidos": int((codigos["mudanca"] == "excluído").sum()),
+        "skus_catalogo": len(catalogo),
+        "skus_sem_ncm": int((~com_ncm).sum()),
+        "skus_afetados": len(skus),
+        "skus_com_aumento": int((depois > antes).sum()),
+        "skus_com_reducao": int((depois < antes).sum()),
+        "delta_prazo_total": round(float(skus["delta_prazo"].sum()), 2),
+    }
+    return codigos, skus.sort_values(["NCM", "SKU"]).reset_index(drop=True), resumo
@@ -0,0 +1,150 @@
+"""Processamento em lote de planilhas de produtos: feed, classificação NCM e IPI.
+
+O arquivo de entrada é lido em blocos (`chunksize`), cada bloco passa pelas três
+etapas num processo do pool e o resultado é gravado à medida que os blocos
+terminam, na ordem de entrada. A memória fica limitada a alguns blocos em voo,
+seja qual for o tamanho do arquivo.
+"""
+import collections
+import functools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ncmbrasil import consultas
+from ncmbrasil.datasets import aquecer, obter
+from ncmbrasil.precos import valores_lote
+
+
+def enriquecer_sku(df, coluna_sku):
+    """Acrescenta título, NCM e preços do feed de cada SKU (vazio se não estiver no feed)."""
+    feed = obter("feed")
+    colunas = [("titulo_feed", "titulo", ""), ("descricao_feed", "descricao", ""), ("ncm_feed", "ncm", ""),
+               ("preco_prazo_feed", "preco_prazo", np.nan), ("preco_vista_feed", "preco_vista", np.nan)]
+    if feed is None:
+        for coluna, _, vazio in colunas:
+            df[coluna] = vazio
+        return df
+    posicoes = feed.posicoes(df[coluna_sku].astype(str).str.strip())
+    for coluna, campo, vazio in colunas:
+        df[coluna] = feed.valores(campo, posicoes, vazio)
+    return df
+
+
+def classificar_descricao(df, coluna_texto):
+    """Melhor NCM por similaridade de descrição; textos repetidos são buscados uma vez."""
+    textos = df[coluna_texto].fillna("").astype(str)
+    unicos = [t for t in pd.unique(textos) if t.strip()]
+    melhores = {t: r[0] for t, r in zip(unicos, consultas.buscar_por_descricao_lote(unicos, limite=1)) if r}
+    achados = [melhores.get(t) for t in textos]
+    df["ncm_sugerido"] = [a["codigo"] if a else "" for a in achados]
+    df["descricao_ncm"] = [a["descricao"] if a else "" for a in achados]
+    df["ipi_tipi"] = [str(a["IPI"]) if a else "" for a in achados]
+    df["similaridade"] = [a["similaridade"] if a else np.nan for a in achados]
+    return df
+
+
+def calcular_ipi(df, coluna_sku, coluna_valor, coluna_frete=None):
+    """IPI de cada linha; valor vazio ou ilegível (ou frete ilegível) vai para calc_erro, sem cálculo."""
+    valor_final, erro = valores_lote(df[coluna_valor], coluna_valor)
+    entrada = pd.DataFrame({"SKU": df[coluna_sku].astype(str).to_numpy(), "valor_final": valor_final})
+    if coluna_frete:
+        entrada["frete"], erro_frete = valores_lote(df[coluna_frete], coluna_frete, vazio=0.0)
+        erro = np.where(erro != "", erro, erro_frete)
+    entrada["erro"] = erro
+    calculo = consultas.calcular_precos_lote(entrada)
+    for coluna in ["IPI %", "valor_base", "ipi", "valor_final", "erro"]:
+        df[f"calc_{coluna}"] = calculo[coluna].to_numpy()
+    return df
+
+
+def processar_bloco(df, coluna_sku, coluna_texto=None, coluna_valor=None, coluna_frete=None):
+    df = enriquecer_sku(df, coluna_sku)
+    # Sem coluna de texto própria, classifica pelo título que veio do feed
+    df = classificar_descricao(df, coluna_texto or "titulo_feed")
+    if coluna_valor:
+        df = calcular_ipi(df, coluna_sku, coluna_valor, coluna_frete)
+    return df
+
+
+class _GravadorCSV:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.cabecalho = True
+
+    def gravar(self, df):
+        df.to_csv(self.caminho, mode="w" if self.cabecalho else "a", header=self.cabecalho, index=False)
+        self.cabecalho = False
+
+    def fechar(self):
+        pass
+
+
+class _GravadorParquet:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.escritor = None
+
+    def gravar(self, df):
+        if self.escritor is None:
+            tabela = pa.Table.from_pandas(df, preserve_index=False)
+            self.escritor = pq.ParquetWriter(self.caminho, tabela.schema)
+        else:
+            # Blocos seguintes seguem o schema do primeiro (uma coluna toda vazia não vira "null")
+            tabela = pa.Table.from_pandas(df, schema=self.escritor.schema, preserve_index=False)
+        self.escritor.write_table(tabela)
+
+    def fechar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+
+
+def _gravador(caminho):
+    return _GravadorParquet(caminho) if caminho.lower().endswith(".parquet") else _GravadorCSV(caminho)
+
+
+def processar_arquivo(entrada, saida, coluna_sku, coluna_texto=None, coluna_valor=None, coluna_frete=None,
+                      tamanho_bloco=50_000, processos=None, sep=",", progresso=sys.stderr):
+    """Processa `entrada` (CSV) em blocos e grava `saida` (CSV ou .parquet). Retorna o total de linhas."""
+    tarefa = functools.partial(processar_bloco, coluna_sku=coluna_sku, coluna_texto=coluna_texto,
+                               coluna_valor=coluna_valor, coluna_frete=coluna_frete)
+    processos = os.cpu_count() if processos is None else processos
+    blocos = pd.read_csv(entrada, dtype=str, sep=sep, chunksize=tamanho_bloco, keep_default_na=False)
+    gravador = _gravador(saida)
+    total = 0
+    inicio = time.perf_counter()
+
+    def registrar(df):
+        nonlocal total
+        gravador.gravar(df)
+        total += len(df)
+        decorrido = time.perf_counter() - inicio
+        print(f"{total:,} linhas | {decorrido:,.1f} s | {total / decorrido:,.0f} linhas/s",
+              file=progresso, flush=True)
+
+    try:
+        if processos <= 1:
+            for bloco in blocos:
+                registrar(tarefa(bloco))
+            return total
+        datasets = ["feed", "indice_ncm", "descricoes_ncm", "aliquotas"]
+        if coluna_valor:
+            datasets.append("ipi_por_sku")
+        with ProcessPoolExecutor(processos, initializer=aquecer, initargs=(datasets,)) as pool:
+            # No máximo dois blocos por processo em voo: a leitura não corre à frente da gravação
+            em_voo = collections.deque()
+            for bloco in blocos:
+                em_voo.append(pool.submit(tarefa, bloco))
+                if len(em_voo) >= 2 * processos:
+                    registrar(em_voo.popleft().result())
+            while em_voo:
+                registrar(em_voo.popleft().result())
+    finally:
+        gravador.fechar()
+    return total
@@ -0,0 +1,91 @@
+"""Memória ocupada pelos datasets e pelo processo, para o painel de status.
+
+`estimar` percorre o objeto e tudo o que ele referencia (atributos, itens de
+listas e dicts), somando o tamanho de cada objeto Python uma vez só; colunas
+pandas, Arrow e arrays numpy entram pelo tamanho dos seus buffers. Arrays
+mapeados de arquivo (o feed da pasta compartilhada) são contados à parte:
+ficam no cache de páginas do sistema, divididos entre os processos.
+"""
+import os
+import sys
+import threading
+import types
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from ncmbrasil.feed import Feed
+
+# Objetos que não são dados do dataset (código, travas, tipos)
+_IGNORADOS = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+              type(threading.Lock()), type(threading.RLock()))
+
+
+def _atributos(objeto):
+    if hasattr(objeto, "__dict__"):
+        yield from vars(objeto).values()
+    for classe in type(objeto).__mro__:
+        for nome in getattr(classe, "__slots__", ()):
+            if hasattr(objeto, nome):
+                yield getattr(objeto, nome)
+
+
+def estimar(objeto, vistos=None):
+    """(bytes próprios, bytes mapeados de arquivo) de `objeto` e do que ele referencia.
+
+    Objetos cujo id está em `vistos` não são contados de novo: passando o mesmo
+    conjunto para vários datasets, o que um compartilha com outro já medido
+    (o índice por trás da busca incremental, por exemplo) conta uma vez só.
+    """
+    vistos = set() if vistos is None else vistos
+    propria = mapeada = 0
+    pendentes = [objeto]
+    while pendentes:
+        atual = pendentes.pop()
+        if atual is None or id(atual) in vistos or isinstance(atual, _IGNORADOS):
+            continue
+        vistos.add(id(atual))
+        if isinstance(atual, Feed):
+            # Colunas e índice de SKU vêm juntos: todos mapeados ou todos do processo
+            dados = atual.tabela.nbytes + atual._skus.nbytes + atual._linhas.nbytes
+            if isinstance(atual._skus, np.memmap):
+                mapeada += dados
+            else:
+                propria += dados
+            pendentes.extend((atual.titulos, atual.relatorio))
+        elif isinstance(atual, (pd.DataFrame, pd.Series)):
+            uso = atual.memory_usage(deep=True)
+            propria += int(uso.sum() if isinstance(atual, pd.DataFrame) else uso)
+        elif isinstance(atual, pd.Index):
+            propria += atual.memory_usage(deep=True)
+        elif isinstance(atual, (pa.Table, pa.RecordBatch, pa.Array, pa.ChunkedArray)):
+            propria += atual.nbytes
+        elif isinstance(atual, np.memmap):
+            mapeada += atual.nbytes
+        elif isinstance(atual, np.ndarray):
+            propria += atual.nbytes
+            if atual.dtype == object:
+                pendentes.extend(atual.ravel().tolist())
+        elif isinstance(atual, (str, bytes, int, float, bool)):
+            propria += sys.getsizeof(atual)
+        elif isinstance(atual, dict):
+            propria += sys.getsizeof(atual)
+            pendentes.extend(atual.keys())
+            pendentes.extend(atual.values())
+        elif isinstance(atual, (list, tuple, set, frozenset)):
+            propria += sys.getsizeof(atual)
+            pendentes.extend(atual)
+        else:
+            propria += sys.getsizeof(atual)
+            pendentes.extend(_atributos(atual))
+    return propria, mapeada
+
+
+def memoria_processo():
+    """RSS do processo em bytes (None onde não há /proc)."""
+    try:
+        with open("/proc/self/statm") as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
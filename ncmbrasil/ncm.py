@@ -0,0 +1,177 @@
+"""Consultas de NCM e alíquota de IPI sobre índices em memória (dicionários por código)."""
+import bisect
+import re
+
+import numpy as np
+import pandas as pd
+
+# Quantidade de dígitos de cada nível: capítulo, posição, subposições, item e subitem
+NIVEIS = (2, 4, 5, 6, 7, 8)
+
+
+def padronizar_codigo(codigo):
+    """Só os dígitos, preservando o nível: "01" capítulo, "0101" posição, "01012100" subitem.
+
+    Capítulos e posições que perderam o zero à esquerda ("1", "101") voltam a tê-lo.
+    """
+    codigo = re.sub(r"\D", "", str(codigo))
+    return codigo.zfill(len(codigo) + 1) if len(codigo) in (1, 3) else codigo
+
+
+def padronizar_codigos(codigos):
+    """`padronizar_codigo` para uma coluna inteira (Series), em operações de string do pandas."""
+    codigos = pd.Series(codigos, dtype=object).fillna("").astype(str).str.replace(r"\D", "", regex=True)
+    tamanhos = codigos.str.len()
+    return codigos.mask(tamanhos == 1, codigos.str.zfill(2)).mask(tamanhos == 3, codigos.str.zfill(4))
+
+
+def formatar_codigo(codigo):
+    """"01012100" -> "0101.21.00", como na tabela oficial."""
+    if len(codigo) <= 2:
+        return codigo
+    if len(codigo) == 4:
+        return f"{codigo[:2]}.{codigo[2:]}"
+    return ".".join(p for p in (codigo[:4], codigo[4:6], codigo[6:]) if p)
+
+
+def ancestrais(codigo):
+    """Prefixos de `codigo` em cada nível acima dele, do capítulo para baixo."""
+    return [codigo[:n] for n in NIVEIS if n < len(codigo)]
+
+
+def _indexar(df, coluna):
+    # Códigos repetidos (ex.: linhas EX da TIPI) ficam com a primeira ocorrência
+    df = df.drop_duplicates("codigo")
+    return dict(zip(df["codigo"], df[coluna].tolist()))
+
+
+def indexar_aliquotas(df_tipi):
+    """Dicionário código NCM -> alíquota de IPI da TIPI."""
+    return _indexar(df_tipi, "IPI")
+
+
+def indexar_descricoes(df_ncm):
+    """Dicionário código NCM -> descrição."""
+    return _indexar(df_ncm, "descricao")
+
+
+def aliquota_herdada(aliquotas, codigo):
+    """(código de origem, alíquota): a do próprio código ou a do ancestral mais próximo."""
+    for origem in [codigo] + ancestrais(codigo)[::-1]:
+        if origem in aliquotas:
+            return origem, aliquotas[origem]
+    return None, "NT"
+
+
+def aliquotas_herdadas(aliquotas, codigos):
+    """`aliquota_herdada` para uma coluna de códigos: arrays (origens, alíquotas).
+
+    Um hash join por nível, do próprio código ao capítulo, em vez de um laço por código.
+    """
+    codigos = pd.Series(codigos, dtype=object).reset_index(drop=True)
+    tabela = pd.Series(aliquotas, dtype=object)
+    tamanhos = codigos.str.len().to_numpy()
+    origens = np.full(len(codigos), None, dtype=object)
+    valores = np.full(len(codigos), "NT", dtype=object)
+    pendentes = np.ones(len(codigos), dtype=bool)
+    for nivel in (None,) + NIVEIS[::-1]:
+        candidatos = codigos if nivel is None else codigos.str.slice(0, nivel)
+        achados = candidatos.map(tabela)
+        novos = pendentes & achados.notna().to_numpy() & (True if nivel is None else tamanhos > nivel)
+        origens[novos] = candidatos.to_numpy()[novos]
+        valores[novos] = achados.to_numpy()[novos]
+        pendentes &= ~novos
+    return origens, valores
+
+
+def aliquota(aliquotas, codigo):
+    return aliquota_herdada(aliquotas, codigo)[1]
+
+
+def resolver_codigo(codigo, descricoes):
+    """Código padronizado presente em `descricoes`, ou None.
+
+    Um subitem que perdeu o zero à esquerda chega com 7 dígitos; se não existir
+    como item, tenta-se o subitem com o zero de volta.
+    """
+    codigo = padronizar_codigo(codigo)
+    if codigo in descricoes:
+        return codigo
+    if len(codigo) == 7 and codigo.zfill(8) in descricoes:
+        return codigo.zfill(8)
+    return None
+
+
+def buscar_por_codigo(codigo, descricoes, aliquotas):
+    encontrado = resolver_codigo(codigo, descricoes)
+    if encontrado is None:
+        return {"erro": f"NCM {padronizar_codigo(codigo)} não encontrado"}
+    origem, ipi = aliquota_herdada(aliquotas, encontrado)
+    return {"codigo": encontrado, "descricao": descricoes[encontrado], "IPI": ipi,
+            "origem_IPI": origem or ""}
+
+
+def _resultados_descricao(escolhas, descricoes, aliquotas):
+    return [{"codigo": codigo, "descricao": descricoes[codigo], "IPI": aliquota(aliquotas, codigo),
+             "similaridade": round(score, 2)} for codigo, score in escolhas]
+
+
+def buscar_por_descricao(termo, indice, descricoes, aliquotas, limite=10):
+    """Busca aproximada em um IndiceFuzzy (ou BuscaIncremental) cujos ids são códigos NCM."""
+    return _resultados_descricao(indice.buscar(termo, limite), descricoes, aliquotas)
+
+
+def buscar_por_descricao_lote(termos, indice, descricoes, aliquotas, limite=10):
+    """`buscar_por_descricao` para vários termos numa única passada do cdist."""
+    return [_resultados_descricao(escolhas, descricoes, aliquotas)
+            for escolhas in indice.buscar_lote(termos, limite)]
+
+
+def texto_hierarquico(arvore, codigo):
+    """Descrições da posição até o código, que sozinho costuma ser só "-- Outros"."""
+    return " ".join(arvore.descricoes[c] for c in arvore.caminho(codigo) if len(c) >= 4)
+
+
+class ArvoreNCM:
+    """Hierarquia da NCM sobre a lista ordenada de códigos.
+
+    Em ordem lexicográfica os descendentes de um código formam uma faixa
+    contígua logo após ele, localizada por busca binária.
+    """
+
+    __slots__ = ("codigos", "descricoes", "aliquotas", "_filhos")
+
+    def __init__(self, descricoes, aliquotas):
+        self.descricoes = descricoes
+        self.aliquotas = aliquotas
+        self.codigos = sorted(descricoes)
+        self._filhos = {}
+        for codigo in self.codigos:
+            self._filhos.setdefault(self.pai(codigo), []).append(codigo)
+
+    def pai(self, codigo):
+        """Ancestral existente mais próximo; "" para capítulos."""
+        for prefixo in ancestrais(codigo)[::-1]:
+            if prefixo in self.descricoes:
+                return prefixo
+        return ""
+
+    def filhos(self, codigo=""):
+        return self._filhos.get(codigo, [])
+
+    def descendentes(self, codigo):
+        ini = bisect.bisect_right(self.codigos, codigo)
+        fim = bisect.bisect_left(self.codigos, codigo + ":")  # ":" vem logo após "9"
+        return self.codigos[ini:fim]
+
+    def caminho(self, codigo):
+        """Do capítulo até o próprio código, só com os níveis existentes."""
+        return [p for p in ancestrais(codigo) if p in self.descricoes] + [codigo]
+
+    def aliquota_herdada(self, codigo):
+        return aliquota_herdada(self.aliquotas, codigo)
+
+    def linha(self, codigo):
+        origem, ipi = self.aliquota_herdada(codigo)
+        return {"codigo": formatar_codigo(codigo), "descricao": self.descricoes.get(codigo, ""),
+                "IPI": ipi, "origem_IPI": formatar_codigo(origem) if origem else ""}
@@ -0,0 +1,155 @@
+"""Cálculo do preço com IPI "por dentro": unitário e em lote, vetorizado."""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import unidecode
+
+COLUNAS_RESULTADO = ["SKU", "Descrição Item", "IPI %", "valor_base", "frete", "ipi", "valor_final", "erro"]
+ERRO_SKU_NAO_ENCONTRADO = "SKU não encontrado na planilha IPI Itens."
+ERRO_IPI_ILEGIVEL = "Alíquota de IPI ilegível na planilha IPI Itens."
+
+# Um "," ou "." seguido só de dígitos é o separador decimal ("1.234,56", "1,234.56",
+# "12,9", "1.234"); antes dele, só grupos de milhar com o outro separador. Sem
+# decimal, o milhar pode repetir o mesmo separador ("1.234.567"). O resto
+# ("1.234,56.78", "1.2345,6") é ilegível.
+_FORA_DO_NUMERO = r"[^\d,.\-]"
+_DECIMAL_VIRGULA = r"^-?(\d{1,3}(\.\d{3})+|\d*),\d+$"
+_DECIMAL_PONTO = r"^-?(\d{1,3}(,\d{3})+|\d*)\.\d+$"
+_INTEIRO = r"^-?(\d{1,3}((\.\d{3})+|(,\d{3})+)|\d+)$"
+
+
+def converter_valores(valores):
+    """Textos de valor ("1.234,56 BRL", "1234.56 BRL", "R$ 12,90") para float64, em colunas.
+
+    Devolve (numeros, invalidos): vazio ou ausente vira NaN; texto que não
+    forma um número também vira NaN e fica marcado em `invalidos`.
+    """
+    textos = pc.utf8_trim_whitespace(pa.array(valores, pa.large_string(), from_pandas=True))
+    limpos = pc.replace_substring_regex(textos, _FORA_DO_NUMERO, "")
+    sem_pontos = pc.replace_substring(limpos, ".", "")
+    nenhum = pa.scalar(None, pa.large_string())
+    numeros = pc.if_else(
+        pc.match_substring_regex(limpos, _DECIMAL_VIRGULA), pc.replace_substring(sem_pontos, ",", "."),
+        pc.if_else(pc.match_substring_regex(limpos, _DECIMAL_PONTO), pc.replace_substring(limpos, ",", ""),
+                   pc.if_else(pc.match_substring_regex(limpos, _INTEIRO),
+                              pc.replace_substring(sem_pontos, ",", ""), nenhum)))
+    validos = pc.is_valid(numeros)
+    preenchidos = pc.fill_null(pc.not_equal(textos, ""), False)
+    numeros = pc.cast(numeros, pa.float64())
+    invalidos = pc.and_(preenchidos, pc.invert(validos))
+    return numeros.to_numpy(zero_copy_only=False), invalidos.to_numpy(zero_copy_only=False)
+
+
+def valores_lote(valores, nome, vazio=np.nan):
+    """Coluna de valores de um lote por `converter_valores`, com o erro de cada linha.
+
+    Devolve (numeros, erros): célula vazia vale `vazio` (NaN pede o valor e
+    vira erro); texto ilegível vira NaN e a explicação fica em `erros`.
+    """
+    serie = pd.Series(valores).reset_index(drop=True)
+    textos = serie.astype(str).where(serie.notna(), None)
+    numeros, invalidos = converter_valores(textos)
+    vazios = np.isnan(numeros) & ~invalidos
+    numeros = np.where(vazios, vazio, numeros)
+    erros = np.where(invalidos, f"{nome} ilegível: " + textos.fillna("").str.strip(),
+                     np.where(vazios & np.isnan(vazio), f"{nome} vazio.", ""))
+    return numeros, erros.astype(object)
+
+
+def indexar_ipi_itens(df_ipi):
+    """IPI Itens indexado por SKU (primeira linha de cada SKU), para busca por hash."""
+    return df_ipi.drop_duplicates("SKU").set_index("SKU")
+
+
+def _decompor(valor_final, frete, ipi_pct):
+    base = (valor_final - frete) / (1 + ipi_pct)
+    ipi_val = base * ipi_pct
+    return base, ipi_val, base + ipi_val + frete
+
+
+def reajustar_preco(valor_final, ipi_antigo_pct, ipi_novo_pct, frete=0.0):
+    """Valor final com outra alíquota de IPI, mantidos o valor base e o frete (aceita arrays)."""
+    base, _, _ = _decompor(valor_final, frete, ipi_antigo_pct / 100)
+    return base * (1 + ipi_novo_pct / 100) + frete
+
+
+def calcular_preco_final(sku, valor_final, frete, itens, ipi_pct=None):
+    """Decompõe o valor final de um SKU; `ipi_pct` (em %) substitui a alíquota do IPI Itens."""
+    sku = str(sku)
+    if sku not in itens.index:
+        if ipi_pct is None:
+            return None, None, ERRO_SKU_NAO_ENCONTRADO
+        descricao = ""
+    else:
+        # .at lê a célula direto, sem montar uma Series com a linha inteira
+        descricao = itens.at[sku, "Descrição Item"]
+        if ipi_pct is None:
+            ipi_pct = itens.at[sku, "IPI %"]
+            if pd.isna(ipi_pct):
+                return descricao, None, ERRO_IPI_ILEGIVEL
+    base, ipi_val, valor_total = _decompor(valor_final, frete, ipi_pct / 100)
+    return descricao, {"valor_base": round(base, 2), "frete": round(frete, 2), "ipi_pct": ipi_pct,
+                       "ipi": round(ipi_val, 2), "valor_final": round(valor_total, 2)}, None
+
+
+def calcular_precos_lote(entrada, itens):
+    """Aplica calcular_preco_final a um DataFrame com colunas SKU, valor_final e frete.
+
+    Tudo em operações de coluna: o join com IPI Itens é um reindex pelo índice de SKU.
+    Linhas que não dá para calcular (SKU sem cadastro, IPI % ilegível no
+    cadastro, valor vazio ou ilegível) saem com os valores vazios e a mensagem na coluna "erro"; uma coluna "erro"
+    na entrada (de `valores_lote`) tem precedência.
+    """
+    skus = entrada["SKU"].astype(str).str.strip()
+    cadastro = itens.reindex(skus.to_numpy())
+    valor_final = entrada["valor_final"].to_numpy(dtype=float)
+    frete = entrada["frete"].to_numpy(dtype=float) if "frete" in entrada else np.zeros(len(entrada))
+    ipi_pct = cadastro["IPI %"].to_numpy(dtype=float)
+    cadastrado = skus.isin(itens.index).to_numpy()
+    base, ipi_val, valor_total = _decompor(valor_final, frete, ipi_pct / 100)
+    erro_entrada = entrada["erro"].fillna("").to_numpy(dtype=object) if "erro" in entrada else ""
+    erro = np.select(
+        [erro_entrada != "", ~cadastrado, np.isnan(ipi_pct), np.isnan(valor_final) | np.isnan(frete)],
+        [erro_entrada, ERRO_SKU_NAO_ENCONTRADO, ERRO_IPI_ILEGIVEL, "valor_final ou frete vazio ou ilegível."],
+        "")
+    calculado = erro == ""
+    return pd.DataFrame({
+        "SKU": skus.to_numpy(),
+        "Descrição Item": cadastro["Descrição Item"].to_numpy(),
+        "IPI %": ipi_pct,
+        "valor_base": np.where(calculado, base.round(2), np.nan),
+        "frete": frete.round(2),
+        "ipi": np.where(calculado, ipi_val.round(2), np.nan),
+        "valor_final": np.where(calculado, valor_total.round(2), np.nan),
+        "erro": erro,
+    }, columns=COLUNAS_RESULTADO)
+
+
+def _nome_coluna(coluna):
+    return unidecode.unidecode(str(coluna)).strip().lower().replace(" ", "_")
+
+
+def ler_planilha_lote(arquivo, nome=None):
+    """Lê o CSV/XLSX de entrada do lote (SKU, valor_final e, opcionalmente, frete).
+
+    Os nomes das colunas são comparados sem acento e sem caixa ("Valor Final" vale).
+    Os valores passam por `converter_valores` ("1.234,56", "R$ 12,90"); frete
+    vazio vale 0, e valor vazio ou ilegível vai para a coluna "erro" em vez de
+    virar 0.
+    """
+    nome = (nome or getattr(arquivo, "name", str(arquivo))).lower()
+    if nome.endswith((".xlsx", ".xls")):
+        df = pd.read_excel(arquivo, dtype=str)
+    else:
+        df = pd.read_csv(arquivo, dtype=str, sep=None, engine="python")
+    df.columns = [_nome_coluna(c) for c in df.columns]
+    faltando = {"sku", "valor_final"} - set(df.columns)
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(sorted(faltando))}")
+    entrada = pd.DataFrame({"SKU": df["sku"].fillna("").to_numpy()})
+    entrada["valor_final"], erro_valor = valores_lote(df["valor_final"], "valor_final")
+    frete = df["frete"] if "frete" in df else pd.Series(None, index=df.index, dtype=object)
+    entrada["frete"], erro_frete = valores_lote(frete, "frete", vazio=0.0)
+    entrada["erro"] = np.where(erro_valor != "", erro_valor, erro_frete)
+    return entrada
@@ -0,0 +1,200 @@
+"""Serviço HTTP/JSON com as consultas de SKU, NCM e IPI do dashboard.
+
+    python -m ncmbrasil.servidor --porta 8080
+
+Rotas (as de POST aceitam lotes de até LIMITE_LOTE itens):
+
+    GET  /saude                 datasets em memória (?memoria=1: com a memória de cada um)
+    GET  /sku/{sku}             POST /sku             {"skus": [...]}
+    GET  /ncm/{codigo}          POST /ncm             {"codigos": [...]}
+    POST /ncm/descricao         {"termos": [...], "limite": 10}  (limite de 1 a LIMITE_RESULTADOS)
+    POST /preco                 {"itens": [{"sku", "valor_final", "frete"}, ...]}
+
+Os datasets são carregados na partida e ficam residentes (o feed é relido em
+segundo plano quando o XML muda, veja `ncmbrasil.atualizacao`); os lotes e as
+buscas aproximadas rodam no pool de threads (o cdist libera o GIL) para não
+travar o laço de eventos. Erros voltam sempre como {"erro": ...}.
+"""
+import argparse
+import asyncio
+import json
+import math
+
+import pandas as pd
+from aiohttp import web
+
+from ncmbrasil import atualizacao, consultas, datasets
+from ncmbrasil.memoria import memoria_processo
+
+LIMITE_LOTE = 10_000
+# Maior "limite" aceito em /ncm/descricao (resultados por termo)
+LIMITE_RESULTADOS = 100
+
+
+def _json(dados, status=200):
+    return web.json_response(dados, status=status, dumps=lambda d: json.dumps(d, ensure_ascii=False))
+
+
+def _erro(mensagem, status=400):
+    return _json({"erro": mensagem}, status)
+
+
+def _corpo_erro(mensagem):
+    """Argumentos de uma HTTPException com o corpo {"erro": ...} das demais respostas de erro."""
+    return {"text": json.dumps({"erro": mensagem}, ensure_ascii=False), "content_type": "application/json"}
+
+
+async def _em_thread(funcao, *args):
+    """Roda `funcao` no pool de threads, sem travar o laço de eventos."""
+    return await asyncio.get_running_loop().run_in_executor(None, funcao, *args)
+
+
+async def _lote(request, campo):
+    """Lista `campo` do corpo JSON; levanta HTTPBadRequest se faltar e HTTPRequestEntityTooLarge se exceder o limite."""
+    try:
+        corpo = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise web.HTTPBadRequest(**_corpo_erro("JSON inválido"))
+    valores = corpo.get(campo) if isinstance(corpo, dict) else None
+    if not isinstance(valores, list):
+        raise web.HTTPBadRequest(**_corpo_erro(f'Campo "{campo}" deve ser uma lista'))
+    if len(valores) > LIMITE_LOTE:
+        raise web.HTTPRequestEntityTooLarge(
+            max_size=LIMITE_LOTE, actual_size=len(valores),
+            **_corpo_erro(f'Campo "{campo}" com {len(valores):,} itens; o limite é {LIMITE_LOTE:,} por chamada'))
+    return corpo, valores
+
+
+def _texto(valor, tipos=(str,)):
+    """`valor` como texto; TypeError se não for de um dos `tipos` (bool não vale como int)."""
+    if type(valor) not in tipos:
+        raise TypeError(valor)
+    return str(valor)
+
+
+def _textos(valores, campo, tipos=(str,)):
+    """Itens de `campo` como texto; HTTPBadRequest se algum não for de um dos `tipos`."""
+    try:
+        return [_texto(v, tipos) for v in valores]
+    except TypeError:
+        nomes = " ou ".join("textos" if t is str else "inteiros" for t in tipos)
+        raise web.HTTPBadRequest(**_corpo_erro(f'Itens de "{campo}" devem ser {nomes}')) from None
+
+
+def _numero(valor):
+    """float finito de `valor`; ValueError para nan, inf ou o que estoura o float (1e309)."""
+    numero = float(valor)
+    if not math.isfinite(numero):
+        raise ValueError(valor)
+    return numero
+
+
+def _sku(sku):
+    item, erro = consultas.buscar_sku(str(sku))
+    return {"SKU": str(sku), "erro": erro} if erro else item
+
+
+def _skus(skus):
+    return [{"SKU": sku, "erro": erro} if erro else item
+            for sku, (item, erro) in zip(skus, consultas.buscar_skus(skus))]
+
+
+async def saude(request):
+    # Medir a memória percorre todos os objetos: só quando pedido, e fora do laço de eventos
+    medir = request.query.get("memoria") == "1"
+    estado = await _em_thread(datasets.status, medir)
+    resposta = {"status": "ok", "datasets": datasets.carregados(), "carga": estado}
+    if medir:
+        resposta["processo_mb"] = round((memoria_processo() or 0) / 2**20, 1)
+    return _json(resposta)
+
+
+async def sku_unico(request):
+    resultado = _sku(request.match_info["sku"])
+    return _json(resultado, 404 if "erro" in resultado else 200)
+
+
+async def sku_lote(request):
+    _, skus = await _lote(request, "skus")
+    return _json({"resultados": await _em_thread(_skus, _textos(skus, "skus"))})
+
+
+async def ncm_unico(request):
+    resultado = consultas.buscar_por_codigo(request.match_info["codigo"])
+    return _json(resultado, 404 if "erro" in resultado else 200)
+
+
+async def ncm_lote(request):
+    _, codigos = await _lote(request, "codigos")
+    codigos = _textos(codigos, "codigos", (str, int))
+    return _json({"resultados": await _em_thread(lambda: [consultas.buscar_por_codigo(c) for c in codigos])})
+
+
+async def ncm_descricao(request):
+    corpo, termos = await _lote(request, "termos")
+    limite = corpo.get("limite", 10)
+    # bool é subclasse de int: true/false não valem como limite
+    if type(limite) is not int or not 1 <= limite <= LIMITE_RESULTADOS:
+        raise web.HTTPBadRequest(**_corpo_erro(f'"limite" deve ser um inteiro de 1 a {LIMITE_RESULTADOS}'))
+    resultados = await _em_thread(consultas.buscar_por_descricao_lote, _textos(termos, "termos"), limite)
+    return _json({"resultados": resultados})
+
+
+async def preco(request):
+    _, itens = await _lote(request, "itens")
+    try:
+        entrada = pd.DataFrame({
+            "SKU": [_texto(i["sku"]) for i in itens],
+            "valor_final": [_numero(i["valor_final"]) for i in itens],
+            "frete": [_numero(i.get("frete", 0) or 0) for i in itens],
+        })
+    except (KeyError, TypeError, ValueError):
+        return _erro('Cada item precisa de "sku" (texto) e "valor_final" numérico finito; "frete", se houver, '
+                     'também finito')
+    registros = consultas.calcular_precos_lote(entrada).to_dict("records")
+    for r in registros:
+        for chave, valor in r.items():
+            if isinstance(valor, float) and math.isnan(valor):
+                r[chave] = None
+    return _json({"resultados": registros})
+
+
+async def _aquecer(app):
+    loop = asyncio.get_running_loop()
+    for nome in datasets.PARTIDA:
+        await loop.run_in_executor(None, datasets.obter, nome)
+
+
+def criar_app(aquecer=True, intervalo_feed=atualizacao.INTERVALO):
+    """App aiohttp; com `intervalo_feed` (segundos) o feed é relido quando o XML muda."""
+    app = web.Application(client_max_size=32 * 1024 * 1024)
+    app.add_routes([
+        web.get("/saude", saude),
+        web.get("/sku/{sku}", sku_unico),
+        web.post("/sku", sku_lote),
+        web.get("/ncm/{codigo}", ncm_unico),
+        web.post("/ncm", ncm_lote),
+        web.post("/ncm/descricao", ncm_descricao),
+        web.post("/preco", preco),
+    ])
+    if aquecer:
+        app.on_startup.append(_aquecer)
+    if intervalo_feed:
+        async def vigiar_feed(app):
+            atualizacao.iniciar_vigia(intervalo_feed)
+        app.on_startup.append(vigiar_feed)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço HTTP de consultas NCM/IPI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8080)
+    parser.add_argument("--intervalo-feed", type=int, default=atualizacao.INTERVALO,
+                        help="Segundos entre verificações do XML do feed (0 = não verificar)")
+    args = parser.parse_args()
+    web.run_app(criar_app(intervalo_feed=args.intervalo_feed), host=args.host, port=args.porta, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Vigência de NCM e TIPI: todos os intervalos por código e consultas "na data".
+
+A tabela NCM traz Data_Inicio/Data_Fim de cada código; a TIPI tem uma planilha
+por versão (pasta tipi_vigencias/). `Vigencias` guarda os intervalos ordenados
+por (código, início) numa chave inteira, de modo que a consulta de milhares de
+pares (código, data), como as notas de uma auditoria, é uma única busca
+binária vetorizada.
+
+    consultar_na_data(notas["ncm"], notas["emissao"], obter("vigencias_ncm"), obter("vigencias_tipi"))
+"""
+import numpy as np
+import pandas as pd
+
+from ncmbrasil.ncm import NIVEIS, padronizar_codigo
+
+# Início e fim de quem não tem data (ou de uma TIPI única, que vale sempre)
+INICIO_SEMPRE = pd.Timestamp("0001-01-01")
+FIM_SEMPRE = pd.Timestamp("9999-12-31")
+# Dias desde 1970 deslocados para caber nos 32 bits de baixo da chave
+_DESLOCAMENTO = 1 << 31
+
+
+def datas_consulta(valores):
+    """Datas de consulta (date, Timestamp, "aaaa-mm-dd" ou "dd/mm/aaaa") -> datetime64[D]; ilegível vira NaT."""
+    serie = pd.Series(valores, dtype=object).reset_index(drop=True)
+    textos = serie.map(lambda v: "" if v is None or v is pd.NaT or v != v else str(v)).str.strip()
+    iso = pd.to_datetime(textos, format="ISO8601", errors="coerce")
+    br = pd.to_datetime(textos.str.split().str[0], format="%d/%m/%Y", errors="coerce")
+    return iso.fillna(br).to_numpy().astype("datetime64[D]")
+
+
+def _dias(datas):
+    return np.asarray(datas).astype("datetime64[D]").astype(np.int64)
+
+
+def _chaves(ids, dias):
+    return (np.asarray(ids, dtype=np.int64) << 32) | (dias + _DESLOCAMENTO)
+
+
+def vigentes(df, data=None):
+    """Linhas em vigor em `data` (padrão: hoje), uma por código (a de início mais recente)."""
+    data = pd.Timestamp(data or pd.Timestamp.today().normalize())
+    df = df[(df["inicio"] <= data) & (df["fim"] >= data)]
+    return df.sort_values("inicio", kind="stable").drop_duplicates("codigo", keep="last") \
+        .sort_index().reset_index(drop=True)
+
+
+def periodo(inicio, fim):
+    """"01/04/2022 a 31/12/2024", ou "desde 01/04/2022" quando não há fim."""
+    if pd.isna(inicio):
+        return ""
+    if fim >= FIM_SEMPRE:
+        return f"desde {inicio:%d/%m/%Y}" if inicio > INICIO_SEMPRE else "sempre"
+    return f"{inicio:%d/%m/%Y} a {fim:%d/%m/%Y}"
+
+
+class Vigencias:
+    """Intervalos de vigência [inicio, fim] por código, com as colunas que valem em cada um.
+
+    `tabela` tem codigo, inicio, fim (datetime64) e as demais colunas, ordenada
+    por (codigo, inicio). A chave de cada linha é id do código << 32 | dia do
+    início: a linha em vigor numa data é a última com chave <= (id, data), se
+    o fim dela não for anterior à data.
+    """
+
+    __slots__ = ("tabela", "_codigos", "_chaves", "_fins")
+
+    def __init__(self, df):
+        self.tabela = df.sort_values(["codigo", "inicio"], kind="stable").reset_index(drop=True)
+        self._codigos = pd.Index(self.tabela["codigo"].unique())
+        self._chaves = _chaves(self._codigos.get_indexer(self.tabela["codigo"]), _dias(self.tabela["inicio"]))
+        self._fins = _dias(self.tabela["fim"])
+
+    def __len__(self):
+        return len(self.tabela)
+
+    def posicoes(self, codigos, datas):
+        """Linha em vigor de cada (código, data) em `tabela`, -1 se o código não vigorava na data.
+
+        `datas` já em datetime64 (ver `datas_consulta`).
+        """
+        ids = self._codigos.get_indexer(pd.Index(codigos, dtype=object))
+        datas = np.asarray(datas, dtype="datetime64[D]")
+        validas = (ids >= 0) & ~np.isnat(datas)
+        if not len(self._chaves):
+            return np.full(len(ids), -1, dtype=np.int64)
+        dias = np.where(validas, _dias(datas), 0)
+        pos = np.searchsorted(self._chaves, _chaves(np.where(validas, ids, 0), dias), side="right") - 1
+        achou = validas & (pos >= 0)
+        pos = np.maximum(pos, 0)
+        achou &= ((self._chaves[pos] >> 32) == ids) & (self._fins[pos] >= dias)
+        return np.where(achou, pos, -1)
+
+    def contem(self, codigos):
+        """Se cada código aparece na tabela, em qualquer período."""
+        return self._codigos.get_indexer(pd.Index(codigos, dtype=object)) >= 0
+
+    def historico(self, codigo):
+        """Todos os intervalos de `codigo`, do mais antigo ao mais recente."""
+        i = self._codigos.get_indexer([codigo])[0]
+        if i < 0:
+            return self.tabela.iloc[:0]
+        inicio, fim = np.searchsorted(self._chaves, [i << 32, (i + 1) << 32])
+        return self.tabela.iloc[inicio:fim]
+
+
+def aliquotas_na_data(tipi, codigos, datas):
+    """(origem, IPI) em vigor em cada data: do próprio código ou do ancestral mais próximo.
+
+    Mesma regra de `ncm.aliquota_herdada`, nível por nível para todas as linhas de uma vez.
+    """
+    codigos = pd.Series(codigos, dtype=object).reset_index(drop=True)
+    tamanhos = codigos.str.len().to_numpy()
+    ipi = np.full(len(codigos), "NT", dtype=object)
+    origem = np.full(len(codigos), "", dtype=object)
+    pendentes = np.ones(len(codigos), dtype=bool)
+    valores = tipi.tabela["IPI"].to_numpy(dtype=object)
+    for nivel in (None,) + NIVEIS[::-1]:
+        candidatos = codigos if nivel is None else codigos.str.slice(0, nivel)
+        pos = tipi.posicoes(candidatos, datas)
+        novos = pendentes & (pos >= 0) & (True if nivel is None else tamanhos > nivel)
+        ipi[novos] = valores[pos[novos]]
+        origem[novos] = candidatos.to_numpy()[novos]
+        pendentes &= ~novos
+    return origem, ipi
+
+
+def consultar_na_data(codigos, datas, ncm, tipi):
+    """NCM e IPI em vigor para cada par (código, data), em lote.
+
+    DataFrame na ordem da entrada com codigo, data, descricao, vigencia
+    (inicio/fim/ato do código na NCM), IPI, origem_IPI e erro (vazio quando
+    o código vigorava na data). Como em `ncm.resolver_codigo`, um subitem de
+    7 dígitos sem correspondência é tentado com o zero à esquerda de volta.
+    """
+    codigos = pd.Series([padronizar_codigo(c) for c in codigos], dtype=object)
+    datas = datas_consulta(datas)
+    pos = ncm.posicoes(codigos, datas)
+    sem_zero = (pos < 0) & (codigos.str.len() == 7).to_numpy()
+    if sem_zero.any():
+        com_zero = codigos.where(~sem_zero, codigos.str.zfill(8))
+        pos_zero = ncm.posicoes(com_zero, datas)
+        corrigir = sem_zero & (pos_zero >= 0)
+        codigos = com_zero.where(corrigir, codigos)
+        pos = np.where(corrigir, pos_zero, pos)
+    linhas = ncm.tabela.reindex(pos)
+    origem, ipi = aliquotas_na_data(tipi, codigos, datas)
+    erro = np.where(np.isnat(datas), "Data inválida.",
+                    np.where(pos < 0, "NCM sem vigência na data.", ""))
+    return pd.DataFrame({
+        "codigo": codigos.to_numpy(),
+        "data": datas,
+        "descricao": linhas["descricao"].to_numpy(),
+        "inicio": linhas["inicio"].to_numpy(),
+        "fim": linhas["fim"].to_numpy(),
+        "ato": linhas["ato"].to_numpy() if "ato" in linhas else "",
+        "IPI": ipi,
+        "origem_IPI": origem,
+        "erro": erro,
+    })
+
+
+def buscar_na_data(codigo, data, ncm, tipi):
+    """`ncm.buscar_por_codigo` na data: o código como vigorava, com a alíquota da TIPI da época."""
+    linha = consultar_na_data([codigo], [data], ncm, tipi).iloc[0]
+    if linha["erro"] == "Data inválida.":
+        return {"erro": f"Data inválida: {data}"}
+    if linha["erro"]:
+        return {"erro": f"NCM {linha['codigo']} sem vigência em {linha['data']:%d/%m/%Y}"}
+    return {"codigo": linha["codigo"], "descricao": linha["descricao"], "IPI": linha["IPI"],
+            "origem_IPI": linha["origem_IPI"], "vigencia": periodo(linha["inicio"], linha["fim"]),
+            "ato": linha["ato"]}
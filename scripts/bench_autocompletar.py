@@ -0,0 +1,56 @@
+"""Busca enquanto se digita (BuscaIncremental) x IndiceFuzzy.buscar a cada tecla: recall@10 e latência.
+
+Digita, letra a letra, consultas tiradas das descrições NCM (ncm_todos.csv,
+como em bench_prefiltro.py) e compara cada tecla com a busca no corpus
+inteiro. recall@10 conta os resultados com score pelo menos igual ao 10º da
+busca completa.
+
+Uso: python scripts/bench_autocompletar.py [--consultas 50]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from bench_prefiltro import ARQUIVO_NCM, gerar_consultas  # noqa: E402
+from ncmbrasil.busca import BuscaIncremental, IndiceFuzzy  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultas", type=int, default=50)
+    parser.add_argument("--semente", type=int, default=1)
+    args = parser.parse_args()
+
+    descricoes = pd.read_csv(ARQUIVO_NCM, dtype=str).iloc[:, 1].fillna("").tolist()
+    indice = IndiceFuzzy(descricoes, prefiltro=False)
+    busca = BuscaIncremental(indice)
+    tempos_incremental, tempos_completo, recalls = [], [], []
+    for consulta in gerar_consultas(indice.textos, args.consultas, random.Random(args.semente)):
+        for fim in range(busca.min_caracteres, len(consulta) + 1):
+            termo = consulta[:fim].strip()
+            if len(termo) < busca.min_caracteres:
+                continue
+            inicio = time.perf_counter()
+            incremental = busca.buscar(termo)
+            tempos_incremental.append((time.perf_counter() - inicio) * 1000)
+            inicio = time.perf_counter()
+            completo = indice.buscar(termo)
+            tempos_completo.append((time.perf_counter() - inicio) * 1000)
+            corte = completo[-1][1]
+            recalls.append(sum(score >= corte for _, score in incremental) / len(completo))
+
+    print(f"Descrições NCM: {len(indice):,} textos, {args.consultas} consultas, {len(recalls)} teclas")
+    for rotulo, tempos in (("incremental", tempos_incremental), ("completa   ", tempos_completo)):
+        print(f"  {rotulo}: p50 {np.percentile(tempos, 50):8.1f} ms | p95 {np.percentile(tempos, 95):8.1f} ms")
+    print(f"  recall@10: média {np.mean(recalls):.3f} | teclas com recall 1: {np.mean(np.equal(recalls, 1)):.1%}")
+
+
+if __name__ == "__main__":
+    main()
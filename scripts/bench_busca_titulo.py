@@ -0,0 +1,80 @@
+"""Latência por consulta de buscar_titulo: normalização por consulta x corpus pré-calculado.
+
+Uso: python scripts/bench_busca_titulo.py [--itens 200000] [--consultas 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rapidfuzz import fuzz, process  # noqa: E402
+
+from ncmbrasil.busca import normalizar  # noqa: E402
+from ncmbrasil.feed import carregar_feed  # noqa: E402
+
+PALAVRAS = ("chave soquete catraca alicate martelo serra broca jogo kit fenda phillips torque "
+            "polegada bits luva trena nível parafusadeira esmerilhadeira lixadeira cabo extensão "
+            "ponta encaixe magnética isolada aço cromo vanádio profissional").split()
+CONSULTAS = ["chave soquete 1/2", "jogo de bits phillips", "alicate isolado",
+             "serra copo bimetalica", "parafusadeira profissional"]
+
+
+def gerar_feed(caminho, n, semente=1):
+    rnd = random.Random(semente)
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0"?>\n<rss xmlns:g="http://base.google.com/ns/1.0"><channel>\n')
+        for i in range(n):
+            titulo = " ".join(rnd.choice(PALAVRAS) for _ in range(rnd.randint(3, 8))).title()
+            f.write(f"<item><g:id>{i:07d}</g:id><title>{titulo} {rnd.randint(1, 99)}mm</title>"
+                    f"<link>https://loja/p/{i}</link><g:price>{rnd.randint(5, 5000)}.90 BRL</g:price>"
+                    f"<description>{titulo}</description><g:ncm>8204{rnd.randint(10, 99)}00</g:ncm></item>\n")
+        f.write("</channel></rss>\n")
+
+
+def buscar_titulo_antigo(feed, termo, limite=10):
+    """Caminho antigo: monta e normaliza todos os títulos a cada consulta."""
+    titulos = feed.tabela.column("titulo").to_pylist()
+    linhas = [pos for pos, titulo in enumerate(titulos) if titulo is not None]
+    titulos_norm = [normalizar(titulos[pos]) for pos in linhas]
+    escolhas = process.extract(normalizar(termo), titulos_norm, scorer=fuzz.WRatio, limit=limite)
+    return [feed.produto(linhas[idx]) for _, _, idx in escolhas]
+
+
+def buscar_titulo_novo(feed, termo, limite=10):
+    return [feed.produto(pos) for pos, _ in feed.titulos.buscar(termo, limite)]
+
+
+def medir(funcao, feed, consultas):
+    inicio = time.perf_counter()
+    for termo in consultas:
+        funcao(feed, termo)
+    return (time.perf_counter() - inicio) / len(consultas) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--itens", type=int, default=200_000)
+    parser.add_argument("--consultas", type=int, default=len(CONSULTAS))
+    args = parser.parse_args()
+    consultas = (CONSULTAS * args.consultas)[:args.consultas]
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "GoogleShopping_full.xml")
+        gerar_feed(caminho, args.itens)
+        inicio = time.perf_counter()
+        feed = carregar_feed(caminho)
+        carga = time.perf_counter() - inicio
+
+    antes = medir(buscar_titulo_antigo, feed, consultas)
+    depois = medir(buscar_titulo_novo, feed, consultas)
+    print(f"itens: {len(feed):,} | carga do feed (com corpus): {carga:.2f} s")
+    print(f"antes : {antes:9.1f} ms/consulta")
+    print(f"depois: {depois:9.1f} ms/consulta ({antes / depois:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Busca com pré-filtro de trigramas x WRatio contra o corpus inteiro: recall@10 e latência.
+
+Gera títulos sintéticos com o vocabulário da tabela NCM (ncm_todos.csv, se
+existir) e consultas tiradas deles (2 a 4 palavras que não sejam vazias, às
+vezes com um erro de digitação). Com ncm_todos.csv, repete a comparação nas
+descrições NCM, onde o recall mais baixo é o motivo de os índices NCM
+(`indice_ncm`, `indice_ncm_subitens`) rodarem sem o pré-filtro.
+
+recall@10 conta os resultados do pré-filtro com score pelo menos igual ao 10º
+da busca completa, para que empates resolvidos de outro jeito não contem como
+erro.
+
+Uso: python scripts/bench_prefiltro.py [--itens 500000] [--consultas 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from ncmbrasil.busca import IndiceFuzzy, normalizar, normalizar_termos  # noqa: E402
+
+PALAVRAS = ("chave soquete catraca alicate martelo serra broca jogo kit fenda phillips torque "
+            "polegada bits luva trena nivel parafusadeira esmerilhadeira lixadeira cabo extensao "
+            "ponta encaixe magnetica isolada aco cromo vanadio profissional").split()
+ARQUIVO_NCM = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ncm_todos.csv")
+
+
+def vocabulario():
+    palavras = set(PALAVRAS)
+    if os.path.exists(ARQUIVO_NCM):
+        for descricao in pd.read_csv(ARQUIVO_NCM, dtype=str).iloc[:, 1].dropna():
+            palavras.update(p for p in normalizar(descricao).split() if len(p) > 3 and not p.isdigit())
+    return sorted(palavras)
+
+
+def gerar_titulos(n, palavras, rnd):
+    # Frequência de Zipf: poucas palavras muito comuns, cauda longa de raras
+    pesos = 1 / np.arange(1, len(palavras) + 1)
+    escolhas = np.random.default_rng(rnd.randint(0, 2**31)).choice(
+        len(palavras), size=(n, 8), p=pesos / pesos.sum())
+    return [" ".join(palavras[j] for j in linha[:rnd.randint(3, 8)]).title() + f" {rnd.randint(1, 99)}mm"
+            for linha in escolhas]
+
+
+def gerar_consultas(textos, n, rnd):
+    consultas = []
+    for _ in range(n):
+        # Sem palavras vazias: ninguém busca "outros" ou "de"
+        palavras = normalizar_termos(rnd.choice(textos)).split() or normalizar(rnd.choice(textos)).split()
+        consulta = rnd.sample(palavras, min(len(palavras), rnd.randint(2, 4)))
+        if rnd.random() < 0.3:
+            i = rnd.randrange(len(consulta))
+            if len(consulta[i]) > 3:
+                p = rnd.randrange(len(consulta[i]) - 1)
+                consulta[i] = consulta[i][:p] + consulta[i][p + 1] + consulta[i][p] + consulta[i][p + 2:]
+        consultas.append(" ".join(consulta))
+    return consultas
+
+
+def comparar(nome, textos, consultas, limite=10):
+    inicio = time.perf_counter()
+    indice = IndiceFuzzy(textos)
+    normalizacao = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    indice.trigramas()
+    montagem = time.perf_counter() - inicio
+
+    tempos_filtro, tempos_completo, recalls = [], [], []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        filtrado = indice.buscar(consulta, limite)
+        tempos_filtro.append((time.perf_counter() - inicio) * 1000)
+        inicio = time.perf_counter()
+        completo = indice.buscar_completo(consulta, limite)
+        tempos_completo.append((time.perf_counter() - inicio) * 1000)
+        corte = completo[-1][1]
+        recalls.append(sum(score >= corte for _, score in filtrado) / len(completo))
+
+    print(f"\n{nome}: {len(textos):,} textos, {len(consultas)} consultas")
+    print(f"  normalização {normalizacao:.1f} s | índice de trigramas {montagem:.1f} s")
+    for rotulo, tempos in (("pré-filtro", tempos_filtro), ("completa  ", tempos_completo)):
+        print(f"  {rotulo}: p50 {np.percentile(tempos, 50):8.1f} ms | p95 {np.percentile(tempos, 95):8.1f} ms")
+    print(f"  recall@{limite}: média {np.mean(recalls):.3f} | consultas com recall 1: {np.mean(np.equal(recalls, 1)):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--itens", type=int, default=500_000)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--semente", type=int, default=1)
+    args = parser.parse_args()
+    rnd = random.Random(args.semente)
+
+    titulos = gerar_titulos(args.itens, vocabulario(), rnd)
+    comparar("Títulos do feed", titulos, gerar_consultas(titulos, args.consultas, rnd))
+    if os.path.exists(ARQUIVO_NCM):
+        descricoes = pd.read_csv(ARQUIVO_NCM, dtype=str).iloc[:, 1].fillna("").tolist()
+        comparar("Descrições NCM", descricoes, gerar_consultas(descricoes, args.consultas, rnd))
+
+
+if __name__ == "__main__":
+    main()
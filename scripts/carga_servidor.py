@@ -0,0 +1,75 @@
+"""Teste de carga do serviço HTTP (ncmbrasil.servidor) rodando localmente.
+
+Uso: python scripts/carga_servidor.py [--url http://127.0.0.1:8080] [--segundos 10] [--conexoes 64]
+
+Mistura consultas unitárias (GET /ncm, GET /sku) e lotes (POST /sku com
+--tamanho-lote SKUs) e reporta requisições/s e latências p50/p95/p99.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import aiohttp
+
+CODIGOS = ["8471.30.12", "8204.11.00", "8205.40.00", "0101.21.00", "8467.21.00", "9999.99.99"]
+
+
+async def _trabalhador(sessao, url, fim, skus, tamanho_lote, latencias, erros):
+    rnd = random.Random()
+    while time.perf_counter() < fim:
+        sorteio = rnd.random()
+        inicio = time.perf_counter()
+        try:
+            if sorteio < 0.45:
+                req = sessao.get(f"{url}/ncm/{rnd.choice(CODIGOS)}")
+            elif sorteio < 0.9:
+                req = sessao.get(f"{url}/sku/{rnd.choice(skus)}")
+            else:
+                req = sessao.post(f"{url}/sku", json={"skus": rnd.choices(skus, k=tamanho_lote)})
+            async with req as resp:
+                await resp.read()
+                if resp.status >= 500:
+                    erros.append(resp.status)
+        except aiohttp.ClientError as e:
+            erros.append(repr(e))
+            continue
+        latencias.append(time.perf_counter() - inicio)
+
+
+async def executar(args):
+    conector = aiohttp.TCPConnector(limit=args.conexoes)
+    async with aiohttp.ClientSession(connector=conector) as sessao:
+        async with sessao.get(f"{args.url}/saude") as resp:
+            print("saúde:", await resp.json())
+        skus = [f"{i:06d}" for i in range(1, args.skus + 1)]
+        latencias, erros = [], []
+        inicio = time.perf_counter()
+        fim = inicio + args.segundos
+        await asyncio.gather(*[
+            _trabalhador(sessao, args.url, fim, skus, args.tamanho_lote, latencias, erros)
+            for _ in range(args.conexoes)
+        ])
+        duracao = time.perf_counter() - inicio
+    if not latencias:
+        print("nenhuma requisição concluída", erros[:5])
+        return
+    q = statistics.quantiles(latencias, n=100)
+    print(f"requisições: {len(latencias):,} em {duracao:.1f} s -> {len(latencias) / duracao:,.0f} req/s")
+    print(f"latência ms: p50 {q[49] * 1000:.1f} | p95 {q[94] * 1000:.1f} | p99 {q[98] * 1000:.1f}")
+    print(f"erros: {len(erros)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--conexoes", type=int, default=64)
+    parser.add_argument("--skus", type=int, default=2000, help="SKUs 000001..N sorteados nas consultas")
+    parser.add_argument("--tamanho-lote", type=int, default=1000)
+    asyncio.run(executar(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
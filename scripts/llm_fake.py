@@ -0,0 +1,61 @@
+"""Servidor local que imita a API OpenAI/Groq (chat/completions e models), para testes offline.
+
+Uso: python scripts/llm_fake.py [--porta 8765] [--atraso 0.5] [--taxa-429 0.0]
+     NCMBRASIL_LLM_URL=http://127.0.0.1:8765/openai/v1 streamlit run app.py
+
+Responde com um NCM fixo (ou o número da primeira opção, se o prompt listar
+opções "1) ..."), devolve 429 com Retry-After numa fração dos pedidos e conta
+as chamadas em GET /contagem.
+"""
+import argparse
+import asyncio
+import random
+import re
+
+from aiohttp import web
+
+MODELOS = ["llama-3.1-8b-instant", "llama-3.3-70b-versatile"]
+
+
+def criar_app(atraso=0.0, taxa_429=0.0, resposta="NCM 8205.40.00 - Chaves de fenda"):
+    contagem = {"chat": 0, "models": 0, "429": 0}
+
+    async def chat(request):
+        corpo = await request.json()
+        if random.random() < taxa_429:
+            contagem["429"] += 1
+            return web.json_response({"error": {"message": "rate limit"}}, status=429,
+                                     headers={"Retry-After": "0.2"})
+        contagem["chat"] += 1
+        await asyncio.sleep(atraso)
+        conteudo = corpo["messages"][-1]["content"]
+        texto = "1" if re.search(r"^1\)", conteudo, re.M) else resposta
+        return web.json_response({
+            "id": f"fake-{contagem['chat']}", "model": corpo.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": texto}}],
+        })
+
+    async def models(request):
+        contagem["models"] += 1
+        return web.json_response({"data": [{"id": m} for m in MODELOS]})
+
+    async def ver_contagem(request):
+        return web.json_response(contagem)
+
+    app = web.Application()
+    app.add_routes([web.post("/openai/v1/chat/completions", chat), web.get("/openai/v1/models", models),
+                    web.get("/contagem", ver_contagem)])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--atraso", type=float, default=0.5, help="Segundos por resposta")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="Fração de pedidos respondidos com 429")
+    args = parser.parse_args()
+    web.run_app(criar_app(args.atraso, args.taxa_429), host="127.0.0.1", port=args.porta)
+
+
+if __name__ == "__main__":
+    main()
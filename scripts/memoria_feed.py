@@ -0,0 +1,105 @@
+"""Memória do feed por 100 mil itens: dicts por item x tuplas x colunas Arrow.
+
+Gera um XML sintético (títulos e descrições no tamanho dos reais), carrega com
+`carregar_feed` e compara o armazenamento colunar com os formatos anteriores,
+montados a partir das mesmas linhas: um dict por item e uma tupla por item,
+ambos com o dict SKU -> posição. O corpus de títulos normalizados
+(`feed.titulos`) é igual nos três e aparece à parte.
+
+Uso: python scripts/memoria_feed.py [--itens 200000]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyarrow as pa  # noqa: E402
+
+from ncmbrasil.busca import IndiceFuzzy  # noqa: E402
+from ncmbrasil.feed import COLUNAS, carregar_feed  # noqa: E402
+
+PALAVRAS = ("chave soquete catraca alicate martelo serra broca jogo kit fenda phillips torque "
+            "polegada bits luva trena nível parafusadeira esmerilhadeira lixadeira cabo extensão "
+            "ponta encaixe magnética isolada aço cromo vanádio profissional").split()
+CAMPOS_DICT = ("SKU", "Título", "Link", "Valor à Prazo", "Valor à Vista", "Descrição", "NCM")
+
+
+def gerar_feed(caminho, n, semente=1):
+    rnd = random.Random(semente)
+    ncms = [f"8204{rnd.randint(10, 99)}00" for _ in range(300)]
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0"?>\n<rss xmlns:g="http://base.google.com/ns/1.0"><channel>\n')
+        for i in range(n):
+            titulo = " ".join(rnd.choice(PALAVRAS) for _ in range(rnd.randint(4, 10))).title()
+            descricao = " ".join(rnd.choice(PALAVRAS) for _ in range(rnd.randint(20, 60)))
+            preco = rnd.randint(5, 5000)
+            f.write(f"<item><g:id>{i:07d}</g:id><title>{titulo}</title><link>https://loja/p/{i}</link>"
+                    f"<g:price>{preco}.90 BRL</g:price><g:sale_price>{preco * 0.9:.2f} BRL</g:sale_price>"
+                    f"<description>{descricao}</description><g:ncm>{rnd.choice(ncms)}</g:ncm></item>\n")
+        f.write("</channel></rss>\n")
+
+
+def medir_python(montar):
+    """Bytes alocados em objetos Python por `montar()` (o resultado fica vivo durante a medição)."""
+    gc.collect()
+    tracemalloc.start()
+    objeto = montar()
+    usado, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objeto
+    return usado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--itens", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "feed.xml")
+        gerar_feed(caminho, args.itens)
+        print(f"XML: {os.path.getsize(caminho) / 2**20:.0f} MB, {args.itens:,} itens")
+        arrow_antes = pa.total_allocated_bytes()
+        inicio = time.perf_counter()
+        feed = carregar_feed(caminho)
+        print(f"carregar_feed: {time.perf_counter() - inicio:.1f} s")
+        arrow = pa.total_allocated_bytes() - arrow_antes
+
+    linhas = list(zip(*(feed.tabela.column(c).to_pylist() for c in COLUNAS)))
+
+    def tuplas():
+        # Strings novas por item, como saem do parser
+        registros = [tuple(v.encode().decode() if isinstance(v, str) else v for v in linha) for linha in linhas]
+        return registros, {r[0]: pos for pos, r in enumerate(registros)}
+
+    def dicts():
+        registros = [{c: v.encode().decode() if isinstance(v, str) else v for c, v in zip(CAMPOS_DICT, linha)}
+                     for linha in linhas]
+        return registros, {r["SKU"]: pos for pos, r in enumerate(registros)}
+
+    indice_sku = feed._skus.nbytes + feed._linhas.nbytes
+    medidas = {
+        "dict por item + dict SKU": medir_python(dicts),
+        "tupla por item + dict SKU": medir_python(tuplas),
+        "colunas Arrow + SKUs ordenados": arrow + indice_sku,
+    }
+    del linhas
+    titulos = feed.tabela.column("titulo").drop_null().to_pylist()
+    corpus = medir_python(lambda: IndiceFuzzy(titulos))
+
+    por_100k = 100_000 / args.itens
+    print(f"\n{'armazenamento':32} {'MB/100k itens':>14}")
+    for nome, usado in medidas.items():
+        print(f"{nome:32} {usado * por_100k / 2**20:14.1f}")
+    print(f"\n  colunas Arrow: {arrow * por_100k / 2**20:.1f} MB | índice de SKU: {indice_sku * por_100k / 2**20:.1f} MB")
+    print(f"  corpus de títulos normalizados (igual nos três): {corpus * por_100k / 2**20:.1f} MB/100k")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Memória por worker com o feed privado em cada processo x mapeado da pasta compartilhada.
+
+Sobe N processos novos (como N instâncias do app atrás de um proxy), cada um
+abre o feed, monta o índice de trigramas, faz uma busca e lê todas as páginas
+dos dados (o pior caso de um worker que rodou por muito tempo). Com todos
+vivos ao mesmo tempo, cada um lê o próprio /proc/self/smaps_rollup:
+
+- RSS: páginas residentes, contando as compartilhadas inteiras em cada processo;
+- PSS: as compartilhadas divididas entre os processos que as mapeiam;
+- privada: só deste processo (o que some da máquina quando ele termina).
+
+A soma do PSS é a memória que os N workers ocupam de fato. Só Linux.
+
+Uso: python scripts/rss_workers.py [--itens 100000] [--workers 4] [--xml feed.xml]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pyarrow as pa  # noqa: E402
+
+from memoria_feed import gerar_feed  # noqa: E402
+from ncmbrasil import compartilhado  # noqa: E402
+
+
+def memoria():
+    """(RSS, PSS, privada) do processo, em MB."""
+    campos = {}
+    with open("/proc/self/smaps_rollup") as arquivo:
+        for linha in arquivo:
+            partes = linha.split()
+            if len(partes) == 3 and partes[2] == "kB":
+                campos[partes[0].rstrip(":")] = int(partes[1]) / 1024
+    return campos["Rss"], campos["Pss"], campos["Private_Clean"] + campos["Private_Dirty"]
+
+
+def _buffers(feed):
+    for coluna in feed.tabela.columns:
+        for pedaco in coluna.chunks:
+            yield from pedaco.buffers()
+            if pa.types.is_dictionary(pedaco.type):
+                yield from pedaco.dictionary.buffers()
+    trigramas = feed.titulos.trigramas()
+    for array in (feed._skus, feed._linhas, trigramas.inicios, trigramas.posicoes):
+        yield memoryview(array).cast("B")
+
+
+def _tocar(feed):
+    # Um byte por página basta para ela ficar residente
+    return sum(int(np.frombuffer(b, dtype=np.uint8)[::4096].sum()) for b in _buffers(feed) if b is not None)
+
+
+def worker(caminho, pasta, barreira, fila):
+    compartilhado.PASTA = pasta
+    inicio = time.perf_counter()
+    if caminho:
+        feed = compartilhado.abrir_feed(caminho)
+        feed.titulos.trigramas()
+        feed.titulos.buscar("chave soquete catraca")
+        feed.buscar(feed.tabela.column("sku")[0].as_py())
+        _tocar(feed)
+    carga = time.perf_counter() - inicio
+    # Todos vivos ao mesmo tempo, para o PSS repartir as páginas compartilhadas
+    barreira.wait()
+    fila.put((carga, *memoria()))
+    barreira.wait()
+
+
+def rodar(caminho, pasta, workers):
+    contexto = multiprocessing.get_context("spawn")
+    barreira, fila = contexto.Barrier(workers), contexto.Queue()
+    processos = [contexto.Process(target=worker, args=(caminho, pasta, barreira, fila)) for _ in range(workers)]
+    for processo in processos:
+        processo.start()
+    medidas = [fila.get() for _ in processos]
+    for processo in processos:
+        processo.join()
+    return medidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--itens", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--xml", help="Feed existente (padrão: XML sintético com --itens itens)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporaria:
+        caminho = args.xml or os.path.join(temporaria, "feed.xml")
+        if not args.xml:
+            gerar_feed(caminho, args.itens)
+        pasta = os.path.join(temporaria, "compartilhado")
+        # A primeira abertura publica; as medidas são de workers que só mapeiam
+        compartilhado.PASTA = pasta
+        inicio = time.perf_counter()
+        itens = len(compartilhado.abrir_feed(caminho))
+        print(f"{itens:,} itens; XML lido e publicado em {time.perf_counter() - inicio:.1f} s")
+        cenarios = {
+            "sem dados (só imports)": rodar(None, "", args.workers),
+            "feed privado": rodar(caminho, "", args.workers),
+            "feed compartilhado": rodar(caminho, pasta, args.workers),
+        }
+
+    print(f"\n{args.workers} workers; MB por worker (média) e total dos workers")
+    print(f"{'cenário':24} {'carga s':>8} {'RSS':>8} {'PSS':>8} {'privada':>8} {'soma PSS':>9}")
+    for nome, medidas in cenarios.items():
+        carga, rss, pss, privada = np.mean(medidas, axis=0)
+        soma = sum(m[2] for m in medidas)
+        print(f"{nome:24} {carga:8.2f} {rss:8.1f} {pss:8.1f} {privada:8.1f} {soma:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Servidor falso do LLM (scripts/llm_fake.py) numa porta livre, para os testes de ia e ia_lote."""
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import llm_fake  # noqa: E402
+from ncmbrasil import ia  # noqa: E402
+
+
+def _subir(app):
+    laco = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    laco.run_until_complete(runner.setup())
+    laco.run_until_complete(web.TCPSite(runner, "127.0.0.1", 0).start())
+    thread = threading.Thread(target=laco.run_forever, daemon=True)
+    thread.start()
+
+    def parar():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), laco).result()
+        laco.call_soon_threadsafe(laco.stop)
+        thread.join()
+        laco.close()
+
+    return f"http://127.0.0.1:{runner.addresses[0][1]}", parar
+
+
+@pytest.fixture
+def subir_llm(monkeypatch):
+    """Função que sobe `llm_fake.criar_app(**opcoes)`, aponta ia.URL_API para ele e devolve a URL."""
+    paradas = []
+
+    def subir(**opcoes):
+        url, parar = _subir(llm_fake.criar_app(**opcoes))
+        paradas.append(parar)
+        monkeypatch.setattr(ia, "URL_API", f"{url}/openai/v1")
+        return url
+
+    yield subir
+    for parar in paradas:
+        parar()
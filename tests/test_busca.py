@@ -0,0 +1,40 @@
+"""Busca enquanto se digita (BuscaIncremental) contra a busca no corpus inteiro (IndiceFuzzy.buscar)."""
+import random
+
+import pytest
+
+from ncmbrasil.busca import CANDIDATOS_REFINAMENTO, BuscaIncremental, IndiceFuzzy
+
+PALAVRAS = ("pneu borracha telefone celular parafusadeira eletrica chave fenda martelo unha cabo cobre "
+            "lampada tecido algodao motor trifasico bicicleta infantil alicate universal serra circular "
+            "oleo lubrificante caixa papelao vinho tinto aparelho partes acessorios outros de para com").split()
+
+
+@pytest.fixture(scope="module")
+def indice():
+    rnd = random.Random(7)
+    textos = [" ".join(rnd.choice(PALAVRAS) for _ in range(rnd.randint(2, 7))) for _ in range(3_000)]
+    assert len(textos) > CANDIDATOS_REFINAMENTO
+    return IndiceFuzzy(textos)
+
+
+@pytest.mark.parametrize("frase", ["pneu de borracha", "telefone celular", "parafusadeira eletrica",
+                                   "cabo eletrico de cobre", "tecido de algodao", "alicate universal"])
+def test_cada_tecla_da_o_mesmo_resultado_da_busca_completa(indice, frase):
+    busca = BuscaIncremental(indice)
+    for fim in range(3, len(frase) + 1):
+        termo = frase[:fim]
+        assert busca.buscar(termo) == indice.buscar(termo.strip()), termo
+
+
+def test_apagar_e_trocar_de_palavra(indice):
+    busca = BuscaIncremental(indice)
+    for termo in ["parafus", "parafusadeira ele", "parafusadeira", "paraf", "pneu", "pneu celular"]:
+        assert busca.buscar(termo) == indice.buscar(termo), termo
+
+
+def test_limite_maior_que_o_ja_guardado(indice):
+    busca = BuscaIncremental(indice)
+    busca.buscar("chave", 3)
+    busca.buscar("chave f", 3)
+    assert busca.buscar("chave f", 50) == indice.buscar("chave f", 50)
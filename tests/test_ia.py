@@ -0,0 +1,119 @@
+"""Cache de respostas e de modelos do LLM contra o servidor falso (scripts/llm_fake.py)."""
+import threading
+
+import pytest
+import requests
+
+import llm_fake
+from ncmbrasil import ia
+
+MODELO = "modelo-teste"
+
+
+class Relogio:
+    """Substitui o módulo time em ia: o teste decide quando o tempo passa."""
+
+    def __init__(self):
+        self.agora = 1_000_000.0
+
+    def time(self):
+        return self.agora
+
+    def monotonic(self):
+        return self.agora
+
+
+@pytest.fixture
+def llm(subir_llm, monkeypatch):
+    """URL do servidor falso (0,2 s por resposta), já configurado em ia.URL_API."""
+    monkeypatch.setattr(ia, "_modelos", {})
+    return subir_llm(atraso=0.2)
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(ia, "time", relogio)
+    return relogio
+
+
+def contagem(url):
+    return requests.get(f"{url}/contagem", timeout=5).json()
+
+
+def test_resposta_em_cache_nao_chama_a_api(llm, tmp_path):
+    cache = ia.CacheRespostas(str(tmp_path / "respostas.sqlite"))
+    primeira = ia.consultar_ncm_ia("chave", MODELO, "Chave de fenda 6 mm", cache)
+    segunda = ia.consultar_ncm_ia("chave", MODELO, "Chave de fenda 6 mm", cache)
+    assert primeira[1] is None and primeira[2] is False
+    assert segunda == (primeira[0], None, True)
+    assert contagem(llm)["chat"] == 1
+
+
+def test_resposta_expirada_chama_a_api_de_novo(llm, relogio, tmp_path):
+    cache = ia.CacheRespostas(str(tmp_path / "respostas.sqlite"), ttl=60)
+    ia.consultar_ncm_ia("chave", MODELO, "Martelo de unha", cache)
+    relogio.agora += 59
+    assert ia.consultar_ncm_ia("chave", MODELO, "Martelo de unha", cache)[2] is True
+    relogio.agora += 2
+    assert ia.consultar_ncm_ia("chave", MODELO, "Martelo de unha", cache)[2] is False
+    assert contagem(llm)["chat"] == 2
+
+
+def test_cache_cheio_descarta_o_menos_acessado(relogio, tmp_path):
+    cache = ia.CacheRespostas(str(tmp_path / "respostas.sqlite"), max_itens=2)
+    cache.gravar("a", "resposta a")
+    relogio.agora += 1
+    cache.gravar("b", "resposta b")
+    relogio.agora += 1
+    assert cache.obter("a") == "resposta a"
+    relogio.agora += 1
+    cache.gravar("c", "resposta c")
+    assert cache.obter("b") is None
+    assert cache.obter("a") == "resposta a"
+    assert cache.obter("c") == "resposta c"
+
+
+def test_chamadas_identicas_simultaneas_fazem_uma_requisicao(llm, tmp_path):
+    cache = ia.CacheRespostas(str(tmp_path / "respostas.sqlite"))
+    barreira = threading.Barrier(8)
+    resultados = []
+
+    def consultar():
+        barreira.wait()
+        resultados.append(ia.consultar_ncm_ia("chave", MODELO, "Alicate universal 8 pol", cache))
+
+    threads = [threading.Thread(target=consultar) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert contagem(llm)["chat"] == 1
+    assert len(resultados) == 8
+    assert {(resposta, erro) for resposta, erro, _ in resultados} == {(resultados[0][0], None)}
+    assert sum(not do_cache for _, _, do_cache in resultados) == 1
+
+
+def test_listar_modelos_respeita_o_ttl(llm, relogio):
+    assert ia.listar_modelos("chave") == list(llm_fake.MODELOS)
+    relogio.agora += ia.TTL_MODELOS - 1
+    ia.listar_modelos("chave")
+    assert contagem(llm)["models"] == 1
+    relogio.agora += 2
+    ia.listar_modelos("chave")
+    assert contagem(llm)["models"] == 2
+    # Cada chave de API tem a sua entrada
+    ia.listar_modelos("outra chave")
+    assert contagem(llm)["models"] == 3
+
+
+def test_falha_ao_listar_modelos_usa_ttl_curto(llm, relogio, monkeypatch):
+    monkeypatch.setattr(ia, "URL_API", f"{llm}/inexistente")
+    assert ia.listar_modelos("chave") == []
+    monkeypatch.setattr(ia, "URL_API", f"{llm}/openai/v1")
+    relogio.agora += ia.TTL_MODELOS_FALHA - 1
+    assert ia.listar_modelos("chave") == []
+    relogio.agora += 2
+    assert ia.listar_modelos("chave") == list(llm_fake.MODELOS)
+    assert contagem(llm)["models"] == 1
@@ -0,0 +1,82 @@
+"""Classificação em lote (ia_lote.classificar_lote) contra o servidor falso (scripts/llm_fake.py)."""
+import asyncio
+import json
+import random
+
+import pytest
+import requests
+
+from ncmbrasil import ia, ia_lote
+
+MODELO = "modelo-teste"
+PRODUTOS = ["Chave de fenda 6 mm", "Martelo de unha 27 mm", "Alicate universal 8 pol", "Trena 5 m",
+            "Serra copo bimetálica 40 mm", "Nível de alumínio 30 cm"]
+ESPERA_ORIGINAL = ia_lote._espera
+
+
+def contagem(url):
+    return requests.get(f"{url}/contagem", timeout=5).json()
+
+
+def classificar(produtos, cache, **opcoes):
+    return asyncio.run(ia_lote.classificar_lote(produtos, "chave", MODELO, cache=cache, **opcoes))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ia.CacheRespostas(str(tmp_path / "respostas.sqlite"))
+
+
+def test_repete_apos_429_esperando_o_retry_after(subir_llm, cache, monkeypatch):
+    random.seed(3)
+    url = subir_llm(taxa_429=0.5)
+    pedidas = []
+
+    def espera(tentativa, retry_after=None):
+        pedidas.append(retry_after)
+        return ESPERA_ORIGINAL(tentativa, retry_after)
+
+    monkeypatch.setattr(ia_lote, "_espera", espera)
+    resultados = classificar(PRODUTOS, cache, tentativas=30)
+    assert all(erro is None and resposta for resposta, erro in resultados)
+    assert contagem(url)["chat"] == len(PRODUTOS)
+    assert contagem(url)["429"] == len(pedidas) > 0
+    assert set(pedidas) == {"0.2"}
+
+
+def test_titulos_que_normalizam_igual_sao_consultados_uma_vez(subir_llm, cache):
+    url = subir_llm()
+    produtos = ["Chave de Fenda 6mm", "  chave de fenda 6MM ", "CHAVE DE FENDA 6mm", "Trena 5 m"]
+    resultados = classificar(produtos, cache)
+    assert contagem(url)["chat"] == 2
+    assert resultados[0] == resultados[1] == resultados[2]
+    assert all(erro is None for _, erro in resultados)
+
+
+def test_retoma_do_checkpoint_sem_chamar_a_api(subir_llm, tmp_path):
+    url = subir_llm()
+    checkpoint = str(tmp_path / "saida.checkpoint.jsonl")
+    primeira = classificar(PRODUTOS, ia.CacheRespostas(str(tmp_path / "a.sqlite")), checkpoint=checkpoint)
+    with open(checkpoint, encoding="utf-8") as arquivo:
+        assert len([json.loads(linha) for linha in arquivo]) == len(PRODUTOS)
+    # Cache vazio: só o checkpoint evita as chamadas
+    segunda = classificar(PRODUTOS, ia.CacheRespostas(str(tmp_path / "b.sqlite")), checkpoint=checkpoint)
+    assert segunda == primeira
+    assert contagem(url)["chat"] == len(PRODUTOS)
+
+
+def test_resposta_sem_conteudo_vira_erro_sem_perder_o_lote(subir_llm, tmp_path):
+    subir_llm(resposta=None)
+    checkpoint = str(tmp_path / "saida.checkpoint.jsonl")
+    cache = ia.CacheRespostas(str(tmp_path / "respostas.sqlite"))
+    cache.gravar(ia.chave_resposta("Trena 5 m", MODELO), "NCM 9017.80.10")
+    resultados = classificar(["Chave de fenda 6 mm", "Trena 5 m"], cache, checkpoint=checkpoint)
+    assert resultados == [(None, ia.ERRO_SEM_CONTEUDO), ("NCM 9017.80.10", None)]
+    assert cache.obter(ia.chave_resposta("Chave de fenda 6 mm", MODELO)) is None
+    with open(checkpoint, encoding="utf-8") as arquivo:
+        assert arquivo.read() == ""
+
+
+def test_tentativas_precisa_ser_positivo(cache):
+    with pytest.raises(ValueError):
+        classificar(PRODUTOS, cache, tentativas=0)
@@ -0,0 +1,41 @@
+"""Conversão de valores em texto (precos.converter_valores) e a planilha de entrada do lote."""
+import io
+
+import numpy as np
+import pytest
+
+from ncmbrasil import precos
+
+
+@pytest.mark.parametrize("texto, numero", [
+    ("1.234,56", 1234.56), ("1234.56", 1234.56), ("1,234.56", 1234.56), ("12,9", 12.9), ("1.234", 1.234),
+    ("1.234.567", 1234567.0), ("1,234,567", 1234567.0), ("12.345.678,90", 12345678.9), ("R$ 12,90", 12.9),
+    ("1.234,56 BRL", 1234.56), ("1234.56 BRL", 1234.56), ("-3,5", -3.5), (".5", 0.5), (" 807 ", 807.0),
+])
+def test_converte_os_dois_formatos(texto, numero):
+    numeros, invalidos = precos.converter_valores([texto])
+    assert numeros[0] == pytest.approx(numero)
+    assert not invalidos[0]
+
+
+@pytest.mark.parametrize("texto", ["1.234,56.78", "1,234.56,78", "1.2345,6", "1.234,567.8", "1.23.45", "abc",
+                                   "-", "12-3"])
+def test_numero_malformado_e_ilegivel(texto):
+    numeros, invalidos = precos.converter_valores([texto])
+    assert np.isnan(numeros[0])
+    assert invalidos[0]
+
+
+def test_vazio_nao_e_ilegivel():
+    numeros, invalidos = precos.converter_valores(["", "  ", None])
+    assert np.isnan(numeros).all()
+    assert not invalidos.any()
+
+
+def test_planilha_lote_leva_o_valor_malformado_para_erro():
+    csv = "SKU;Valor Final;Frete\n000010;1.234,56;\n000011;1.234,56.78;0\n000012;;\n000013;10,00;x\n"
+    entrada = precos.ler_planilha_lote(io.StringIO(csv), "lote.csv")
+    assert entrada["valor_final"].iloc[0] == pytest.approx(1234.56)
+    assert entrada["frete"].iloc[0] == 0.0
+    assert entrada["erro"].tolist() == ["", "valor_final ilegível: 1.234,56.78", "valor_final vazio.",
+                                        "frete ilegível: x"]